@@ -0,0 +1,352 @@
+"""
+Aggregation Module
+Vectorized summaries of tested water samples for reports
+
+Results are turned into columns (one NumPy array per field) and reduced in
+a single vectorized pass: quality distribution by source location,
+per-parameter statistics and percentiles, exceedances of the ideal ranges
+in config.PARAMETER_RANGES, and test-duration statistics.
+
+Every aggregate can be merged with another, so shards of a batch (chunks
+of a stream, or parts tested by different workers) are aggregated
+independently and combined afterwards. Percentiles come from fixed-range
+histograms for this reason: unlike sorted values, histograms add up.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import scoring
+from config import PARAMETER_RANGES, TEST_CONFIG
+from scoring import PARAMETER_FIELDS
+from water_sample import WaterQuality, WaterSample
+
+
+# Quality levels in report order; a sample's quality code is its index here
+QUALITY_LEVELS = list(WaterQuality)
+QUALITY_CODES = {quality.value: code for code, quality in enumerate(QUALITY_LEVELS)}
+UNTESTED = -1
+
+# Histogram resolution used for percentiles (per parameter range)
+HISTOGRAM_BINS = 2048
+REPORT_PERCENTILES = (50, 90, 95, 99)
+
+# Test durations are histogrammed up to twice the longest simulated test
+DURATION_RANGE = (0.0, 2 * TEST_CONFIG['max_test_duration'])
+
+
+def get_ideal_bounds(parameter: str) -> Tuple[float, float]:
+    """
+    Ideal (low, high) bounds of a parameter from PARAMETER_RANGES.
+
+    Missing bounds are open (-inf or +inf); an exact "ideal" value (coliform)
+    is used as the upper bound.
+    """
+    ranges = PARAMETER_RANGES[parameter]
+    low = ranges.get('ideal_min', -np.inf)
+    high = ranges.get('ideal_max', ranges.get('ideal', np.inf))
+    return low, high
+
+
+@dataclass
+class SampleColumns:
+    """
+    A batch of samples stored column by column.
+
+    Attributes:
+        locations: Source location names; location_codes index into this list
+        location_codes: Location of each sample
+        quality_codes: Index into QUALITY_LEVELS, or UNTESTED
+        parameters: PARAMETER_RANGES key -> measured values
+        durations: Test duration of each sample in seconds
+        sample_ids: Sample id of each sample, when known
+        timestamps: Collection time of each sample (Unix time), when known
+    """
+    locations: List[str]
+    location_codes: np.ndarray
+    quality_codes: np.ndarray
+    parameters: Dict[str, np.ndarray]
+    durations: np.ndarray
+    sample_ids: Optional[np.ndarray] = None
+    timestamps: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.location_codes)
+
+    @classmethod
+    def from_samples(cls, samples: List[WaterSample],
+                     ratings: Optional[List[str]] = None) -> 'SampleColumns':
+        """
+        Build columns from sample objects.
+
+        Args:
+            samples: Samples to convert
+            ratings: Quality rating values of the samples (e.g. from
+                     TestEngine.test_stream); if omitted, tested samples are
+                     rated in one batch with the active scoring rules
+
+        Returns:
+            SampleColumns holding the same data
+        """
+        count = len(samples)
+        location_index: Dict[str, int] = {}
+        location_codes = np.fromiter(
+            (location_index.setdefault(s.source_location, len(location_index)) for s in samples),
+            dtype=np.int32, count=count)
+
+        parameters = {key: np.fromiter((getattr(s, field) for s in samples), dtype=np.float64, count=count)
+                      for key, field in PARAMETER_FIELDS.items()}
+        durations = np.fromiter((s.test_duration for s in samples), dtype=np.float64, count=count)
+
+        if ratings is None:
+            rules = scoring.get_rules()
+            label_codes = np.array([QUALITY_CODES[label] for label in rules.ratings], dtype=np.int8)
+            quality_codes = label_codes[rules.rate_columns(parameters)] if count else np.zeros(0, np.int8)
+            tested = np.fromiter((s.tested for s in samples), dtype=bool, count=count)
+            quality_codes[~tested] = UNTESTED
+        else:
+            quality_codes = np.fromiter((QUALITY_CODES.get(rating, UNTESTED) for rating in ratings),
+                                        dtype=np.int8, count=count)
+
+        sample_ids = np.fromiter((s.sample_id for s in samples), dtype=np.int64, count=count)
+        timestamps = np.fromiter((s.collected_at for s in samples), dtype=np.float64, count=count)
+        return cls(list(location_index), location_codes, quality_codes, parameters, durations,
+                   sample_ids, timestamps)
+
+    def shards(self, count: int) -> List['SampleColumns']:
+        """Split into up to ``count`` contiguous shards (views, not copies)"""
+        bounds = np.linspace(0, len(self), max(1, count) + 1).astype(int)
+        return [SampleColumns(self.locations,
+                              self.location_codes[start:end],
+                              self.quality_codes[start:end],
+                              {key: values[start:end] for key, values in self.parameters.items()},
+                              self.durations[start:end],
+                              None if self.sample_ids is None else self.sample_ids[start:end],
+                              None if self.timestamps is None else self.timestamps[start:end])
+                for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+class ParameterStats:
+    """
+    Mergeable statistics of one numeric column.
+
+    Keeps count, sum, sum of squares, min, max, the number of values outside
+    the ideal bounds, and a histogram over a fixed value range from which
+    percentiles are read (to within one bin width).
+    """
+
+    def __init__(self, value_range: Tuple[float, float],
+                 ideal_bounds: Tuple[float, float] = (-np.inf, np.inf)):
+        self.value_range = value_range
+        self.ideal_bounds = ideal_bounds
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.exceedances = 0
+        self.histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+
+    def add(self, values: np.ndarray):
+        """Fold an array of values into the statistics"""
+        if len(values) == 0:
+            return
+
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.total_squares += float(np.dot(values, values))
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+
+        low, high = self.ideal_bounds
+        self.exceedances += int(np.count_nonzero((values < low) | (values > high)))
+
+        # Values outside the range land in the first or last bin
+        range_low, range_high = self.value_range
+        scale = HISTOGRAM_BINS / (range_high - range_low)
+        bins = np.clip(((values - range_low) * scale).astype(np.int64), 0, HISTOGRAM_BINS - 1)
+        self.histogram += np.bincount(bins, minlength=HISTOGRAM_BINS)
+
+    def merge(self, other: 'ParameterStats'):
+        """Add another shard's statistics to these"""
+        self.count += other.count
+        self.total += other.total
+        self.total_squares += other.total_squares
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.exceedances += other.exceedances
+        self.histogram += other.histogram
+
+    @property
+    def mean(self) -> float:
+        """Mean of all values added"""
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        """Population standard deviation of all values added"""
+        if not self.count:
+            return 0.0
+        return float(np.sqrt(max(0.0, self.total_squares / self.count - self.mean ** 2)))
+
+    def percentile(self, percent: float) -> float:
+        """
+        Approximate percentile from the histogram.
+
+        Args:
+            percent: Percentile between 0 and 100
+
+        Returns:
+            Upper edge of the bin holding that rank, clamped to [min, max]
+        """
+        if not self.count:
+            return 0.0
+
+        rank = max(1, int(np.ceil(self.count * percent / 100)))
+        bin_index = int(np.searchsorted(np.cumsum(self.histogram), rank))
+        range_low, range_high = self.value_range
+        upper_edge = range_low + (bin_index + 1) * (range_high - range_low) / HISTOGRAM_BINS
+        return min(max(upper_edge, self.minimum), self.maximum)
+
+
+class QualityAggregate:
+    """
+    Mergeable summary of a set of test results.
+
+    Attributes:
+        location_counts: Location name -> count of samples per quality level
+        untested: Number of samples without a result (excluded from stats)
+        parameters: PARAMETER_RANGES key -> ParameterStats
+        durations: ParameterStats of test durations
+    """
+
+    def __init__(self):
+        self.location_counts: Dict[str, np.ndarray] = {}
+        self.untested = 0
+        self.parameters = {key: ParameterStats((PARAMETER_RANGES[key]['min'], PARAMETER_RANGES[key]['max']),
+                                               get_ideal_bounds(key))
+                           for key in PARAMETER_FIELDS}
+        self.durations = ParameterStats(DURATION_RANGE)
+
+    @classmethod
+    def from_columns(cls, columns: SampleColumns) -> 'QualityAggregate':
+        """Aggregate one batch of columns in a single vectorized pass"""
+        aggregate = cls()
+        tested = columns.quality_codes != UNTESTED
+        aggregate.untested = int(len(columns) - np.count_nonzero(tested))
+
+        # Quality distribution by location: one bincount over (location, quality) cells
+        levels = len(QUALITY_LEVELS)
+        cells = columns.location_codes.astype(np.int64) * levels + columns.quality_codes
+        if aggregate.untested:
+            cells = cells[tested]
+        counts = np.bincount(cells, minlength=len(columns.locations) * levels).reshape(-1, levels)
+        for code, location in enumerate(columns.locations):
+            if counts[code].any():
+                aggregate.location_counts[location] = counts[code]
+
+        # Fully tested batches (the common case) are used without copying
+        def select(values: np.ndarray) -> np.ndarray:
+            return values[tested] if aggregate.untested else values
+
+        for key, values in columns.parameters.items():
+            aggregate.parameters[key].add(select(values))
+        aggregate.durations.add(select(columns.durations))
+        return aggregate
+
+    @classmethod
+    def from_samples(cls, samples: List[WaterSample]) -> 'QualityAggregate':
+        """Aggregate sample objects (converted to columns first)"""
+        return cls.from_columns(SampleColumns.from_samples(samples))
+
+    def merge(self, other: 'QualityAggregate') -> 'QualityAggregate':
+        """Add another shard's aggregate to this one and return self"""
+        for location, counts in other.location_counts.items():
+            if location in self.location_counts:
+                self.location_counts[location] = self.location_counts[location] + counts
+            else:
+                self.location_counts[location] = counts.copy()
+        self.untested += other.untested
+        for key, stats in other.parameters.items():
+            self.parameters[key].merge(stats)
+        self.durations.merge(other.durations)
+        return self
+
+    @property
+    def tested(self) -> int:
+        """Number of samples with a result"""
+        return sum(int(counts.sum()) for counts in self.location_counts.values())
+
+    def quality_totals(self) -> Dict[WaterQuality, int]:
+        """Count of samples per quality level over all locations"""
+        totals = np.zeros(len(QUALITY_LEVELS), dtype=np.int64)
+        for counts in self.location_counts.values():
+            totals += counts
+        return {quality: int(count) for quality, count in zip(QUALITY_LEVELS, totals)}
+
+
+def aggregate_shards(shards: Iterable[SampleColumns], executor=None) -> QualityAggregate:
+    """
+    Aggregate shards independently and merge the partial results.
+
+    Args:
+        shards: Column batches, e.g. from SampleColumns.shards() or a stream
+        executor: Optional concurrent.futures executor to aggregate on
+
+    Returns:
+        Merged QualityAggregate
+    """
+    if executor is None:
+        partials = map(QualityAggregate.from_columns, shards)
+    else:
+        partials = executor.map(QualityAggregate.from_columns, shards)
+
+    result = QualityAggregate()
+    for partial in partials:
+        result.merge(partial)
+    return result
+
+
+def format_report(aggregate: QualityAggregate) -> str:
+    """
+    Render an aggregate as a plain-text report.
+
+    Args:
+        aggregate: Aggregate to report on
+
+    Returns:
+        Multi-line report
+    """
+    tested = aggregate.tested
+    lines = ["="*60, "WATER QUALITY REPORT", "="*60,
+             f"Samples tested: {tested:,}" + (f" ({aggregate.untested:,} untested)" if aggregate.untested else "")]
+
+    lines += ["", "Quality Distribution:"]
+    for quality, count in aggregate.quality_totals().items():
+        percentage = count / tested * 100 if tested else 0
+        lines.append(f"  {quality.value:12} : {'█' * int(percentage / 5)} ({count:,} - {percentage:.1f}%)")
+
+    header = "".join(f"{quality.value[:9]:>10}" for quality in QUALITY_LEVELS)
+    lines += ["", "By Location:", f"  {'Location':22}{header}"]
+    for location, counts in sorted(aggregate.location_counts.items()):
+        lines.append(f"  {location:22}" + "".join(f"{int(count):>10,}" for count in counts))
+
+    percentile_header = "".join(f"{'p' + str(p):>8}" for p in REPORT_PERCENTILES)
+    lines += ["", "Parameters:",
+              f"  {'Parameter':18}{'Min':>8}{'Mean':>8}{percentile_header}{'Max':>8}{'Outside ideal':>16}"]
+    for key, stats in aggregate.parameters.items():
+        percentiles = "".join(f"{stats.percentile(p):8.2f}" for p in REPORT_PERCENTILES)
+        share = stats.exceedances / stats.count * 100 if stats.count else 0
+        lines.append(f"  {key:18}{stats.minimum if stats.count else 0:8.2f}{stats.mean:8.2f}"
+                     f"{percentiles}{stats.maximum if stats.count else 0:8.2f}"
+                     f"{stats.exceedances:>9,} ({share:4.1f}%)")
+
+    durations = aggregate.durations
+    if durations.count and durations.maximum > 0:
+        lines += ["", f"Test Duration: mean {durations.mean:.2f}s | std {durations.std:.2f}s | "
+                      f"p95 {durations.percentile(95):.2f}s | max {durations.maximum:.2f}s"]
+
+    lines.append("="*60)
+    return "\n".join(lines)
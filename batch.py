@@ -0,0 +1,379 @@
+"""
+Batch Testing Script
+Rates water samples from CSV or JSONL files (or stdin) without the GUI
+
+Samples are read, tested and written one chunk at a time, so files with
+millions of rows run in constant memory:
+    python batch.py samples.csv -o ratings.csv --backend multiprocessing
+    cat samples.jsonl | python batch.py - --input-format jsonl > ratings.jsonl
+
+Progress and a final rows/sec and memory report go to stderr, so stdout
+can carry the ratings. With --db, samples, ratings and the run are also
+saved to a SQLite database by a background writer (see persistence.py).
+With --detect, results pass through the streaming anomaly detector
+(anomaly.py) and alerts are printed as they are found.
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, TextIO
+
+from aggregation import QualityAggregate, SampleColumns, format_report
+from anomaly import AnomalyDetector
+from persistence import BackgroundWriter
+from test_engine import STREAM_BACKENDS, TestEngine, resolve_backend
+from water_sample import WaterSample
+
+
+# WaterSample fields and the column names accepted for each (the short
+# names match the preset samples in config.py)
+FIELD_ALIASES = {
+    'sample_id': ('sample_id', 'id'),
+    'ph_level': ('ph_level', 'ph'),
+    'turbidity': ('turbidity',),
+    'dissolved_oxygen': ('dissolved_oxygen', 'do'),
+    'total_coliform': ('total_coliform', 'coliform'),
+    'nitrate_level': ('nitrate_level', 'nitrate'),
+    'source_location': ('source_location', 'location'),
+    'collected_at': ('collected_at', 'timestamp', 'time'),
+}
+
+# Columns that may be left out (the row number, "Unknown" and the time of reading are used)
+OPTIONAL_FIELDS = ('sample_id', 'source_location', 'collected_at')
+
+OUTPUT_FIELDS = ['sample_id', 'source_location', 'ph_level', 'turbidity', 'dissolved_oxygen',
+                 'total_coliform', 'nitrate_level', 'collected_at', 'quality']
+
+# Invalid rows are skipped; only the first few are reported individually
+MAX_REPORTED_ERRORS = 10
+MAX_REPORTED_ANOMALIES = 20
+
+
+def detect_format(path: str, default: str = 'csv') -> str:
+    """Guess "csv" or "jsonl" from a file name"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    if extension in ('.csv', '.tsv', '.txt'):
+        return 'csv'
+    return default
+
+
+def parse_timestamp(value) -> float:
+    """
+    Read a collection time as Unix seconds or an ISO 8601 date/time.
+
+    Times without a UTC offset are taken as local time.
+
+    Raises:
+        ValueError: If the value is neither
+    """
+    try:
+        return parse_number(value, 'collected_at')
+    except ValueError:
+        return datetime.fromisoformat(str(value)).timestamp()
+
+
+def parse_number(value, field: str) -> float:
+    """
+    Read a measurement as a finite float.
+
+    Raises:
+        ValueError: If the value is not a number, or is infinite or NaN
+                    (such as "inf", or "1e999", which overflows to infinity)
+    """
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"{field} is not a finite number: {value!r}")
+    return number
+
+
+def row_to_sample(row: Dict, row_number: int) -> WaterSample:
+    """
+    Build a WaterSample from one input row.
+
+    Args:
+        row: Column name -> value (strings from CSV, or JSON values)
+        row_number: 1-based row number, used when the row has no sample id
+
+    Returns:
+        Untested WaterSample
+
+    Raises:
+        ValueError: If a required column is missing or not a finite number
+    """
+    values = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if row.get(alias) not in (None, ''):
+                values[field] = row[alias]
+                break
+
+    missing = [field for field in FIELD_ALIASES if field not in values and field not in OPTIONAL_FIELDS]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+    sample_id = values.get('sample_id', row_number)
+    if isinstance(sample_id, float):
+        # JSON numbers such as 12.0 (or 1e999, which parses as infinity)
+        sample_id = parse_number(sample_id, 'sample_id')
+
+    return WaterSample(
+        sample_id=int(sample_id),
+        ph_level=parse_number(values['ph_level'], 'ph_level'),
+        turbidity=parse_number(values['turbidity'], 'turbidity'),
+        dissolved_oxygen=parse_number(values['dissolved_oxygen'], 'dissolved_oxygen'),
+        total_coliform=int(parse_number(values['total_coliform'], 'total_coliform')),
+        nitrate_level=parse_number(values['nitrate_level'], 'nitrate_level'),
+        source_location=str(values.get('source_location', 'Unknown')),
+        collected_at=parse_timestamp(values['collected_at']) if 'collected_at' in values else time.time()
+    )
+
+
+class SampleReader:
+    """
+    Streams WaterSample objects from a CSV or JSONL text stream.
+
+    Rows are parsed lazily as the engine pulls them. Rows that cannot be
+    parsed are counted and skipped rather than aborting a long run.
+    """
+
+    def __init__(self, stream: TextIO, input_format: str):
+        self.stream = stream
+        self.input_format = input_format
+        self.rows_read = 0
+        self.rows_skipped = 0
+
+    def rows(self) -> Iterator:
+        """Yield CSV rows as dictionaries, or JSONL lines still to be parsed"""
+        if self.input_format == 'csv':
+            yield from csv.DictReader(self.stream)
+        else:
+            yield from (line for line in self.stream if line.strip())
+
+    def __iter__(self) -> Iterator[WaterSample]:
+        for row in self.rows():
+            self.rows_read += 1
+            try:
+                if isinstance(row, str):
+                    row = json.loads(row)
+                sample = row_to_sample(row, self.rows_read)
+            except (ValueError, TypeError, AttributeError) as e:
+                self.rows_skipped += 1
+                if self.rows_skipped <= MAX_REPORTED_ERRORS:
+                    print(f"  ✗ Row {self.rows_read} skipped: {e}", file=sys.stderr)
+                continue
+            yield sample
+
+
+class RatingWriter:
+    """Writes rated samples as CSV or JSONL, one chunk at a time"""
+
+    def __init__(self, stream: TextIO, output_format: str):
+        self.stream = stream
+        self.output_format = output_format
+        self.rows_written = 0
+        if output_format == 'csv':
+            self.csv_writer = csv.writer(stream)
+            self.csv_writer.writerow(OUTPUT_FIELDS)
+
+    def write_chunk(self, chunk: List[WaterSample], ratings: List[str]):
+        """Write one chunk and flush it, so results appear as they are rated"""
+        if self.output_format == 'csv':
+            self.csv_writer.writerows(
+                (s.sample_id, s.source_location, s.ph_level, s.turbidity, s.dissolved_oxygen,
+                 s.total_coliform, s.nitrate_level, s.collected_at, rating)
+                for s, rating in zip(chunk, ratings))
+        else:
+            self.stream.writelines(
+                json.dumps(dict(zip(OUTPUT_FIELDS, (
+                    s.sample_id, s.source_location, s.ph_level, s.turbidity, s.dissolved_oxygen,
+                    s.total_coliform, s.nitrate_level, s.collected_at, rating)))) + '\n'
+                for s, rating in zip(chunk, ratings))
+        self.stream.flush()
+        self.rows_written += len(chunk)
+
+
+def get_peak_memory_mb() -> Optional[float]:
+    """
+    Peak resident memory of this process in MB.
+
+    Returns:
+        Peak RSS, or None where the resource module is unavailable (Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_batch(reader: SampleReader, writer: RatingWriter, engine: TestEngine, backend: str,
+              chunk_size: int, simulate_delay: bool = False,
+              progress_interval: float = 5.0, aggregate: bool = False,
+              detector: Optional[AnomalyDetector] = None) -> Dict:
+    """
+    Stream samples from reader through the engine into writer.
+
+    Args:
+        reader: Source of samples
+        writer: Destination for ratings
+        engine: TestEngine whose worker count is used
+        backend: One of test_engine.STREAM_BACKENDS
+        chunk_size: Samples per chunk
+        simulate_delay: Run the simulated 1-3 second instrument test per sample
+        progress_interval: Seconds between progress lines on stderr (0 disables)
+        aggregate: Also build a QualityAggregate (merged chunk by chunk)
+        detector: Optional AnomalyDetector that sees every rated chunk
+
+    Returns:
+        Dictionary with row counts, elapsed time, rows/sec and peak memory,
+        plus the aggregate under 'aggregate' when requested
+    """
+    start_time = time.time()
+    next_progress = start_time + progress_interval
+    quality_counts: Dict[str, int] = {}
+    totals = QualityAggregate() if aggregate else None
+
+    stream = engine.test_stream(reader, backend, chunk_size, simulate_delay)
+    if detector is not None:
+        stream = detector.watch(stream)
+
+    for chunk, ratings in stream:
+        writer.write_chunk(chunk, ratings)
+        for rating in ratings:
+            quality_counts[rating] = quality_counts.get(rating, 0) + 1
+        if totals is not None:
+            totals.merge(QualityAggregate.from_columns(SampleColumns.from_samples(chunk, ratings)))
+
+        if progress_interval and time.time() >= next_progress:
+            elapsed = time.time() - start_time
+            print(f"  {writer.rows_written:,} rows | {writer.rows_written / elapsed:,.0f} rows/sec",
+                  file=sys.stderr)
+            next_progress += progress_interval
+
+    elapsed = time.time() - start_time
+    return {
+        'rows_read': reader.rows_read,
+        'rows_skipped': reader.rows_skipped,
+        'rows_written': writer.rows_written,
+        'elapsed': elapsed,
+        'rows_per_sec': writer.rows_written / elapsed if elapsed > 0 else 0.0,
+        'peak_memory_mb': get_peak_memory_mb(),
+        'quality_counts': quality_counts,
+        'aggregate': totals
+    }
+
+
+def print_report(report: Dict, backend: str, num_workers: int):
+    """Print the run summary to stderr"""
+    out = sys.stderr
+    print("="*60, file=out)
+    print("WATER QUALITY LAB - BATCH SUMMARY", file=out)
+    print("="*60, file=out)
+    print(f"Backend: {backend} ({num_workers} workers)", file=out)
+    print(f"Rows read: {report['rows_read']:,} | skipped: {report['rows_skipped']:,} | "
+          f"written: {report['rows_written']:,}", file=out)
+    print(f"Elapsed: {report['elapsed']:.2f}s | Throughput: {report['rows_per_sec']:,.0f} rows/sec",
+          file=out)
+    if report['peak_memory_mb'] is not None:
+        print(f"Peak memory: {report['peak_memory_mb']:.1f} MB", file=out)
+
+    for quality, count in sorted(report['quality_counts'].items(), key=lambda item: -item[1]):
+        print(f"  {quality:10} {count:>12,}", file=out)
+    print("="*60, file=out)
+
+
+def anomaly_printer(limit: int = MAX_REPORTED_ANOMALIES) -> Callable:
+    """on_anomaly callback that prints the first ``limit`` anomalies to stderr as they are found"""
+    printed = 0
+
+    def print_anomaly(anomaly):
+        nonlocal printed
+        printed += 1
+        if printed <= limit:
+            print(f"  ⚠ {anomaly}", file=sys.stderr)
+
+    return print_anomaly
+
+
+def main():
+    """Batch testing entry point"""
+    parser = argparse.ArgumentParser(description="Rate water samples from CSV/JSONL files")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="Input file, or - for stdin (default)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="Output file, or - for stdout (default)")
+    parser.add_argument("--input-format", choices=["csv", "jsonl"], default=None,
+                        help="Input format (default: from the file extension, else csv)")
+    parser.add_argument("--output-format", choices=["csv", "jsonl"], default=None,
+                        help="Output format (default: from the file extension, else the input format)")
+    parser.add_argument("--backend", choices=STREAM_BACKENDS, default=None,
+                        help="How chunks are tested; free_threading and subinterpreters fall back to "
+                             "multiprocessing where unavailable (default: from the host profile, "
+                             "else multiprocessing)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of workers (default: from the host profile, else usable CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Samples per chunk (default: from the host profile, else 1000)")
+    parser.add_argument("--simulate-delay", action="store_true",
+                        help="Run the simulated 1-3 second instrument test for every sample")
+    parser.add_argument("--progress", type=float, default=5.0,
+                        help="Seconds between progress lines (0 disables)")
+    parser.add_argument("--report", action="store_true",
+                        help="Print a quality report by location and parameter")
+    parser.add_argument("--db", default=None,
+                        help="Also save samples, ratings and the run to this SQLite database")
+    parser.add_argument("--detect", action="store_true",
+                        help="Flag anomalies per location as results stream in")
+    args = parser.parse_args()
+
+    input_format = args.input_format or detect_format(args.input)
+    output_format = args.output_format or detect_format(args.output, default=input_format)
+    try:
+        recorder = BackgroundWriter(args.db) if args.db else None
+    except RuntimeError as e:
+        parser.error(str(e))
+    detector = AnomalyDetector(on_anomaly=anomaly_printer()) if args.detect else None
+    engine = TestEngine(num_workers=args.workers, recorder=recorder)
+    backend = resolve_backend(args.backend or engine.stream_backend)
+    chunk_size = args.chunk_size or engine.stream_chunk_size
+
+    input_stream = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    output_stream = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        reader = SampleReader(input_stream, input_format)
+        writer = RatingWriter(output_stream, output_format)
+        report = run_batch(reader, writer, engine, backend, chunk_size,
+                           args.simulate_delay, args.progress, args.report, detector)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+        if recorder is not None:
+            recorder.close()
+
+    workers = 1 if backend == "sequential" else engine.stream_workers
+    print_report(report, backend, workers)
+    if detector is not None:
+        print(f"Anomalies flagged: {detector.anomalies_found:,} across {len(detector.states)} locations",
+              file=sys.stderr)
+    if recorder is not None:
+        print(f"Saved {recorder.rows_written:,} samples and {recorder.runs_written} run to {args.db}",
+              file=sys.stderr)
+    if report['aggregate'] is not None:
+        print(format_report(report['aggregate']), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
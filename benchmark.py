@@ -0,0 +1,598 @@
+"""
+Benchmark Script
+Measures engine and GUI costs that the demo does not show
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+from test_engine import STREAM_BACKENDS, TestEngine, resolve_backend
+
+
+def benchmark_cold_start(num_workers: int = None, repeats: int = 3) -> List[Dict]:
+    """
+    Measure time-to-first-result of a cold process pool per start method.
+
+    Args:
+        num_workers: Pool size (defaults to CPU count)
+        repeats: Number of cold pools created per start method
+
+    Returns:
+        One result dictionary per available start method
+    """
+    results = []
+
+    for start_method in mp.get_all_start_methods():
+        engine = TestEngine(num_workers=num_workers, start_method=start_method)
+        timings = [engine.measure_cold_start() for _ in range(repeats)]
+
+        results.append({
+            'start_method': start_method,
+            'first': timings[0],
+            'best': min(timings),
+            'mean': sum(timings) / len(timings)
+        })
+
+    return results
+
+
+def print_cold_start(results: List[Dict]):
+    """Print the cold-start table"""
+    print("\n" + "-"*60)
+    print("COLD POOL TIME-TO-FIRST-RESULT")
+    print("-"*60)
+    print(f"  {'Start method':14} {'First':>10} {'Best':>10} {'Mean':>10}")
+    for result in results:
+        print(f"  {result['start_method']:14} "
+              f"{result['first'] * 1000:8.1f}ms "
+              f"{result['best'] * 1000:8.1f}ms "
+              f"{result['mean'] * 1000:8.1f}ms")
+
+
+# Modules timed by the import benchmark, from the cheapest to the GUI
+IMPORT_BENCHMARK_MODULES = ['water_sample', 'test_engine', 'distributed', 'main']
+
+
+def measure_import_time(module: str) -> Dict[str, float]:
+    """
+    Import a module in a fresh interpreter using ``-X importtime``.
+
+    Args:
+        module: Name of the module to import
+
+    Returns:
+        Dictionary with the module's own and cumulative import time in
+        seconds, and the wall time of the whole interpreter run
+    """
+    env = dict(os.environ)
+    env.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               capture_output=True, text=True, env=env, check=True)
+    wall = time.perf_counter() - start
+
+    # Lines look like "import time:  self [us] | cumulative | [indent]name";
+    # the module itself is reported last, after everything it imported
+    for line in reversed(completed.stderr.splitlines()):
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            self_us = int(fields[0].split(':')[1])
+            return {'self': self_us / 1e6, 'cumulative': int(fields[1]) / 1e6, 'wall': wall}
+
+    raise RuntimeError(f"no import time reported for {module}")
+
+
+def benchmark_import_time(modules: List[str] = None, repeats: int = 3) -> List[Dict]:
+    """
+    Measure how long each project module takes to import.
+
+    Every measurement runs in a new interpreter, so nothing is cached in
+    sys.modules; the best of ``repeats`` runs is reported.
+
+    Args:
+        modules: Module names (defaults to IMPORT_BENCHMARK_MODULES)
+        repeats: Number of fresh interpreters per module
+
+    Returns:
+        One result dictionary per module
+    """
+    results = []
+    for module in modules or IMPORT_BENCHMARK_MODULES:
+        timings = [measure_import_time(module) for _ in range(repeats)]
+        best = min(timings, key=lambda timing: timing['cumulative'])
+        results.append({'module': module, **best})
+    return results
+
+
+def print_import_time(results: List[Dict]):
+    """Print the import-time table"""
+    print("\n" + "-"*60)
+    print("IMPORT TIME (best of fresh interpreters)")
+    print("-"*60)
+    print(f"  {'Module':14} {'Self':>10} {'Total':>10} {'Startup':>10}")
+    for result in results:
+        print(f"  {result['module']:14} "
+              f"{result['self'] * 1000:8.1f}ms "
+              f"{result['cumulative'] * 1000:8.1f}ms "
+              f"{result['wall'] * 1000:8.1f}ms")
+
+
+def benchmark_render_cache(num_frames: int = 300, num_samples: int = 30) -> List[Dict]:
+    """
+    Measure GUI frame time with and without the render caches.
+
+    Also measures unchanged frames, which only check for dirty rectangles.
+
+    Runs headless on the SDL dummy video driver, so no display is needed.
+
+    Args:
+        num_frames: Frames drawn per configuration
+        num_samples: Samples (test tubes) on screen
+
+    Returns:
+        One result dictionary per configuration
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import main as gui
+
+    results = []
+    for use_render_cache in (False, True):
+        app = gui.WaterQualityLabGUI(use_render_cache=use_render_cache)
+        while len(app.samples) < num_samples:
+            app.add_sample()
+        app.selected_sample = app.samples[0]
+
+        # Full redraws, as when the whole window has to be repainted
+        frame_times = []
+        for _ in range(num_frames):
+            app.invalidate_all()
+            frame_start = time.perf_counter()
+            app.draw()
+            frame_times.append(time.perf_counter() - frame_start)
+
+        results.append(summarize_frame_times(
+            "full, cache on" if use_render_cache else "full, cache off", frame_times))
+
+    # Unchanged frames only pay for dirty-rectangle checks
+    frame_times = []
+    for _ in range(num_frames):
+        frame_start = time.perf_counter()
+        app.draw()
+        frame_times.append(time.perf_counter() - frame_start)
+    results.append(summarize_frame_times("idle, dirty rects", frame_times))
+
+    return results
+
+
+def summarize_frame_times(label: str, frame_times: List[float]) -> Dict:
+    """Reduce a list of frame times to mean and 95th percentile"""
+    frame_times = sorted(frame_times)
+    return {
+        'label': label,
+        'mean': sum(frame_times) / len(frame_times),
+        'p95': frame_times[max(0, int(len(frame_times) * 0.95) - 1)]
+    }
+
+
+def print_render_cache(results: List[Dict]):
+    """Print the frame-time comparison"""
+    print("\n" + "-"*60)
+    print("GUI FRAME TIME (draw only)")
+    print("-"*60)
+    print(f"  {'Frame':18} {'Mean':>10} {'p95':>10}")
+    for result in results:
+        print(f"  {result['label']:18} {result['mean'] * 1000:8.3f}ms {result['p95'] * 1000:8.3f}ms")
+
+    if results[1]['mean'] > 0:
+        print(f"\n  Speedup from caching: {results[0]['mean'] / results[1]['mean']:.2f}x")
+
+
+def benchmark_samples(num_samples: int, scenario: str = None) -> List:
+    """
+    Tested samples for the data benchmarks.
+
+    Args:
+        num_samples: Number of samples
+        scenario: Workload scenario to draw them from (see workload.py);
+                  by default they come from WaterSample.generate_random_sample
+
+    Returns:
+        List of tested WaterSample objects
+    """
+    if scenario is not None:
+        from workload import Workload, load_scenario
+        return list(Workload(load_scenario(scenario), num_samples).samples(tested=True))
+
+    from water_sample import WaterSample
+    samples = [WaterSample.generate_random_sample(sample_id) for sample_id in range(num_samples)]
+    for sample in samples:
+        sample.tested = True
+    return samples
+
+
+def benchmark_backends(num_samples: int = 200_000, num_workers: int = None, chunk_size: int = None,
+                       repeats: int = 3, scenario: str = None) -> List[Dict]:
+    """
+    Measure CPU-bound rating throughput of every execution backend.
+
+    Samples are rated without the simulated instrument delay, so the run is
+    all CPU: parallel backends only win where their workers execute Python
+    at the same time. Pool start-up is included, as in a real batch. An
+    optional backend that is unavailable here is reported with the
+    backend it falls back to.
+
+    Args:
+        num_samples: Samples rated per run
+        num_workers: Pool size (defaults to the engine's)
+        chunk_size: Samples per task (defaults to the engine's)
+        repeats: Runs per backend; the best is kept
+        scenario: Workload scenario to draw the samples from
+
+    Returns:
+        One result dictionary per backend
+    """
+    samples = benchmark_samples(num_samples, scenario)
+    engine = TestEngine(num_workers=num_workers)
+
+    results = []
+    for backend in STREAM_BACKENDS:
+        runs_as = resolve_backend(backend)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for _ in engine.test_stream(samples, backend, chunk_size):
+                pass
+            timings.append(time.perf_counter() - start)
+        results.append({
+            'backend': backend,
+            'runs_as': runs_as,
+            'num_workers': 1 if runs_as == 'sequential' else engine.stream_workers,
+            'best': min(timings),
+            'throughput': num_samples / min(timings)
+        })
+    return results
+
+
+def print_backends(results: List[Dict], num_samples: int):
+    """Print the backend throughput table"""
+    print("\n" + "-"*60)
+    print(f"CPU-BOUND RATING BY BACKEND ({num_samples:,} SAMPLES)")
+    print("-"*60)
+    print(f"  {'Backend':17} {'Workers':>7} {'Best':>10} {'Samples/sec':>14}")
+    for result in results:
+        note = "" if result['runs_as'] == result['backend'] else f"  (unavailable, ran {result['runs_as']})"
+        print(f"  {result['backend']:17} {result['num_workers']:7} {result['best'] * 1000:8.1f}ms "
+              f"{result['throughput']:14,.0f}{note}")
+
+
+def benchmark_rerate(num_samples: int = 200_000, scenario: str = None) -> List[Dict]:
+    """
+    Measure re-rating a stored history after the scoring rules change.
+
+    Compares calling get_quality_rating() on every sample with
+    SampleStore.rerate(), which re-scores only the samples near the
+    changed limits. Each change is applied to a fresh store (indexes
+    already built) and starts from the default rules.
+
+    Args:
+        num_samples: Size of the stored history
+        scenario: Workload scenario to draw the samples from
+
+    Returns:
+        One result dictionary per rule change
+    """
+    import copy
+
+    import scoring
+    from config import SCORING_RULES
+    from sample_store import SampleStore
+
+    samples = benchmark_samples(num_samples, scenario)
+
+    tightened = copy.deepcopy(SCORING_RULES)
+    tightened['nitrate'][0]['below'] = 8.0
+    changes = [("nitrate limit 10 -> 8", scoring.CompiledRules(tightened)),
+               ("Good threshold 70 -> 75", scoring.CompiledRules(
+                   thresholds=[("Excellent", 90), ("Good", 75), ("Moderate", 50), ("Poor", 30)]))]
+
+    results = []
+    for label, rules in changes:
+        previous = scoring.set_rules(rules)
+        try:
+            start = time.perf_counter()
+            for sample in samples:
+                sample.get_quality_rating()
+            full_time = time.perf_counter() - start
+        finally:
+            scoring.set_rules(previous)
+
+        store = SampleStore()
+        store.add_samples(samples)
+        store.build_indexes()
+        report = store.rerate(rules)
+        results.append({'label': label, 'full': full_time, 'report': report})
+    return results
+
+
+def print_rerate(results: List[Dict]):
+    """Print the re-rating comparison"""
+    print("\n" + "-"*60)
+    print("RE-RATING AFTER A RULE CHANGE")
+    print("-"*60)
+    print(f"  {'Change':26} {'Touched':>12} {'Full':>10} {'Indexed':>10}")
+    for result in results:
+        report = result['report']
+        print(f"  {result['label']:26} {report.touched / report.total * 100:11.2f}% "
+              f"{result['full'] * 1000:8.1f}ms {report.elapsed * 1000:8.1f}ms")
+
+
+def benchmark_query(num_samples: int = 1_000_000, repeats: int = 3, scenario: str = None) -> List[Dict]:
+    """
+    Measure indexed queries against a Python scan of the sample list.
+
+    Args:
+        num_samples: Samples stored
+        repeats: Runs per query (the best is reported)
+        scenario: Workload scenario to draw the samples from
+
+    Returns:
+        One result dictionary for the index build, then one per query
+    """
+    from query import SampleQuery
+    from sample_store import SampleStore
+
+    samples = benchmark_samples(num_samples, scenario)
+    store = SampleStore()
+    store.add_samples(samples)
+    start = time.perf_counter()
+    store.build_indexes()
+    results = [{'label': "build indexes", 'first': time.perf_counter() - start, 'best': None, 'scan': None}]
+
+    queries = [
+        ("Industrial, coliform>50, nitrate>30",
+         lambda: SampleQuery(store).location("Industrial Area")
+         .where("coliform", ">", 50).where("nitrate", ">", 30).positions(),
+         lambda s: s.source_location == "Industrial Area" and s.total_coliform > 50 and s.nitrate_level > 30),
+        ("turbidity < 1",
+         lambda: SampleQuery(store).where("turbidity", "<", 1).positions(),
+         lambda s: s.turbidity < 1),
+        ("10 worst coliform, pH < 6",
+         lambda: SampleQuery(store).where("ph", "<", 6).worst(10, by="coliform"),
+         None),
+        ("10 lowest scores, Reservoir",
+         lambda: SampleQuery(store).location("Reservoir").worst(10),
+         None),
+    ]
+
+    for label, indexed, predicate in queries:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            indexed()
+            timings.append(time.perf_counter() - start)
+
+        scan = None
+        if predicate is not None:
+            start = time.perf_counter()
+            [sample for sample in samples if predicate(sample)]
+            scan = time.perf_counter() - start
+        results.append({'label': label, 'first': timings[0], 'best': min(timings), 'scan': scan})
+    return results
+
+
+def print_query(results: List[Dict], num_samples: int):
+    """Print the query timings"""
+    print("\n" + "-"*60)
+    print(f"QUERIES OVER {num_samples:,} SAMPLES")
+    print("-"*60)
+    print(f"  {'Query':36} {'First':>9} {'Best':>9} {'Scan':>9}")
+    for result in results:
+        best = f"{result['best'] * 1000:7.2f}ms" if result['best'] is not None else f"{'-':>9}"
+        scan = f"{result['scan'] * 1000:7.1f}ms" if result['scan'] is not None else f"{'-':>9}"
+        print(f"  {result['label']:36} {result['first'] * 1000:7.2f}ms {best} {scan}")
+
+
+def benchmark_sqlite(num_samples: int = 200_000, batch_size: int = None, scenario: str = None) -> List[Dict]:
+    """
+    Measure SQLite insert and read throughput of persistence.py.
+
+    Uses a database in a temporary directory that is removed afterwards.
+
+    Args:
+        num_samples: Samples written and read back
+        batch_size: Rows per transaction (defaults to persistence.DEFAULT_BATCH_SIZE)
+        scenario: Workload scenario to draw the samples from
+
+    Returns:
+        One result dictionary (label, rows, seconds) per operation
+    """
+    import shutil
+    import tempfile
+
+    from persistence import DEFAULT_BATCH_SIZE, BackgroundWriter, SampleDatabase
+
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    samples = benchmark_samples(num_samples, scenario)
+
+    directory = tempfile.mkdtemp(prefix="wql-bench-")
+    results = []
+    try:
+        path = os.path.join(directory, "direct.db")
+        with SampleDatabase(path) as database:
+            start = time.perf_counter()
+            database.insert_samples(samples, batch_size=batch_size)
+            results.append({'label': "insert (executemany)", 'rows': num_samples,
+                            'seconds': time.perf_counter() - start})
+
+        # The caller only pays for queueing; the writer thread does the rest
+        writer = BackgroundWriter(os.path.join(directory, "background.db"), batch_size)
+        start = time.perf_counter()
+        for position in range(0, num_samples, batch_size):
+            writer.submit_samples(samples[position:position + batch_size])
+        submitted = time.perf_counter() - start
+        writer.close()
+        results.append({'label': "background submit", 'rows': num_samples, 'seconds': submitted})
+        results.append({'label': "background committed", 'rows': num_samples,
+                        'seconds': time.perf_counter() - start})
+
+        with SampleDatabase(path) as database:
+            start = time.perf_counter()
+            rows = sum(len(batch) for batch in database.iter_batches(batch_size))
+            results.append({'label': "stream all", 'rows': rows, 'seconds': time.perf_counter() - start})
+
+            start = time.perf_counter()
+            rows = sum(len(batch) for batch in database.iter_batches(batch_size, location="Reservoir"))
+            results.append({'label': "stream one location", 'rows': rows,
+                            'seconds': time.perf_counter() - start})
+
+            start = time.perf_counter()
+            rows = database.count(location="Industrial Area", quality="Unsafe")
+            results.append({'label': "indexed count", 'rows': rows, 'seconds': time.perf_counter() - start})
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return results
+
+
+def print_sqlite(results: List[Dict]):
+    """Print the SQLite throughput table"""
+    print("\n" + "-"*60)
+    print("SQLITE PERSISTENCE (WAL)")
+    print("-"*60)
+    print(f"  {'Operation':22} {'Rows':>10} {'Time':>10} {'Rows/sec':>12}")
+    for result in results:
+        rate = result['rows'] / result['seconds'] if result['seconds'] > 0 else 0
+        print(f"  {result['label']:22} {result['rows']:>10,} {result['seconds'] * 1000:8.1f}ms {rate:>12,.0f}")
+
+
+def benchmark_timeseries(num_samples: int = 1_000_000, days: int = 90, scenario: str = None) -> List[Dict]:
+    """
+    Measure time-series appends and rollup queries against raw reads.
+
+    Samples are spread evenly over the given number of days (or arrive
+    as a workload scenario says) and appended in batches of 10,000, as a
+    live feed would deliver them.
+
+    Args:
+        num_samples: Samples appended
+        days: Days of history they cover (without a scenario)
+        scenario: Workload scenario to draw the samples from
+
+    Returns:
+        One result dictionary (label, seconds, detail) per operation
+    """
+    import random
+
+    from timeseries import TimeSeriesStore
+
+    samples = benchmark_samples(num_samples, scenario)
+    if scenario is None:
+        end = time.time()
+        start = end - days * 86400
+        for sample in samples:
+            sample.collected_at = random.uniform(start, end)
+        samples.sort(key=lambda sample: sample.collected_at)
+    else:
+        # Workload samples arrive in time order, as the scenario spreads them
+        start, end = samples[0].collected_at, samples[-1].collected_at
+        days = max(1, round((end - start) / 86400))
+
+    series = TimeSeriesStore()
+    append_start = time.perf_counter()
+    for position in range(0, num_samples, 10_000):
+        series.append_samples(samples[position:position + 10_000])
+    results = [{'label': "append", 'seconds': time.perf_counter() - append_start,
+                'detail': f"{num_samples / (time.perf_counter() - append_start):,.0f} samples/sec"}]
+
+    location = "Reservoir"
+    window_start, window_end = end - 30 * 86400 - 1234.5, end - 4321.0
+
+    query_start = time.perf_counter()
+    summary = series.summary(location, window_start, window_end)
+    results.append({'label': "30-day summary", 'seconds': time.perf_counter() - query_start,
+                    'detail': f"{summary.count:,} samples, {summary.raw_samples} read raw"})
+
+    query_start = time.perf_counter()
+    timestamps, values, _ = series.raw(location, window_start, window_end)
+    values['nitrate'].mean()
+    results.append({'label': "30-day raw read", 'seconds': time.perf_counter() - query_start,
+                    'detail': f"{len(timestamps):,} samples"})
+
+    query_start = time.perf_counter()
+    daily = series.downsample(location, start, end, 'day')
+    results.append({'label': f"{days}-day daily rollup", 'seconds': time.perf_counter() - query_start,
+                    'detail': f"{len(daily.times)} buckets"})
+
+    query_start = time.perf_counter()
+    times, _, _, _ = series.rolling(location, 'nitrate', 24 * 3600, start, end)
+    results.append({'label': "24h rolling, hourly", 'seconds': time.perf_counter() - query_start,
+                    'detail': f"{len(times):,} windows"})
+    return results
+
+
+def print_timeseries(results: List[Dict], num_samples: int):
+    """Print the time-series timings"""
+    print("\n" + "-"*60)
+    print(f"TIME SERIES ({num_samples:,} SAMPLES)")
+    print("-"*60)
+    for result in results:
+        print(f"  {result['label']:22} {result['seconds'] * 1000:9.2f}ms  {result['detail']}")
+
+
+def main():
+    """Run all benchmarks and print a report"""
+    parser = argparse.ArgumentParser(description="Water quality lab benchmarks")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of pool workers (default: CPU count)")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Repetitions per measurement")
+    parser.add_argument("--render", action="store_true",
+                        help="Also measure GUI frame time (headless)")
+    parser.add_argument("--frames", type=int, default=300,
+                        help="Frames drawn per render measurement")
+    parser.add_argument("--rerate", type=int, default=0, metavar="SAMPLES",
+                        help="Also measure re-rating a history of this many samples")
+    parser.add_argument("--query", type=int, default=0, metavar="SAMPLES",
+                        help="Also measure indexed queries over this many stored samples")
+    parser.add_argument("--sqlite", type=int, default=0, metavar="SAMPLES",
+                        help="Also measure SQLite insert/read throughput with this many samples")
+    parser.add_argument("--timeseries", type=int, default=0, metavar="SAMPLES",
+                        help="Also measure time-series appends and rollup queries")
+    parser.add_argument("--backends", type=int, default=0, metavar="SAMPLES",
+                        help="Also measure CPU-bound rating throughput of every execution backend")
+    parser.add_argument("--scenario", default=None,
+                        help="Draw the samples of the data benchmarks from this workload scenario (see workload.py)")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("WATER QUALITY LAB - BENCHMARKS")
+    print("="*60)
+    print(f"Default start method: {mp.get_start_method()}")
+
+    print_import_time(benchmark_import_time(repeats=args.repeats))
+    print_cold_start(benchmark_cold_start(args.workers, args.repeats))
+
+    if args.render:
+        print_render_cache(benchmark_render_cache(args.frames))
+    if args.backends:
+        print_backends(benchmark_backends(args.backends, args.workers, repeats=args.repeats,
+                                          scenario=args.scenario), args.backends)
+    if args.rerate:
+        print_rerate(benchmark_rerate(args.rerate, args.scenario))
+    if args.query:
+        print_query(benchmark_query(args.query, args.repeats, args.scenario), args.query)
+    if args.sqlite:
+        print_sqlite(benchmark_sqlite(args.sqlite, scenario=args.scenario))
+    if args.timeseries:
+        print_timeseries(benchmark_timeseries(args.timeseries, scenario=args.scenario), args.timeseries)
+
+    print("\n" + "="*60)
+
+
+if __name__ == "__main__":
+    main()
@@ -42,6 +42,19 @@ PRESET_SAMPLES = {
     ]
 }
 
+# Parameter ranges of each quality class of random samples
+# (WaterSample.generate_random_sample and the workload generator);
+# coliform ranges are inclusive integer counts. The ranges are calibrated
+# against SCORING_RULES and RATING_THRESHOLDS below: every sample drawn
+# from a class rates as that class (workload.check_quality_profiles).
+QUALITY_PROFILES = {
+    "excellent": {"ph": (7.0, 8.0), "turbidity": (0.5, 2.0), "dissolved_oxygen": (7.0, 10.0), "coliform": (0, 1), "nitrate": (0.5, 3.0)},
+    "good": {"ph": (6.5, 8.5), "turbidity": (5.0, 12.0), "dissolved_oxygen": (6.0, 8.0), "coliform": (1, 9), "nitrate": (3.0, 9.0)},
+    "moderate": {"ph": (6.5, 8.5), "turbidity": (5.0, 14.0), "dissolved_oxygen": (4.0, 5.9), "coliform": (10, 49), "nitrate": (10.0, 19.0)},
+    "poor": {"ph": (6.5, 8.5), "turbidity": (15.0, 50.0), "dissolved_oxygen": (2.0, 3.9), "coliform": (10, 49), "nitrate": (10.0, 19.0)},
+    "unsafe": {"ph": (4.0, 11.0), "turbidity": (50.0, 200.0), "dissolved_oxygen": (0.5, 2.0), "coliform": (200, 1000), "nitrate": (30.0, 100.0)},
+}
+
 # Water quality parameter ranges
 PARAMETER_RANGES = {
     "ph": {
@@ -77,6 +90,45 @@ PARAMETER_RANGES = {
     }
 }
 
+# Quality scoring rules, compiled by scoring.py. Each parameter lists score
+# bands from best to worst; a value earns the score of the first band it
+# falls in, or 0 if none. Band bounds: "min" (value >= min), "max"
+# (value <= max), "above" (value > above) and "below" (value < below).
+# The top band of each parameter is its ideal range.
+SCORING_RULES = {
+    "ph": [
+        {"min": PARAMETER_RANGES["ph"]["ideal_min"], "max": PARAMETER_RANGES["ph"]["ideal_max"], "score": 1.0},
+        {"min": 6.0, "max": 9.0, "score": 0.5}
+    ],
+    "turbidity": [
+        {"below": PARAMETER_RANGES["turbidity"]["ideal_max"], "score": 1.0},
+        {"below": 15.0, "score": 0.5}
+    ],
+    "dissolved_oxygen": [
+        {"min": PARAMETER_RANGES["dissolved_oxygen"]["ideal_min"], "score": 1.0},
+        {"min": 4.0, "score": 0.5}
+    ],
+    "coliform": [
+        {"max": PARAMETER_RANGES["coliform"]["ideal"], "score": 1.0},
+        {"below": 10, "score": 0.7},
+        {"below": 50, "score": 0.3}
+    ],
+    "nitrate": [
+        {"below": PARAMETER_RANGES["nitrate"]["ideal_max"], "score": 1.0},
+        {"below": 20.0, "score": 0.5}
+    ]
+}
+
+# Minimum score (percent of the maximum) for each rating, best first;
+# anything lower is rated RATING_FLOOR
+RATING_THRESHOLDS = [
+    ("Excellent", 90),
+    ("Good", 70),
+    ("Moderate", 50),
+    ("Poor", 30)
+]
+RATING_FLOOR = "Unsafe"
+
 # Testing configuration
 TEST_CONFIG = {
     "min_test_duration": 1.0,  # seconds
@@ -84,3 +136,64 @@ TEST_CONFIG = {
     "max_samples": 30,
     "default_samples": 6
 }
+
+# Streaming anomaly detection (anomaly.py); deviations are measured in
+# standard deviations of each location's recent values
+ANOMALY_CONFIG = {
+    "alpha": 0.05,           # EWMA weight of the newest sample
+    "warmup": 30,            # samples per location before anything is flagged
+    "spike_z": 6.0,          # a single value this far from the mean is a spike
+    "cusum_slack": 0.5,      # drift tolerated per sample before CUSUM accumulates
+    "cusum_threshold": 8.0   # accumulated drift that flags a sustained shift
+}
+
+# Named synthetic workloads (workload.py). A scenario either scales up one
+# of PRESET_SAMPLES ("preset", each row repeated with relative "jitter"),
+# or draws samples per location from QUALITY_PROFILES ("locations": weight
+# and optional quality_mix each; "quality_mix" is the default mix).
+# "arrival" sets collection times: "steady" at "rate" samples/sec, "bursty"
+# with "burst_rate" for "burst_length" seconds every "burst_every" seconds,
+# or "diurnal" peaking at "peak_hour" (UTC) with relative "amplitude".
+# "duration" sets test durations: "uniform" (low, high), "normal" (mean,
+# std) or "lognormal" (median, sigma). Scenario files use the same keys.
+WORKLOAD_SCENARIOS = {
+    "excellent_set_1m": {
+        "preset": "excellent_set", "jitter": 0.05, "samples": 1_000_000,
+        "arrival": {"pattern": "steady", "rate": 10.0}
+    },
+    "mixed_quality_1m": {
+        "preset": "mixed_quality", "jitter": 0.1, "samples": 1_000_000,
+        "arrival": {"pattern": "steady", "rate": 10.0}
+    },
+    "contaminated_set_1m": {
+        "preset": "contaminated_set", "jitter": 0.1, "samples": 1_000_000,
+        "arrival": {"pattern": "steady", "rate": 10.0}
+    },
+    "field_network": {
+        "samples": 5_000_000,
+        "quality_mix": {"excellent": 0.3, "good": 0.35, "moderate": 0.2, "poor": 0.1, "unsafe": 0.05},
+        "locations": {
+            "Mountain Spring": {"weight": 1, "quality_mix": {"excellent": 0.7, "good": 0.25, "moderate": 0.05}},
+            "Natural Spring": {"weight": 1, "quality_mix": {"excellent": 0.6, "good": 0.3, "moderate": 0.1}},
+            "Treatment Plant": {"weight": 3, "quality_mix": {"excellent": 0.5, "good": 0.45, "moderate": 0.05}},
+            "Municipal Supply": {"weight": 4, "quality_mix": {"excellent": 0.4, "good": 0.5, "moderate": 0.1}},
+            "Reservoir": {"weight": 3},
+            "River Delta": {"weight": 2},
+            "Urban Lake": {"weight": 2},
+            "Coastal Bay": {"weight": 1},
+            "Underground Well": {"weight": 2},
+            "Agricultural Runoff": {"weight": 2, "quality_mix": {"moderate": 0.4, "poor": 0.4, "unsafe": 0.2}},
+            "Industrial Area": {"weight": 1, "quality_mix": {"moderate": 0.2, "poor": 0.4, "unsafe": 0.4}}
+        },
+        "arrival": {"pattern": "diurnal", "rate": 20.0, "peak_hour": 14, "amplitude": 0.6},
+        "duration": {"distribution": "lognormal", "median": 2.0, "sigma": 0.25}
+    },
+    "storm_bursts": {
+        "samples": 2_000_000,
+        "quality_mix": {"excellent": 0.1, "good": 0.25, "moderate": 0.3, "poor": 0.25, "unsafe": 0.1},
+        "locations": {location: {"weight": 1} for location in SAMPLE_LOCATIONS},
+        "arrival": {"pattern": "bursty", "rate": 2.0, "burst_rate": 100.0,
+                    "burst_every": 6 * 3600, "burst_length": 900},
+        "duration": {"distribution": "normal", "mean": 2.0, "std": 0.4}
+    }
+}
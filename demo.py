@@ -3,8 +3,9 @@ Demo Script
 Quick demonstration of the water quality testing simulation
 """
 
-from water_sample import WaterSample, WaterQuality
+from water_sample import WaterSample
 from test_engine import TestEngine
+from aggregation import QualityAggregate
 
 
 def print_sample_details(sample: WaterSample):
@@ -97,17 +98,7 @@ def demo_sequential_vs_parallel():
     print("WATER QUALITY RESULTS")
     print("="*60)
     
-    quality_counts = {
-        WaterQuality.EXCELLENT: 0,
-        WaterQuality.GOOD: 0,
-        WaterQuality.MODERATE: 0,
-        WaterQuality.POOR: 0,
-        WaterQuality.UNSAFE: 0
-    }
-    
-    for sample in tested_samples_par:
-        quality = sample.get_quality_rating()
-        quality_counts[quality] += 1
+    quality_counts = QualityAggregate.from_samples(tested_samples_par).quality_totals()
     
     print("\nQuality Distribution:")
     for quality, count in quality_counts.items():
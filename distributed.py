@@ -0,0 +1,422 @@
+"""
+Distributed Testing Module
+Spreads water quality tests across worker daemons on several machines
+
+A coordinator listens on a TCP port and hands out chunks of samples to
+connected worker daemons. Workers send heartbeats while they test a chunk;
+if a worker disconnects or goes silent, its chunk is put back in the queue
+and picked up by another worker. Every task and result carries the
+generation of the run it belongs to, so a late result from an abandoned
+run is dropped instead of being taken for a chunk of the next one.
+
+Messages are pickles, so a peer that knows the shared secret can run code
+on the other side. There is no built-in secret: set WQL_AUTHKEY on the
+coordinator and every worker. A coordinator that only listens on loopback
+and has no secret generates a random one for the workers it spawns.
+
+Start a worker daemon on each lab server with:
+    WQL_AUTHKEY=<secret> python distributed.py --host <coordinator-host> --port <port>
+"""
+
+import argparse
+import ipaddress
+import os
+import queue
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List, Optional, Tuple
+
+from water_sample import WaterSample
+
+
+DEFAULT_PORT = 5055
+DEFAULT_HEARTBEAT_INTERVAL = 1.0
+DEFAULT_HEARTBEAT_TIMEOUT = 5.0
+AUTHKEY_ENV_VAR = "WQL_AUTHKEY"
+
+# Message tags of the framed protocol (each message is a pickled tuple)
+MSG_HELLO = "hello"
+MSG_TASK = "task"
+MSG_HEARTBEAT = "heartbeat"
+MSG_RESULT = "result"
+MSG_SHUTDOWN = "shutdown"
+
+
+def get_default_authkey() -> Optional[bytes]:
+    """Read the shared secret used to authenticate workers (None if WQL_AUTHKEY is unset)"""
+    authkey = os.environ.get(AUTHKEY_ENV_VAR)
+    return authkey.encode() if authkey else None
+
+
+def is_loopback(host: str) -> bool:
+    """Check whether a listen address only accepts connections from this machine"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class Coordinator:
+    """
+    Coordinator that distributes sample chunks to remote worker daemons.
+
+    Each connected worker is served by its own handler thread, which pulls
+    chunks from a shared queue. A chunk stays assigned to a worker until its
+    results arrive; if the connection breaks or no heartbeat is received
+    within ``heartbeat_timeout`` seconds, the chunk is requeued.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 authkey: bytes = None,
+                 heartbeat_timeout: float = DEFAULT_HEARTBEAT_TIMEOUT):
+        """
+        Initialize the coordinator.
+
+        Args:
+            host: Interface to listen on ("0.0.0.0" for all lab servers)
+            port: TCP port to listen on (0 picks a free port)
+            authkey: Shared secret workers must present (defaults to
+                     WQL_AUTHKEY; on loopback, a random one if that is unset)
+            heartbeat_timeout: Seconds of silence before a worker is declared
+                               dead, and how long run() waits with no workers
+
+        Raises:
+            ValueError: If no secret is given for a non-loopback host
+        """
+        authkey = authkey or get_default_authkey()
+        if authkey is None:
+            if not is_loopback(host):
+                raise ValueError(f"Listening on {host} needs a shared secret: set {AUTHKEY_ENV_VAR} "
+                                 f"or pass authkey")
+            authkey = secrets.token_hex(16).encode()
+        self.authkey = authkey
+        self.heartbeat_timeout = heartbeat_timeout
+        self.listener = Listener((host, port), authkey=self.authkey)
+        self.address: Tuple[str, int] = self.listener.address
+
+        self._pending: "queue.Queue[Tuple[int, int, List[WaterSample]]]" = queue.Queue()
+        self._results: Dict[int, List[WaterSample]] = {}
+        self._remaining = 0
+        self._generation = 0
+        self._done = threading.Condition()
+        self._workers: Dict[str, float] = {}
+        self._workers_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._local_processes: List[subprocess.Popen] = []
+        self._reassigned_lock = threading.Lock()
+        self.reassigned_chunks = 0
+
+        self._accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._accept_thread.start()
+
+    @property
+    def worker_count(self) -> int:
+        """Number of currently connected worker daemons"""
+        with self._workers_lock:
+            return len(self._workers)
+
+    def wait_for_workers(self, count: int, timeout: float = 30.0) -> bool:
+        """
+        Block until at least ``count`` workers are connected.
+
+        Returns:
+            True if enough workers connected before the timeout
+        """
+        deadline = time.time() + timeout
+        while self.worker_count < count:
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def spawn_local_workers(self, count: int, num_threads: int = None) -> List[subprocess.Popen]:
+        """
+        Start worker daemons on this machine (useful for testing).
+
+        Args:
+            count: Number of worker daemons to start
+            num_threads: Test threads per worker daemon
+
+        Returns:
+            List of started worker processes
+        """
+        host, port = self.address
+        env = dict(os.environ)
+        env[AUTHKEY_ENV_VAR] = self.authkey.decode()
+        command = [sys.executable, os.path.abspath(__file__),
+                   "--host", host, "--port", str(port)]
+        if num_threads:
+            command += ["--threads", str(num_threads)]
+
+        processes = [subprocess.Popen(command, env=env) for _ in range(count)]
+        self._local_processes.extend(processes)
+        return processes
+
+    def run(self, samples: List[WaterSample], chunk_size: int = 4,
+            timeout: Optional[float] = None) -> List[WaterSample]:
+        """
+        Test samples on the connected workers.
+
+        Args:
+            samples: List of WaterSample objects to test
+            chunk_size: Number of samples sent to a worker at a time
+            timeout: Maximum seconds to wait for all chunks (None waits for as
+                     long as workers are connected)
+
+        Returns:
+            Tested samples in their original order
+
+        Raises:
+            TimeoutError: If chunks are still outstanding after ``timeout``
+            RuntimeError: If no worker has been connected for
+                          ``heartbeat_timeout`` seconds while chunks are outstanding
+        """
+        chunks = [samples[i:i + chunk_size] for i in range(0, len(samples), chunk_size)]
+
+        with self._done:
+            self._generation += 1
+            generation = self._generation
+            self._results = {}
+            self._remaining = len(chunks)
+        for chunk_id, chunk in enumerate(chunks):
+            self._pending.put((generation, chunk_id, chunk))
+
+        deadline = None if timeout is None else time.time() + timeout
+        last_worker_seen = time.time()
+        with self._done:
+            while self._remaining > 0:
+                now = time.time()
+                if deadline is not None and now >= deadline:
+                    self._clear_pending()
+                    raise TimeoutError(f"{self._remaining} of {len(chunks)} chunks still outstanding")
+                if self.worker_count > 0:
+                    last_worker_seen = now
+                elif now - last_worker_seen >= self.heartbeat_timeout:
+                    self._clear_pending()
+                    raise RuntimeError(f"No workers connected; {self._remaining} of {len(chunks)} "
+                                       f"chunks still outstanding")
+                wait = 0.2 if deadline is None else min(0.2, deadline - now)
+                self._done.wait(wait)
+            results = self._results
+
+        tested_samples = []
+        for chunk_id in range(len(chunks)):
+            tested_samples.extend(results[chunk_id])
+        return tested_samples
+
+    def _is_current(self, generation: int) -> bool:
+        """Check whether a chunk belongs to the run in progress (not an abandoned one)"""
+        with self._done:
+            return generation == self._generation and self._remaining > 0
+
+    def _clear_pending(self):
+        """Drop the chunks of an abandoned run so a later run does not receive them"""
+        while True:
+            try:
+                self._pending.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self):
+        """Shut down all workers and stop listening"""
+        self._closed.set()
+        try:
+            self.listener.close()
+        except OSError:
+            pass
+
+        for process in self._local_processes:
+            try:
+                process.wait(timeout=DEFAULT_HEARTBEAT_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._local_processes.clear()
+
+    def __enter__(self) -> "Coordinator":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _accept_loop(self):
+        """Accept worker connections until the coordinator is closed"""
+        while not self._closed.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                # Closed listener or a client that failed authentication
+                if self._closed.is_set():
+                    return
+                continue
+
+            threading.Thread(target=self._serve_worker, args=(conn,), daemon=True).start()
+
+    def _serve_worker(self, conn):
+        """Feed chunks to one worker and collect its results"""
+        try:
+            tag, worker_id = conn.recv()
+        except (OSError, EOFError):
+            conn.close()
+            return
+        if tag != MSG_HELLO:
+            conn.close()
+            return
+
+        with self._workers_lock:
+            self._workers[worker_id] = time.time()
+
+        try:
+            while not self._closed.is_set():
+                try:
+                    generation, chunk_id, chunk = self._pending.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                if not self._is_current(generation):
+                    continue
+
+                if not self._run_chunk(conn, worker_id, generation, chunk_id, chunk):
+                    # Worker died: give its chunk to someone else (unless its run was abandoned)
+                    if self._is_current(generation):
+                        with self._reassigned_lock:
+                            self.reassigned_chunks += 1
+                        self._pending.put((generation, chunk_id, chunk))
+                    return
+
+            try:
+                conn.send((MSG_SHUTDOWN,))
+            except OSError:
+                pass
+        finally:
+            with self._workers_lock:
+                self._workers.pop(worker_id, None)
+            conn.close()
+
+    def _run_chunk(self, conn, worker_id: str, generation: int, chunk_id: int,
+                   chunk: List[WaterSample]) -> bool:
+        """
+        Send one chunk to a worker and wait for its results.
+
+        Results are only kept while ``generation`` is still the current run.
+
+        Returns:
+            True if the results arrived, False if the worker was lost
+        """
+        try:
+            conn.send((MSG_TASK, generation, chunk_id, chunk))
+            last_seen = time.time()
+
+            while True:
+                if not conn.poll(self.heartbeat_timeout):
+                    return False
+
+                message = conn.recv()
+                last_seen = time.time()
+                with self._workers_lock:
+                    self._workers[worker_id] = last_seen
+
+                if message[0] == MSG_RESULT and message[1:3] == (generation, chunk_id):
+                    with self._done:
+                        if generation == self._generation and chunk_id not in self._results:
+                            self._results[chunk_id] = message[3]
+                            self._remaining -= 1
+                            self._done.notify_all()
+                    return True
+        except (OSError, EOFError):
+            return False
+
+
+def run_worker(host: str, port: int, authkey: bytes = None, num_threads: int = None,
+               heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL):
+    """
+    Run a worker daemon that tests chunks sent by a coordinator.
+
+    Args:
+        host: Coordinator host name or address
+        port: Coordinator port
+        authkey: Shared secret expected by the coordinator (defaults to WQL_AUTHKEY)
+        num_threads: Number of samples tested concurrently within a chunk
+        heartbeat_interval: Seconds between heartbeats while testing
+
+    Raises:
+        ValueError: If there is no shared secret
+    """
+    # Imported here so worker daemons only load what they need
+    from test_engine import TestEngine
+
+    authkey = authkey or get_default_authkey()
+    if authkey is None:
+        raise ValueError(f"No shared secret: set {AUTHKEY_ENV_VAR} to the coordinator's")
+
+    conn = Client((host, port), authkey=authkey)
+    send_lock = threading.Lock()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    conn.send((MSG_HELLO, worker_id))
+
+    def send(message):
+        with send_lock:
+            conn.send(message)
+
+    with ThreadPoolExecutor(max_workers=num_threads or os.cpu_count() or 1) as executor:
+        while True:
+            try:
+                message = conn.recv()
+            except (OSError, EOFError):
+                break
+
+            if message[0] == MSG_SHUTDOWN:
+                break
+
+            _, generation, chunk_id, chunk = message
+            testing_done = threading.Event()
+
+            def heartbeat():
+                while not testing_done.wait(heartbeat_interval):
+                    try:
+                        send((MSG_HEARTBEAT,))
+                    except OSError:
+                        return
+
+            heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+            heartbeat_thread.start()
+            try:
+                tested_chunk = list(executor.map(TestEngine.simulate_water_test, chunk))
+            finally:
+                testing_done.set()
+                heartbeat_thread.join()
+
+            try:
+                send((MSG_RESULT, generation, chunk_id, tested_chunk))
+            except OSError:
+                break
+
+    conn.close()
+
+
+def main():
+    """Worker daemon entry point"""
+    parser = argparse.ArgumentParser(description="Water quality lab worker daemon")
+    parser.add_argument("--host", default="127.0.0.1", help="Coordinator host")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Coordinator port")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Samples tested concurrently per chunk (default: CPU count)")
+    parser.add_argument("--heartbeat", type=float, default=DEFAULT_HEARTBEAT_INTERVAL,
+                        help="Seconds between heartbeats")
+    args = parser.parse_args()
+
+    if get_default_authkey() is None:
+        parser.error(f"set {AUTHKEY_ENV_VAR} to the coordinator's shared secret")
+    run_worker(args.host, args.port, num_threads=args.threads,
+               heartbeat_interval=args.heartbeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+"""
+Ingestion Module
+Receives live sensor readings over TCP and UDP and rates them as they arrive
+
+Sensors send one JSON object per reading, with the same fields batch.py
+accepts (see batch.FIELD_ALIASES), framed by a newline:
+    {"id": 17, "location": "Reservoir", "ph": 7.1, "turbidity": 3.2,
+     "do": 7.5, "coliform": 4, "nitrate": 6.0, "time": 1760000000.0}
+
+Over TCP a connection carries any number of lines; over UDP a datagram
+carries one or more lines.
+
+Readings are parsed on the event loop and queued. A batcher task cuts the
+queue into micro-batches (batch_size readings, or whatever arrived within
+max_delay) and hands them to a TestEngine executor, with at most two
+batches per worker in flight, as in TestEngine.test_stream().
+
+Backpressure: when the engine is saturated the batcher stops taking from
+the queue. Once the queue is full, TCP handlers stop reading their sockets,
+the kernel buffers fill up and the sensors' writes block, so a slow engine
+slows the sensors down instead of growing memory. UDP has no flow control,
+so datagrams that find the queue full are dropped and counted.
+
+Run a server:
+    python ingest.py --port 5056 --udp-port 5056 --backend threading
+
+and load-test it with the simulator (simulator.py).
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import time
+from concurrent.futures import Executor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from batch import row_to_sample
+from test_engine import (COPYING_BACKENDS, STREAM_BACKENDS, TestEngine, _apply_test_results, _rate_chunk,
+                         _worker_ready, resolve_backend)
+from water_sample import WaterSample
+
+
+DEFAULT_INGEST_PORT = 5056
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_DELAY = 0.05
+DEFAULT_QUEUE_SIZE = 20_000
+
+# Longest accepted message; longer lines close the TCP connection
+MAX_MESSAGE_BYTES = 64 * 1024
+
+# Kernel receive buffer requested for the UDP socket; datagrams that overflow
+# it are lost before the server sees them
+UDP_RECEIVE_BUFFER = 4 * 1024 * 1024
+
+# Seconds stop() waits for sensors to finish sending and disconnect
+DEFAULT_STOP_GRACE = 5.0
+
+# Latency percentiles are computed over the most recent readings only
+LATENCY_WINDOW = 100_000
+LATENCY_PERCENTILES = (50, 90, 99)
+
+# Called with (chunk, ratings) for every rated micro-batch, in arrival order
+BatchCallback = Callable[[List[WaterSample], List[str]], None]
+
+
+def parse_message(line: bytes, sample_id: int) -> WaterSample:
+    """
+    Build a sample from one framed sensor message.
+
+    Args:
+        line: JSON object (without or with its newline)
+        sample_id: Id used when the message has none
+
+    Returns:
+        Untested WaterSample
+
+    Raises:
+        ValueError: If the message is not a valid reading
+    """
+    try:
+        row = json.loads(line)
+    except UnicodeDecodeError as e:
+        raise ValueError(f"not UTF-8: {e}") from e
+    except RecursionError:
+        raise ValueError("nested too deeply") from None
+    if not isinstance(row, dict):
+        raise ValueError("not a JSON object")
+    try:
+        return row_to_sample(row, sample_id)
+    except (OverflowError, TypeError) as e:
+        # Such as a huge number where an integer is expected
+        raise ValueError(str(e)) from e
+
+
+class IngestStats:
+    """
+    Counters and recent latencies of an IngestServer.
+
+    Attributes:
+        received: Readings parsed and queued
+        rated: Readings rated by the engine
+        rejected: Messages that could not be parsed
+        dropped: UDP readings dropped because the queue was full
+        batches: Micro-batches rated
+        connections: TCP connections currently open
+        peak_queue: Most readings ever waiting in the queue
+        backpressure_waits: Times a TCP handler had to wait for queue space
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.rated = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.batches = 0
+        self.connections = 0
+        self.peak_queue = 0
+        self.backpressure_waits = 0
+        self._latencies = np.zeros(LATENCY_WINDOW)
+        self._latency_count = 0
+
+    def add_latencies(self, latencies: np.ndarray):
+        """Remember the arrival-to-rated latencies of one batch (seconds)"""
+        latencies = latencies[-LATENCY_WINDOW:]
+        positions = (self._latency_count + np.arange(len(latencies))) % LATENCY_WINDOW
+        self._latencies[positions] = latencies
+        self._latency_count += len(latencies)
+
+    def latency_percentiles(self) -> dict:
+        """Percentile -> latency in seconds over the recent window (empty before any rating)"""
+        recent = self._latencies[:min(self._latency_count, LATENCY_WINDOW)]
+        if not len(recent):
+            return {}
+        return dict(zip(LATENCY_PERCENTILES, np.percentile(recent, LATENCY_PERCENTILES)))
+
+    def __str__(self) -> str:
+        latency = " ".join(f"p{p}={value * 1000:.1f}ms" for p, value in self.latency_percentiles().items())
+        return (f"received {self.received:,} | rated {self.rated:,} | rejected {self.rejected:,} | "
+                f"dropped {self.dropped:,} | connections {self.connections:,} | "
+                f"peak queue {self.peak_queue:,} | latency {latency or '-'}")
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    """UDP endpoint that feeds datagrams to its server"""
+
+    def __init__(self, server: 'IngestServer'):
+        self.server = server
+
+    def datagram_received(self, data: bytes, address):
+        for line in data.splitlines():
+            if line.strip():
+                self.server._offer(line)
+
+
+class IngestServer:
+    """
+    Asyncio TCP/UDP server that micro-batches sensor readings into a TestEngine.
+
+    Every rated batch is recorded with the engine's recorder (if any) and
+    passed to on_batch; when the server stops, the run is added to the
+    engine's results_history as mode "ingest_<backend>".
+    """
+
+    def __init__(self, engine: TestEngine, backend: str = 'threading', host: str = "127.0.0.1",
+                 port: int = 0, udp_port: int = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_delay: float = DEFAULT_MAX_DELAY, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 simulate_delay: bool = False, on_batch: Optional[BatchCallback] = None):
+        """
+        Configure the server; start() opens the sockets.
+
+        Args:
+            engine: TestEngine whose worker count and recorder are used
+            backend: One of test_engine.STREAM_BACKENDS; an unavailable optional
+                     backend is replaced by its fallback when the server starts
+            host: Interface to listen on ("0.0.0.0" for field sensors)
+            port: TCP port (0 picks a free port)
+            udp_port: UDP port, or None for TCP only (0 picks a free port)
+            batch_size: Most readings per micro-batch
+            max_delay: Longest a reading waits for its batch to fill (seconds)
+            queue_size: Readings queued before TCP sensors are slowed down
+                        and UDP readings dropped
+            simulate_delay: Run the simulated 1-3 second instrument test
+            on_batch: Called with (chunk, ratings) for every rated batch
+        """
+        if backend not in STREAM_BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}' (choose from {STREAM_BACKENDS})")
+
+        self.engine = engine
+        self.backend = backend
+        self.host = host
+        self.port = port
+        self.udp_port = udp_port
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+        self.simulate_delay = simulate_delay
+        self.on_batch = on_batch
+        self.stats = IngestStats()
+
+        self.address: Tuple[str, int] = None
+        self.udp_address: Tuple[str, int] = None
+        self._queue: asyncio.Queue = None
+        self._in_flight: asyncio.Queue = None
+        self._executor: Optional[Executor] = None
+        self._tcp_server: asyncio.AbstractServer = None
+        self._udp_transport: asyncio.DatagramTransport = None
+        self._writers = set()
+        self._tasks: List[asyncio.Task] = []
+        self._next_id = 0
+        self._start_time = 0.0
+
+    async def start(self):
+        """Open the sockets and start batching"""
+        self.backend = resolve_backend(self.backend)
+        self._executor = self.engine.make_executor(self.backend)
+        if self.backend == 'multiprocessing':
+            # Start the workers before any socket exists: forked workers would
+            # otherwise inherit the connections and keep them from closing
+            await asyncio.gather(*(asyncio.get_running_loop().run_in_executor(self._executor, _worker_ready)
+                                   for _ in range(self.engine.stream_workers)))
+        workers = 1 if self._executor is None else self.engine.stream_workers
+
+        self._queue = asyncio.Queue(self.queue_size)
+        self._in_flight = asyncio.Queue(2 * workers)
+        self._tasks = [asyncio.create_task(self._batcher()), asyncio.create_task(self._completer())]
+
+        self._tcp_server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                      limit=MAX_MESSAGE_BYTES, backlog=4096)
+        self.address = self._tcp_server.sockets[0].getsockname()[:2]
+        if self.udp_port is not None:
+            self._udp_transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), local_addr=(self.host, self.udp_port))
+            self.udp_address = self._udp_transport.get_extra_info('sockname')[:2]
+            try:
+                self._udp_transport.get_extra_info('socket').setsockopt(
+                    socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER)
+            except OSError:
+                pass
+        self._start_time = time.time()
+
+    async def stop(self, grace: float = DEFAULT_STOP_GRACE):
+        """
+        Stop accepting readings, rate everything already queued and record the run.
+
+        Connected sensors get ``grace`` seconds to finish sending and
+        disconnect; connections still open after that are closed, and
+        readings left in their socket buffers are lost.
+        """
+        self._tcp_server.close()
+        if self._udp_transport is not None:
+            self._udp_transport.close()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + grace
+        while self._writers and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        for writer in list(self._writers):
+            writer.close()
+
+        await self._queue.put(None)
+        await asyncio.gather(*self._tasks)
+        if self._executor is not None:
+            self._executor.shutdown()
+
+        total_time = time.time() - self._start_time
+        latency = self.stats.latency_percentiles()
+        self.engine._record_run({
+            'mode': f'ingest_{self.backend}',
+            'num_samples': self.stats.rated,
+            'num_workers': 1 if self._executor is None else self.engine.stream_workers,
+            'batch_size': self.batch_size,
+            'total_time': total_time,
+            'avg_time_per_sample': total_time / self.stats.rated if self.stats.rated else 0,
+            'rejected': self.stats.rejected,
+            'dropped': self.stats.dropped,
+            'latency_p50': latency.get(50, 0.0),
+            'latency_p99': latency.get(99, 0.0)
+        })
+
+    async def __aenter__(self) -> 'IngestServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def _parse(self, line: bytes) -> Optional[Tuple[WaterSample, float]]:
+        """Parse one message into a queue item, counting it if rejected"""
+        self._next_id += 1
+        try:
+            return parse_message(line, self._next_id), time.perf_counter()
+        except ValueError:
+            self.stats.rejected += 1
+            return None
+
+    def _offer(self, line: bytes):
+        """Queue a UDP reading, or drop it if the queue is full"""
+        item = self._parse(line)
+        if item is None:
+            return
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+            return
+        self.stats.received += 1
+        if self._queue.qsize() > self.stats.peak_queue:
+            self.stats.peak_queue = self._queue.qsize()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Read newline-framed readings from one sensor connection"""
+        self._writers.add(writer)
+        self.stats.connections += 1
+        queue, stats = self._queue, self.stats
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError as e:
+                    line = e.partial
+                    if not line.strip():
+                        break
+                except asyncio.LimitOverrunError:
+                    stats.rejected += 1
+                    break
+
+                if line.strip():
+                    item = self._parse(line)
+                    if item is not None:
+                        if queue.full():
+                            # The engine is behind: stop reading this socket until there is room
+                            stats.backpressure_waits += 1
+                            await queue.put(item)
+                        else:
+                            queue.put_nowait(item)
+                        stats.received += 1
+                        if queue.qsize() > stats.peak_queue:
+                            stats.peak_queue = queue.qsize()
+                if not line.endswith(b'\n'):
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.stats.connections -= 1
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _batcher(self):
+        """Cut the queue into micro-batches and submit them to the engine"""
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        finished = False
+        while not finished:
+            item = await queue.get()
+            if item is None:
+                break
+            items = [item]
+            deadline = loop.time() + self.max_delay
+            while len(items) < self.batch_size:
+                if queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = queue.get_nowait()
+                if item is None:
+                    finished = True
+                    break
+                items.append(item)
+
+            chunk = [sample for sample, _ in items]
+            arrivals = np.fromiter((arrival for _, arrival in items), float, len(items))
+            if self._executor is None:
+                future = loop.create_future()
+                future.set_result(_rate_chunk(chunk, self.simulate_delay))
+            else:
+                future = loop.run_in_executor(self._executor, _rate_chunk, chunk, self.simulate_delay)
+            # Blocks while the engine already has two batches per worker
+            await self._in_flight.put((chunk, arrivals, future))
+        await self._in_flight.put(None)
+
+    async def _completer(self):
+        """Collect rated batches in submission order"""
+        while True:
+            entry = await self._in_flight.get()
+            if entry is None:
+                break
+            chunk, arrivals, future = entry
+            ratings = _apply_test_results(chunk, await future, self.backend in COPYING_BACKENDS)
+            self.stats.add_latencies(time.perf_counter() - arrivals)
+            self.stats.rated += len(chunk)
+            self.stats.batches += 1
+            self.engine._record_chunk(chunk, ratings)
+            if self.on_batch is not None:
+                self.on_batch(chunk, ratings)
+
+
+async def serve(server: IngestServer, duration: float = None, report_interval: float = 5.0):
+    """
+    Run a server until the duration passes (or forever), printing stats to stderr.
+
+    Args:
+        server: Server to run (not yet started)
+        duration: Seconds to run, or None until cancelled
+        report_interval: Seconds between stats lines (0 disables)
+    """
+    await server.start()
+    print(f"Listening on tcp {server.address[0]}:{server.address[1]}"
+          + (f", udp {server.udp_address[0]}:{server.udp_address[1]}" if server.udp_address else ""),
+          file=sys.stderr)
+    loop = asyncio.get_running_loop()
+    end = None if duration is None else loop.time() + duration
+    last_rated, last_time = 0, loop.time()
+    try:
+        while end is None or loop.time() < end:
+            interval = report_interval or 1.0
+            await asyncio.sleep(interval if end is None else max(0.0, min(interval, end - loop.time())))
+            if report_interval:
+                now = loop.time()
+                rate = (server.stats.rated - last_rated) / (now - last_time)
+                print(f"  {rate:,.0f} readings/sec | {server.stats}", file=sys.stderr)
+                last_rated, last_time = server.stats.rated, now
+    finally:
+        await server.stop()
+
+
+def main():
+    """Ingestion server entry point"""
+    from anomaly import AnomalyDetector
+    from batch import anomaly_printer
+    from persistence import BackgroundWriter
+
+    parser = argparse.ArgumentParser(description="Ingest live sensor readings over TCP/UDP")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_INGEST_PORT, help="TCP port")
+    parser.add_argument("--udp-port", type=int, default=None, help="Also listen on this UDP port")
+    parser.add_argument("--backend", choices=STREAM_BACKENDS, default="threading",
+                        help="How micro-batches are rated")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of workers (default: from the host profile, else usable CPU count)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Readings per micro-batch")
+    parser.add_argument("--max-delay", type=float, default=DEFAULT_MAX_DELAY,
+                        help="Seconds a reading may wait for its batch to fill")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Readings queued before sensors are slowed down")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds to run (default: until Ctrl+C)")
+    parser.add_argument("--db", default=None, help="Save readings and ratings to this SQLite database")
+    parser.add_argument("--detect", action="store_true", help="Flag anomalies per location as readings arrive")
+    args = parser.parse_args()
+
+    try:
+        recorder = BackgroundWriter(args.db) if args.db else None
+    except RuntimeError as e:
+        parser.error(str(e))
+    detector = AnomalyDetector(on_anomaly=anomaly_printer()) if args.detect else None
+    engine = TestEngine(num_workers=args.workers, recorder=recorder)
+    server = IngestServer(engine, args.backend, args.host, args.port, args.udp_port, args.batch_size,
+                          args.max_delay, args.queue_size,
+                          on_batch=(lambda chunk, ratings: detector.process(chunk)) if detector else None)
+    try:
+        asyncio.run(serve(server, args.duration))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+    print("="*60, file=sys.stderr)
+    print("WATER QUALITY LAB - INGESTION SUMMARY", file=sys.stderr)
+    print("="*60, file=sys.stderr)
+    print(f"Backend: {server.backend} | {server.stats}", file=sys.stderr)
+    if engine.results_history:
+        run = engine.results_history[-1]
+        print(f"Elapsed: {run['total_time']:.2f}s | "
+              f"Throughput: {run['num_samples'] / run['total_time']:,.0f} readings/sec", file=sys.stderr)
+    if detector is not None:
+        print(f"Anomalies flagged: {detector.anomalies_found:,}", file=sys.stderr)
+    print("="*60, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
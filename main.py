@@ -8,23 +8,46 @@ in the context of water quality testing, supporting sustainable
 development goals related to clean water access.
 """
 
-import pygame
+from __future__ import annotations
+
 import sys
 import math
 import time
-from typing import List, Optional, Tuple
+import queue
+import threading
+import bisect
+import itertools
+import multiprocessing as mp
+from collections import OrderedDict, deque
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
 from water_sample import WaterSample, WaterQuality
-from test_engine import TestEngine
-
+from test_engine import TaskSpan, TestEngine
 
-# Initialize Pygame
-pygame.init()
+# Imported by init_pygame, not here: process pool workers re-import this
+# script as __mp_main__ and only need the test modules
+pygame = None
 
 # Constants
 WINDOW_WIDTH = 1400
 WINDOW_HEIGHT = 900
 FPS = 60
 
+# Sample grid limits and zoom range (1.0 is the full-size test tube)
+MAX_SAMPLES = 100000
+SAMPLE_BATCH_SIZE = 100
+MIN_ZOOM = 0.25
+MAX_ZOOM = 1.5
+SCROLL_STEP = 60
+
+# When nothing is animating, the loop sleeps until input arrives, waking at
+# least this often (milliseconds) to pick up background changes
+IDLE_WAKE_INTERVAL_MS = 250
+
+# Tests are started from a background thread, where forking the GUI
+# process directly is unsafe, so workers come from a forkserver instead.
+ENGINE_START_METHOD = 'forkserver' if 'forkserver' in mp.get_all_start_methods() else None
+
 # Colors
 COLOR_BG = (240, 245, 250)
 COLOR_PANEL = (255, 255, 255)
@@ -39,15 +62,305 @@ COLOR_WARNING = (255, 180, 0)
 COLOR_DANGER = (220, 60, 60)
 COLOR_PROGRESS_BG = (220, 230, 240)
 COLOR_PROGRESS_FILL = (70, 180, 130)
+COLOR_PENDING = (150, 180, 200)
+
+# Screen regions redrawn as a whole when their content changes
+# (turned into pygame.Rect by init_pygame)
+HEADER_INFO_RECT = (20, 100, 540, 36)
+LIVE_CHARTS_RECT = (580, 12, 378, 124)
+SAMPLE_VIEW_RECT = (12, 176, 946, 562)
+PROFILER_RECT = (1030, 8, 360, 128)
+METRICS_CONTENT_RECT = (972, 185, 406, 553)
+
+# Fonts (loaded by init_pygame when the GUI starts)
+FONT_TITLE: Optional[pygame.font.Font] = None
+FONT_SUBTITLE: Optional[pygame.font.Font] = None
+FONT_NORMAL: Optional[pygame.font.Font] = None
+FONT_SMALL: Optional[pygame.font.Font] = None
+
+# Maximum number of rendered text surfaces kept between frames
+TEXT_CACHE_SIZE = 512
+
+
+class TextCache:
+    """LRU cache of rendered text surfaces keyed by (font, text, color)"""
+    
+    def __init__(self, max_size: int = TEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self.enabled = True
+        self.surfaces: "OrderedDict[tuple, pygame.Surface]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def render(self, font: pygame.font.Font, text: str, color: Tuple[int, int, int]) -> pygame.Surface:
+        """Return the rendered text, rendering it only on a cache miss"""
+        if not self.enabled:
+            return font.render(text, True, color)
+        
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+    
+    def clear(self):
+        """Drop all cached surfaces"""
+        self.surfaces.clear()
+
+
+TEXT_CACHE = TextCache()
+
+
+def init_pygame():
+    """
+    Import pygame, initialize the modules the GUI uses and load the fonts.
+    
+    pygame is imported here on first GUI use rather than at import time, so
+    process pool workers, which re-import the main script as __mp_main__,
+    never load pygame or SDL. Only the display and font modules are started;
+    the GUI plays no sound, so the mixer is never opened. Safe to call
+    again, including after pygame.quit().
+    """
+    global pygame, FONT_TITLE, FONT_SUBTITLE, FONT_NORMAL, FONT_SMALL
+    global HEADER_INFO_RECT, LIVE_CHARTS_RECT, SAMPLE_VIEW_RECT, PROFILER_RECT, METRICS_CONTENT_RECT
+    
+    import pygame
+    
+    if pygame.display.get_init() and pygame.font.get_init() and FONT_TITLE is not None:
+        return
+    
+    HEADER_INFO_RECT = pygame.Rect(HEADER_INFO_RECT)
+    LIVE_CHARTS_RECT = pygame.Rect(LIVE_CHARTS_RECT)
+    SAMPLE_VIEW_RECT = pygame.Rect(SAMPLE_VIEW_RECT)
+    PROFILER_RECT = pygame.Rect(PROFILER_RECT)
+    METRICS_CONTENT_RECT = pygame.Rect(METRICS_CONTENT_RECT)
+    pygame.display.init()
+    pygame.font.init()
+    FONT_TITLE = pygame.font.Font(None, 48)
+    FONT_SUBTITLE = pygame.font.Font(None, 32)
+    FONT_NORMAL = pygame.font.Font(None, 24)
+    FONT_SMALL = pygame.font.Font(None, 20)
+    # Surfaces rendered with fonts from an earlier session are keyed by them
+    TEXT_CACHE.clear()
+
+
+def render_text(font: pygame.font.Font, text: str, color: Tuple[int, int, int]) -> pygame.Surface:
+    """Render antialiased text through the shared text cache"""
+    return TEXT_CACHE.render(font, text, color)
+
+
+class FrameProfiler:
+    """
+    Rolling frame-time and per-phase statistics.
+    
+    Keeps the last ``window`` frames in ring buffers, so recording a frame
+    and reading the statistics cost the same however long the app runs.
+    """
+    
+    PHASES = ('events', 'update', 'draw')
+    # Upper edges (ms) of the frame-time histogram buckets; the last bucket
+    # collects everything slower
+    HISTOGRAM_EDGES_MS = (4, 8, 12, 17, 25, 33, 50)
+    
+    def __init__(self, window: int = 120):
+        self.frame_times: deque = deque(maxlen=window)
+        self.phase_times: Dict[str, deque] = {phase: deque(maxlen=window) for phase in self.PHASES}
+    
+    def record(self, frame_time: float, events: float, update: float, draw: float):
+        """Add one frame (all times in seconds)"""
+        self.frame_times.append(frame_time)
+        self.phase_times['events'].append(events)
+        self.phase_times['update'].append(update)
+        self.phase_times['draw'].append(draw)
+    
+    @property
+    def fps(self) -> float:
+        """Frames per second over the window"""
+        total = sum(self.frame_times)
+        return len(self.frame_times) / total if total > 0 else 0.0
+    
+    def phase_means_ms(self) -> Dict[str, float]:
+        """Mean milliseconds spent in each phase"""
+        return {phase: 1000 * sum(times) / len(times) if times else 0.0
+                for phase, times in self.phase_times.items()}
+    
+    def histogram(self) -> List[int]:
+        """Frame counts per bucket of HISTOGRAM_EDGES_MS"""
+        counts = [0] * (len(self.HISTOGRAM_EDGES_MS) + 1)
+        for frame_time in self.frame_times:
+            counts[bisect.bisect_left(self.HISTOGRAM_EDGES_MS, frame_time * 1000)] += 1
+        return counts
 
-# Fonts
-FONT_TITLE = pygame.font.Font(None, 48)
-FONT_SUBTITLE = pygame.font.Font(None, 32)
-FONT_NORMAL = pygame.font.Font(None, 24)
-FONT_SMALL = pygame.font.Font(None, 20)
+
+class LiveRunCharts:
+    """
+    Live throughput sparkline and per-worker occupancy (Gantt) strip.
+    
+    Both charts share a time axis of fixed-width columns, one per
+    ``BUCKET_SECONDS``, with the current bucket at the right edge. Completion
+    counts live in a ring buffer with one entry per column, and both charts
+    are painted onto off-screen surfaces that scroll left as time advances,
+    so recording a result or advancing a frame never touches more than a
+    few columns, however long the run lasts.
+    """
+    
+    BUCKET_SECONDS = 0.25
+    COLUMN_WIDTH = 2
+    SPARKLINE_HEIGHT = 30
+    GANTT_HEIGHT = 36
+    # Tests taking this much longer than the mean are drawn as stragglers
+    STRAGGLER_FACTOR = 1.5
+    
+    def __init__(self, width: int):
+        self.columns = width // self.COLUMN_WIDTH
+        self.width = self.columns * self.COLUMN_WIDTH
+        self.sparkline = pygame.Surface((self.width, self.SPARKLINE_HEIGHT))
+        self.gantt = pygame.Surface((self.width, self.GANTT_HEIGHT))
+        self.reset(time.time(), 1)
+    
+    def reset(self, start_time: float, num_lanes: int):
+        """
+        Clear both charts for a run.
+        
+        Args:
+            start_time: Wall-clock time the run starts at
+            num_lanes: Number of workers (Gantt lanes) in the run
+        """
+        self.start_time = start_time
+        self.bucket = 0
+        self.counts: deque = deque([0] * self.columns, maxlen=self.columns)
+        self.scale = 1.0  # samples/sec at the top of the sparkline
+        self.lanes: Dict[str, int] = {}
+        self.visible_lanes = max(1, min(num_lanes, self.GANTT_HEIGHT))
+        self.lane_height = self.GANTT_HEIGHT // self.visible_lanes
+        self.completed = 0
+        self.total_duration = 0.0
+        self.last_end = start_time
+        self.version = 0
+        self.sparkline.fill(COLOR_PANEL)
+        self.gantt.fill(COLOR_PROGRESS_BG)
+    
+    def bucket_at(self, t: float) -> int:
+        """Index of the time bucket containing wall-clock time t"""
+        return int((t - self.start_time) / self.BUCKET_SECONDS)
+    
+    def x_at(self, t: float) -> int:
+        """Chart x coordinate of wall-clock time t"""
+        buckets_ago = self.bucket + 1 - (t - self.start_time) / self.BUCKET_SECONDS
+        return round(self.width - buckets_ago * self.COLUMN_WIDTH)
+    
+    @property
+    def throughput(self) -> float:
+        """Samples per second over the last second of finished buckets"""
+        recent = list(itertools.islice(reversed(self.counts), 1, 5))
+        return sum(recent) / (len(recent) * self.BUCKET_SECONDS)
+    
+    @property
+    def average_throughput(self) -> float:
+        """Samples per second from the start of the run to the last result"""
+        elapsed = self.last_end - self.start_time
+        return self.completed / elapsed if elapsed > 0 else 0.0
+    
+    def advance(self, now: float):
+        """Scroll both charts so the right edge shows the bucket containing now"""
+        steps = min(self.bucket_at(now) - self.bucket, self.columns)
+        if steps <= 0:
+            return
+        
+        self.bucket = self.bucket_at(now)
+        self.counts.extend([0] * steps)
+        dx = steps * self.COLUMN_WIDTH
+        for surface, color in ((self.sparkline, COLOR_PANEL), (self.gantt, COLOR_PROGRESS_BG)):
+            surface.scroll(-dx, 0)
+            surface.fill(color, (self.width - dx, 0, dx, surface.get_height()))
+        self.version += 1
+    
+    def record(self, span: TaskSpan):
+        """Add one finished test to both charts"""
+        self.completed += 1
+        self.last_end = max(self.last_end, span.end)
+        duration = span.end - span.start
+        self.total_duration += duration
+        
+        # Completions are counted in the bucket they finished in
+        age = max(0, self.bucket - self.bucket_at(span.end))
+        if age < self.columns:
+            column = self.columns - 1 - age
+            self.counts[column] += 1
+            rate = self.counts[column] / self.BUCKET_SECONDS
+            if rate > self.scale:
+                self.scale = rate * 1.25
+                self.redraw_sparkline()
+            else:
+                self.draw_sparkline_column(column)
+        
+        lane = self.lanes.setdefault(span.worker, len(self.lanes)) % self.visible_lanes
+        x0, x1 = self.x_at(span.start), self.x_at(span.end)
+        straggler = duration > self.STRAGGLER_FACTOR * self.total_duration / self.completed
+        pygame.draw.rect(self.gantt, COLOR_WARNING if straggler else COLOR_PROGRESS_FILL,
+                         (x0, lane * self.lane_height, max(1, x1 - x0 - 1), max(1, self.lane_height - 1)))
+        self.version += 1
+    
+    def draw_sparkline_column(self, column: int):
+        """Repaint one sparkline column from the ring buffer"""
+        x = column * self.COLUMN_WIDTH
+        self.sparkline.fill(COLOR_PANEL, (x, 0, self.COLUMN_WIDTH, self.SPARKLINE_HEIGHT))
+        height = round(self.SPARKLINE_HEIGHT * self.counts[column] / self.BUCKET_SECONDS / self.scale)
+        if height > 0:
+            self.sparkline.fill(COLOR_BUTTON, (x, self.SPARKLINE_HEIGHT - height, self.COLUMN_WIDTH, height))
+    
+    def redraw_sparkline(self):
+        """Repaint the whole sparkline (after the vertical scale changed)"""
+        self.sparkline.fill(COLOR_PANEL)
+        for column in range(self.columns):
+            self.draw_sparkline_column(column)
 
 
-class Button:
+class Widget:
+    """
+    Base class for components that know when they need redrawing.
+    
+    A widget describes what it looks like with render_state(); it only has
+    to be redrawn when that state differs from the state it was last drawn
+    with. The dirty area covers both the old and the new bounds so moved
+    widgets leave no trails.
+    """
+    
+    drawn_state: Optional[tuple] = None
+    drawn_bounds: Optional[pygame.Rect] = None
+    
+    @property
+    def bounds(self) -> pygame.Rect:
+        """Screen area the widget may draw into"""
+        raise NotImplementedError
+    
+    def render_state(self) -> tuple:
+        """Everything that affects how the widget looks"""
+        raise NotImplementedError
+    
+    def get_dirty_rect(self) -> Optional[pygame.Rect]:
+        """Area to redraw, or None if the widget is unchanged"""
+        if self.render_state() == self.drawn_state:
+            return None
+        if self.drawn_bounds is None:
+            return self.bounds
+        return self.bounds.union(self.drawn_bounds)
+    
+    def mark_drawn(self):
+        """Remember the state the widget was just drawn with"""
+        self.drawn_state = self.render_state()
+        self.drawn_bounds = self.bounds
+
+
+class Button(Widget):
     """Interactive button component"""
     
     def __init__(self, x: int, y: int, width: int, height: int, text: str, color: Tuple[int, int, int]):
@@ -59,6 +372,13 @@ class Button:
         self.is_hovered = False
         self.is_disabled = False
     
+    @property
+    def bounds(self) -> pygame.Rect:
+        return self.rect
+    
+    def render_state(self) -> tuple:
+        return (self.is_hovered, self.is_disabled, self.text)
+    
     def draw(self, surface: pygame.Surface):
         """Draw the button"""
         if self.is_disabled:
@@ -71,9 +391,11 @@ class Button:
         pygame.draw.rect(surface, color, self.rect, border_radius=8)
         pygame.draw.rect(surface, COLOR_BORDER, self.rect, 2, border_radius=8)
         
-        text_surface = FONT_NORMAL.render(self.text, True, (255, 255, 255) if not self.is_disabled else COLOR_TEXT_SECONDARY)
+        text_surface = render_text(FONT_NORMAL, self.text, (255, 255, 255) if not self.is_disabled else COLOR_TEXT_SECONDARY)
         text_rect = text_surface.get_rect(center=self.rect.center)
         surface.blit(text_surface, text_rect)
+        
+        self.mark_drawn()
     
     def handle_event(self, event: pygame.event.Event) -> bool:
         """Handle mouse events, returns True if clicked"""
@@ -89,21 +411,29 @@ class Button:
         return False
 
 
-class TestTube:
+class TestTube(Widget):
     """Animated test tube visualization for water sample"""
     
-    def __init__(self, x: int, y: int, sample: WaterSample):
+    def __init__(self, x: int, y: int, sample: WaterSample, scale: float = 1.0):
         self.x = x
         self.y = y
         self.sample = sample
         self.width = 60
         self.height = 120
+        self.show_labels = True
+        self.set_scale(scale)
         self.fill_level = 0.0
         self.target_fill = 0.0
         self.is_testing = False
         self.animation_speed = 2.0
         self.selected = False
     
+    def set_scale(self, scale: float):
+        """Resize the tube; labels are hidden when they would overlap"""
+        self.width = max(4, int(60 * scale))
+        self.height = max(8, int(120 * scale))
+        self.show_labels = scale >= 0.75
+    
     def start_animation(self):
         """Start filling animation"""
         self.is_testing = True
@@ -114,6 +444,22 @@ class TestTube:
         if self.fill_level < self.target_fill:
             self.fill_level = min(self.fill_level + self.animation_speed * dt, self.target_fill)
     
+    @property
+    def is_animating(self) -> bool:
+        """Whether the fill animation is still running"""
+        return self.fill_level < self.target_fill
+    
+    @property
+    def bounds(self) -> pygame.Rect:
+        # Tube plus selection highlight, status mark above and label below
+        if not self.show_labels:
+            return pygame.Rect(self.x - 6, self.y - 6, self.width + 12, self.height + 12)
+        return pygame.Rect(self.x - 6, self.y - 26, self.width + 12, self.height + 52)
+    
+    def render_state(self) -> tuple:
+        return (self.x, self.y, self.width, self.selected, self.is_testing, self.sample.tested,
+                int(self.height * self.fill_level), self.sample.sample_id)
+    
     def draw(self, surface: pygame.Surface):
         """Draw the test tube"""
         # Outer tube
@@ -131,14 +477,19 @@ class TestTube:
         # Liquid fill
         if self.fill_level > 0:
             fill_height = int(self.height * self.fill_level)
-            fill_rect = pygame.Rect(self.x + 5, self.y + self.height - fill_height, 
-                                   self.width - 10, fill_height)
+            inset = min(5, self.width // 4)
+            fill_rect = pygame.Rect(self.x + inset, self.y + self.height - fill_height, 
+                                   self.width - 2 * inset, fill_height)
             
-            color = self.sample.get_quality_color() if self.sample.tested else (150, 180, 200)
+            color = self.sample.get_quality_color() if self.sample.tested else COLOR_PENDING
             pygame.draw.rect(surface, color, fill_rect, border_radius=5)
         
+        if not self.show_labels:
+            self.mark_drawn()
+            return
+        
         # Sample ID label
-        id_text = FONT_SMALL.render(f"#{self.sample.sample_id}", True, COLOR_TEXT_PRIMARY)
+        id_text = render_text(FONT_SMALL, f"#{self.sample.sample_id}", COLOR_TEXT_PRIMARY)
         id_rect = id_text.get_rect(center=(self.x + self.width // 2, self.y + self.height + 15))
         surface.blit(id_text, id_rect)
         
@@ -153,9 +504,11 @@ class TestTube:
             status_color = COLOR_TEXT_SECONDARY
             status_text = "○"
         
-        status_surf = FONT_NORMAL.render(status_text, True, status_color)
+        status_surf = render_text(FONT_NORMAL, status_text, status_color)
         status_rect = status_surf.get_rect(center=(self.x + self.width // 2, self.y - 15))
         surface.blit(status_surf, status_rect)
+        
+        self.mark_drawn()
     
     def contains_point(self, pos: Tuple[int, int]) -> bool:
         """Check if point is inside test tube"""
@@ -163,19 +516,365 @@ class TestTube:
                 self.y <= pos[1] <= self.y + self.height)
 
 
+class SampleGridView:
+    """
+    Scrollable, zoomable grid of test tubes over a list of samples.
+    
+    Only samples in rows that intersect the viewport get a TestTube widget;
+    tubes are created as rows scroll into view and dropped as they leave it,
+    so the per-frame cost follows what is visible, not the sample count.
+    """
+    
+    CELL_WIDTH = 90
+    CELL_HEIGHT = 160
+    MARGIN_X = 38
+    MARGIN_Y = 30
+    TUBE_WIDTH = 60
+    SCROLLBAR_SPACE = 16
+    
+    def __init__(self, rect: pygame.Rect, samples: List[WaterSample]):
+        self.rect = rect
+        self.samples = samples
+        self.scroll_y = 0.0
+        self.zoom = 1.0
+        self.tubes: Dict[int, TestTube] = {}
+        
+        # Lets tubes created mid-run show the current testing state
+        self.is_testing = False
+        self.selected_index: Optional[int] = None
+    
+    @property
+    def cell_width(self) -> float:
+        return self.CELL_WIDTH * self.zoom
+    
+    @property
+    def cell_height(self) -> float:
+        return self.CELL_HEIGHT * self.zoom
+    
+    @property
+    def columns(self) -> int:
+        """Number of tubes per row at the current zoom"""
+        # Room after the first tube, keeping clear of the scrollbar
+        usable_width = (self.rect.width - self.SCROLLBAR_SPACE
+                        - (self.MARGIN_X + self.TUBE_WIDTH) * self.zoom)
+        return max(1, int(usable_width // self.cell_width) + 1)
+    
+    @property
+    def max_scroll(self) -> float:
+        """Largest scroll offset that still shows the last row"""
+        rows = -(-len(self.samples) // self.columns)
+        content_height = self.MARGIN_Y * self.zoom + rows * self.cell_height
+        return max(0.0, content_height - self.rect.height)
+    
+    def visible_range(self) -> range:
+        """Indices of samples in rows that intersect the viewport"""
+        top = self.scroll_y - self.MARGIN_Y * self.zoom
+        first_row = max(0, int(top // self.cell_height))
+        last_row = int((top + self.rect.height) // self.cell_height)
+        
+        start = first_row * self.columns
+        stop = min(len(self.samples), (last_row + 1) * self.columns)
+        return range(start, max(start, stop))
+    
+    def cell_origin(self, index: int) -> Tuple[int, int]:
+        """Screen position of the tube for the sample at index"""
+        row, col = divmod(index, self.columns)
+        x = self.rect.x + self.MARGIN_X * self.zoom + col * self.cell_width
+        y = self.rect.y + self.MARGIN_Y * self.zoom + row * self.cell_height - self.scroll_y
+        return int(x), int(y)
+    
+    def scroll_by(self, dy: float):
+        """Scroll the grid vertically (positive scrolls down)"""
+        self.scroll_y = min(max(self.scroll_y + dy, 0.0), self.max_scroll)
+    
+    def set_zoom(self, zoom: float):
+        """Change the zoom, keeping the sample at the top of the view in place"""
+        zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM)
+        if zoom == self.zoom:
+            return
+        
+        first_visible = self.visible_range().start
+        self.zoom = zoom
+        row = first_visible // self.columns
+        self.scroll_y = 0.0
+        self.scroll_by(row * self.cell_height)
+    
+    def sync(self) -> List[pygame.Rect]:
+        """
+        Create, move or drop tube widgets to match the visible rows.
+        
+        Returns:
+            Screen areas previously covered by tubes that were dropped
+        """
+        self.scroll_by(0)
+        visible = self.visible_range()
+        freed_rects = []
+        
+        for index in list(self.tubes):
+            tube = self.tubes[index]
+            if index not in visible or tube.sample is not self.samples[index]:
+                del self.tubes[index]
+                if tube.drawn_bounds is not None:
+                    freed_rects.append(tube.drawn_bounds)
+        
+        for index in visible:
+            x, y = self.cell_origin(index)
+            tube = self.tubes.get(index)
+            if tube is None:
+                tube = self.create_tube(index, x, y)
+                self.tubes[index] = tube
+            else:
+                tube.x, tube.y = x, y
+                tube.set_scale(self.zoom)
+        
+        return freed_rects
+    
+    def create_tube(self, index: int, x: int, y: int) -> TestTube:
+        """Build the widget for a sample that scrolled into view"""
+        sample = self.samples[index]
+        tube = TestTube(x, y, sample, self.zoom)
+        if self.is_testing or sample.tested:
+            # Show the end of the fill animation for tubes that appear mid-run
+            tube.start_animation()
+            tube.fill_level = tube.target_fill
+            tube.is_testing = self.is_testing and not sample.tested
+        tube.selected = index == self.selected_index
+        return tube
+    
+    def visible_tubes(self) -> List[TestTube]:
+        """Tube widgets currently in the view"""
+        return list(self.tubes.values())
+    
+    def index_at(self, pos: Tuple[int, int]) -> Optional[int]:
+        """
+        Map a screen position to the index of the tube under it.
+        
+        Works from the grid geometry (scroll and zoom included) instead of
+        testing every tube, so the cost does not depend on the tube count.
+        The cell also covers the gap around its tube, so the tube itself is
+        checked before reporting a hit.
+        """
+        if not self.rect.collidepoint(pos):
+            return None
+        
+        x = pos[0] - (self.rect.x + self.MARGIN_X * self.zoom)
+        y = pos[1] - (self.rect.y + self.MARGIN_Y * self.zoom) + self.scroll_y
+        col = int(x // self.cell_width)
+        row = int(y // self.cell_height)
+        
+        # Tube positions are rounded down to whole pixels, so a point just
+        # past a cell boundary may still belong to the next cell's tube
+        for candidate_row in (row, row + 1):
+            for candidate_col in (col, col + 1):
+                if candidate_row < 0 or not 0 <= candidate_col < self.columns:
+                    continue
+                index = candidate_row * self.columns + candidate_col
+                tube = self.tubes.get(index)
+                if tube is not None and tube.contains_point(pos):
+                    return index
+        
+        return None
+    
+    def select(self, index: Optional[int]):
+        """Move the selection highlight to the tube at index (None clears it)"""
+        previous = self.tubes.get(self.selected_index)
+        if previous is not None:
+            previous.selected = False
+        
+        self.selected_index = index
+        tube = self.tubes.get(index)
+        if tube is not None:
+            tube.selected = True
+    
+    @property
+    def scrollbar_rect(self) -> pygame.Rect:
+        """Track of the scroll indicator along the right edge"""
+        return pygame.Rect(self.rect.right - 8, self.rect.y + 4, 4, self.rect.height - 8)
+    
+    def draw_scrollbar(self, surface: pygame.Surface):
+        """Draw a thin scroll indicator when the grid overflows the view"""
+        max_scroll = self.max_scroll
+        if max_scroll <= 0:
+            return
+        
+        track = self.scrollbar_rect
+        content_height = max_scroll + self.rect.height
+        thumb_height = max(20, int(track.height * self.rect.height / content_height))
+        thumb_y = track.y + int((track.height - thumb_height) * self.scroll_y / max_scroll)
+        pygame.draw.rect(surface, COLOR_PROGRESS_BG, track, border_radius=2)
+        pygame.draw.rect(surface, COLOR_BUTTON, (track.x, thumb_y, track.width, thumb_height),
+                         border_radius=2)
+
+
+class SampleHeatmapView:
+    """
+    Overview that shows every sample as one colored cell.
+    
+    Sample colors live in a NumPy array. The cells are painted one pixel per
+    sample into a small surface (in bulk with pygame.surfarray, or pixel by
+    pixel as results stream in) which is scaled up to the cell size when
+    drawn, so even 100,000 samples stay cheap to display.
+    """
+    
+    MARGIN = 8
+    MAX_CELL_SIZE = 48
+    
+    def __init__(self, rect: pygame.Rect, samples: List[WaterSample]):
+        import numpy as np
+        
+        self.rect = rect
+        self.samples = samples
+        self.colors = np.zeros((0, 3), dtype=np.uint8)
+        self.count = 0
+        self.cell_size = 1
+        self.columns = 1
+        self.rows = 1
+        self.pixels: Optional[pygame.Surface] = None
+        self.scaled: Optional[pygame.Surface] = None
+        self.selected_index: Optional[int] = None
+        self.changed = True
+    
+    @property
+    def origin(self) -> Tuple[int, int]:
+        """Screen position of the first cell"""
+        return self.rect.x + self.MARGIN, self.rect.y + self.MARGIN
+    
+    @staticmethod
+    def sample_color(sample: WaterSample) -> Tuple[int, int, int]:
+        """Color of one cell (matches the tube fill)"""
+        return sample.get_quality_color() if sample.tested else COLOR_PENDING
+    
+    def sync(self):
+        """Pick up samples that were added or removed since the last call"""
+        import numpy as np
+        
+        count = len(self.samples)
+        if count == self.count:
+            return
+        
+        if count > len(self.colors):
+            capacity = max(count, 2 * len(self.colors), 1024)
+            colors = np.zeros((capacity, 3), dtype=np.uint8)
+            colors[:self.count] = self.colors[:self.count]
+            self.colors = colors
+        for index in range(self.count, count):
+            self.colors[index] = self.sample_color(self.samples[index])
+        
+        self.count = count
+        if self.selected_index is not None and self.selected_index >= count:
+            self.selected_index = None
+        self.layout()
+    
+    def reset_colors(self):
+        """Recolor every cell from its sample (e.g. after a new run starts)"""
+        for index, sample in enumerate(self.samples[:self.count]):
+            self.colors[index] = self.sample_color(sample)
+        self.layout()
+    
+    def layout(self):
+        """Choose the largest cell size that fits all samples, then repaint"""
+        import numpy as np
+        
+        width = self.rect.width - 2 * self.MARGIN
+        height = self.rect.height - 2 * self.MARGIN
+        count = max(self.count, 1)
+        
+        cell_size = max(1, min(self.MAX_CELL_SIZE, int(math.sqrt(width * height / count))))
+        while cell_size > 1 and math.ceil(count / (width // cell_size)) * cell_size > height:
+            cell_size -= 1
+        
+        self.cell_size = cell_size
+        self.columns = max(1, width // cell_size)
+        self.rows = max(1, math.ceil(count / self.columns))
+        
+        # Paint all cells at once: (rows, columns) grid -> (x, y) pixel array
+        grid = np.zeros((self.rows * self.columns, 3), dtype=np.uint8)
+        grid[:] = COLOR_PANEL
+        grid[:self.count] = self.colors[:self.count]
+        self.pixels = pygame.Surface((self.columns, self.rows))
+        pygame.surfarray.blit_array(self.pixels, grid.reshape(self.rows, self.columns, 3).transpose(1, 0, 2))
+        self.changed = True
+    
+    def set_sample_color(self, index: int, color: Tuple[int, int, int]):
+        """Update one cell as its result arrives"""
+        if index >= self.count:
+            return
+        self.colors[index] = color
+        row, col = divmod(index, self.columns)
+        self.pixels.set_at((col, row), color)
+        self.changed = True
+    
+    def index_at(self, pos: Tuple[int, int]) -> Optional[int]:
+        """Map a screen position to the index of the sample under it"""
+        x0, y0 = self.origin
+        col = (pos[0] - x0) // self.cell_size
+        row = (pos[1] - y0) // self.cell_size
+        if not (0 <= col < self.columns and 0 <= row < self.rows):
+            return None
+        
+        index = row * self.columns + col
+        return index if index < self.count else None
+    
+    def draw(self, surface: pygame.Surface):
+        """Draw all cells and the selection marker"""
+        if self.pixels is None:
+            self.layout()
+        if self.scaled is None or self.changed:
+            self.scaled = pygame.transform.scale(
+                self.pixels, (self.columns * self.cell_size, self.rows * self.cell_size))
+            self.changed = False
+        
+        x0, y0 = self.origin
+        surface.blit(self.scaled, (x0, y0))
+        
+        if self.selected_index is not None:
+            row, col = divmod(self.selected_index, self.columns)
+            size = max(self.cell_size, 3)
+            marker = pygame.Rect(x0 + col * self.cell_size - 2, y0 + row * self.cell_size - 2,
+                                 size + 4, size + 4)
+            pygame.draw.rect(surface, COLOR_TEXT_PRIMARY, marker, 1)
+
+
 class WaterQualityLabGUI:
     """Main GUI application for water quality testing simulation"""
     
-    def __init__(self):
+    def __init__(self, use_render_cache: bool = True):
+        init_pygame()
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("Water Quality Testing Lab - Parallel Processing Demo")
         self.clock = pygame.time.Clock()
         self.running = True
         
+        # Rendering caches (static background layer and text surfaces)
+        self.use_render_cache = use_render_cache
+        TEXT_CACHE.enabled = use_render_cache
+        self.build_static_layer()
+        
+        # Dirty-rectangle tracking
+        self.needs_full_redraw = True
+        self.pending_dirty_rects: List[pygame.Rect] = []
+        self.header_drawn_state: Optional[tuple] = None
+        self.profiler_drawn_state: Optional[tuple] = None
+        self.metrics_drawn_state: Optional[tuple] = None
+        self.frame_was_drawn = False
+        
+        # Frame profiler overlay (toggled with F3)
+        self.profiler = FrameProfiler()
+        self.show_profiler = False
+        
+        # Live charts of the current run, fed from engine completions
+        self.live_charts = LiveRunCharts(LIVE_CHARTS_RECT.width - 20)
+        self.live_charts_drawn_state: Optional[tuple] = None
+        
         # Application state
         self.samples: List[WaterSample] = []
-        self.test_tubes: List[TestTube] = []
-        self.test_engine = TestEngine()
+        self.sample_grid = SampleGridView(SAMPLE_VIEW_RECT, self.samples)
+        self.sample_heatmap = SampleHeatmapView(SAMPLE_VIEW_RECT, self.samples)
+        self.view_mode = "tubes"  # "tubes" or "heatmap"
+        self.test_engine = TestEngine(start_method=ENGINE_START_METHOD)
+        self.result_queue: "queue.Queue[tuple]" = queue.Queue()
+        self.test_thread: Optional[threading.Thread] = None
+        self.tests_completed = 0
         self.selected_sample: Optional[WaterSample] = None
         self.is_testing = False
         self.test_mode = "parallel"  # "sequential" or "parallel"
@@ -195,8 +894,8 @@ class WaterQualityLabGUI:
         """Setup UI buttons and components"""
         button_y = WINDOW_HEIGHT - 70
         button_height = 50
-        button_width = 180
-        spacing = 20
+        button_width = 175
+        spacing = 18
         
         self.buttons = {
             'add_sample': Button(20, button_y, button_width, button_height, 
@@ -209,6 +908,10 @@ class WaterQualityLabGUI:
                                   button_width, button_height, "Test Parallel", COLOR_BUTTON),
             'clear_all': Button(20 + (button_width + spacing) * 4, button_y,
                               button_width, button_height, "Clear All", COLOR_WARNING),
+            'add_batch': Button(20 + (button_width + spacing) * 5, button_y,
+                              button_width, button_height, f"Add {SAMPLE_BATCH_SIZE}", COLOR_SUCCESS),
+            'toggle_view': Button(20 + (button_width + spacing) * 6, button_y,
+                                button_width, button_height, "Heatmap View", COLOR_BUTTON),
         }
     
     def add_sample(self):
@@ -216,32 +919,82 @@ class WaterQualityLabGUI:
         sample_id = len(self.samples) + 1
         sample = WaterSample.generate_random_sample(sample_id)
         self.samples.append(sample)
+        self.sync_sample_grid()
+    
+    def sync_sample_grid(self):
+        """Bring the tube widgets in line with the samples and the view"""
+        if self.view_mode == "heatmap":
+            self.sample_heatmap.sync()
+            self.invalidate(SAMPLE_VIEW_RECT)
         
-        # Calculate position for test tube
-        samples_per_row = 10
-        row = (len(self.samples) - 1) // samples_per_row
-        col = (len(self.samples) - 1) % samples_per_row
-        
-        x = 50 + col * 90
-        y = 180 + row * 160
+        for rect in self.sample_grid.sync():
+            self.invalidate(rect)
         
-        test_tube = TestTube(x, y, sample)
-        self.test_tubes.append(test_tube)
+        # The scrollbar changes whenever the sample count or scroll does
+        self.invalidate(self.sample_grid.scrollbar_rect)
+    
+    def toggle_view_mode(self):
+        """Switch between the test tube grid and the heatmap overview"""
+        if self.view_mode == "tubes":
+            self.view_mode = "heatmap"
+            self.sample_heatmap.sync()
+            self.sample_heatmap.reset_colors()
+            self.buttons['toggle_view'].text = "Tube View"
+        else:
+            self.view_mode = "tubes"
+            self.buttons['toggle_view'].text = "Heatmap View"
+        self.invalidate(SAMPLE_VIEW_RECT)
+    
+    def visible_tubes(self) -> List[TestTube]:
+        """Tube widgets on screen (none while the heatmap is shown)"""
+        if self.view_mode != "tubes":
+            return []
+        return self.sample_grid.visible_tubes()
+    
+    def select_sample(self, index: int):
+        """Select the sample at index in both views"""
+        self.selected_sample = self.samples[index]
+        self.sample_grid.select(index)
+        self.sample_heatmap.selected_index = index
+        if self.view_mode == "heatmap":
+            self.invalidate(SAMPLE_VIEW_RECT)
+    
+    def scroll_samples(self, dy: float):
+        """Scroll the sample grid"""
+        self.sample_grid.scroll_by(dy)
+        self.sync_sample_grid()
+        self.invalidate(SAMPLE_VIEW_RECT)
+    
+    def zoom_samples(self, factor: float):
+        """Zoom the sample grid in or out"""
+        self.sample_grid.set_zoom(self.sample_grid.zoom * factor)
+        self.sync_sample_grid()
+        self.invalidate(SAMPLE_VIEW_RECT)
     
     def remove_sample(self):
         """Remove the last sample"""
         if self.samples and not self.is_testing:
-            self.samples.pop()
-            self.test_tubes.pop()
-            if self.selected_sample and self.selected_sample not in self.samples:
+            removed = self.samples.pop()
+            if self.selected_sample is removed:
                 self.selected_sample = None
+                self.sample_grid.select(None)
+                self.sample_heatmap.selected_index = None
+            
+            # Scrolling back may shift every visible tube
+            scroll_y = self.sample_grid.scroll_y
+            self.sync_sample_grid()
+            if self.sample_grid.scroll_y != scroll_y:
+                self.invalidate(SAMPLE_VIEW_RECT)
     
     def clear_all_samples(self):
         """Clear all samples"""
         if not self.is_testing:
             self.samples.clear()
-            self.test_tubes.clear()
             self.selected_sample = None
+            self.sample_grid.select(None)
+            self.sample_heatmap.selected_index = None
+            self.sync_sample_grid()
+            self.invalidate_all()
             self.sequential_time = 0.0
             self.parallel_time = 0.0
             self.speedup = 0.0
@@ -254,98 +1007,158 @@ class WaterQualityLabGUI:
         self.is_testing = True
         self.test_mode = mode
         self.test_progress = 0.0
+        self.tests_completed = 0
+        self.live_charts.reset(time.time(), 1 if mode == "sequential" else self.test_engine.num_workers)
         
         # Reset samples
         for sample in self.samples:
             sample.tested = False
+        if self.view_mode == "heatmap":
+            self.sample_heatmap.reset_colors()
+            self.invalidate(SAMPLE_VIEW_RECT)
         
         # Start tube animations
-        for tube in self.test_tubes:
+        self.sample_grid.is_testing = True
+        for tube in self.sample_grid.visible_tubes():
             tube.fill_level = 0.0
             tube.start_animation()
         
-        # Run test in background (simulated)
-        self.test_start_time = time.time()
+        # Run the engine on copies in the background; results come back
+        # through the queue so GUI state is only touched by the main thread
+        engine_samples = [replace(sample) for sample in self.samples]
+        self.test_thread = threading.Thread(target=self.run_engine_tests,
+                                            args=(mode, engine_samples), daemon=True)
+        self.test_thread.start()
+    
+    def run_engine_tests(self, mode: str, samples: List[WaterSample]):
+        """Run the selected engine mode (called on the background thread)"""
+        def on_result(index: int, sample: WaterSample):
+            self.result_queue.put(('result', index, sample))
+        
+        def on_span(index: int, span: TaskSpan):
+            self.result_queue.put(('span', index, span))
+        
+        try:
+            if mode == "sequential":
+                _, total_time = self.test_engine.test_sequential(samples, on_result, on_span)
+            else:
+                _, total_time = self.test_engine.test_parallel_multiprocessing(samples, on_result, on_span)
+            self.result_queue.put(('done', total_time))
+        except Exception as e:
+            self.result_queue.put(('error', e))
     
     def update_testing(self):
-        """Update testing progress"""
+        """Apply engine results that arrived since the last frame"""
         if not self.is_testing:
             return
         
-        elapsed = time.time() - self.test_start_time
-        
-        # Simulate testing progress
-        if self.test_mode == "sequential":
-            expected_time = len(self.samples) * 2.0  # Approximate
-            self.test_progress = min(elapsed / expected_time, 1.0)
-        else:  # parallel
-            expected_time = 2.5  # Approximate with parallelism
-            self.test_progress = min(elapsed / expected_time, 1.0)
-        
-        # Check if testing complete
-        if self.test_progress >= 1.0:
-            # Mark samples as tested
-            for sample in self.samples:
+        while True:
+            try:
+                message = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
+            
+            if message[0] == 'result':
+                _, index, tested_sample = message
+                sample = self.samples[index]
                 sample.tested = True
+                sample.test_duration = tested_sample.test_duration
+                tube = self.sample_grid.tubes.get(index)
+                if tube is not None:
+                    tube.is_testing = False
+                if self.view_mode == "heatmap":
+                    self.sample_heatmap.set_sample_color(index, sample.get_quality_color())
+                    self.invalidate(SAMPLE_VIEW_RECT)
+                self.tests_completed += 1
+                self.test_progress = self.tests_completed / len(self.samples)
             
-            # Record time
-            if self.test_mode == "sequential":
-                self.sequential_time = elapsed
-            else:
-                self.parallel_time = elapsed
+            elif message[0] == 'span':
+                self.live_charts.record(message[2])
             
-            # Calculate speedup
-            if self.sequential_time > 0 and self.parallel_time > 0:
-                self.speedup = self.sequential_time / self.parallel_time
+            elif message[0] == 'done':
+                # Record time
+                if self.test_mode == "sequential":
+                    self.sequential_time = message[1]
+                else:
+                    self.parallel_time = message[1]
+                
+                # Calculate speedup
+                if self.sequential_time > 0 and self.parallel_time > 0:
+                    self.speedup = self.test_engine.calculate_speedup(self.sequential_time,
+                                                                      self.parallel_time)
+                
+                self.test_progress = 1.0
+                self.is_testing = False
+                self.sample_grid.is_testing = False
             
-            self.is_testing = False
+            else:  # error
+                print(f"Testing failed: {message[1]}", file=sys.stderr)
+                self.is_testing = False
+                self.sample_grid.is_testing = False
     
-    def draw_header(self):
-        """Draw application header"""
+    def draw_static(self, surface: pygame.Surface):
+        """Draw the parts of the window that never change"""
+        surface.fill(COLOR_BG)
+        
         # Title
-        title = FONT_TITLE.render("Water Quality Testing Laboratory", True, COLOR_TEXT_PRIMARY)
-        self.screen.blit(title, (20, 20))
+        title = render_text(FONT_TITLE, "Water Quality Testing Laboratory", COLOR_TEXT_PRIMARY)
+        surface.blit(title, (20, 20))
         
         # Subtitle
-        subtitle = FONT_SMALL.render("SDG 6: Clean Water and Sanitation | Parallel Processing Demonstration", 
-                                    True, COLOR_TEXT_SECONDARY)
-        self.screen.blit(subtitle, (20, 70))
+        subtitle = render_text(FONT_SMALL, "SDG 6: Clean Water and Sanitation | Parallel Processing Demonstration", 
+                               COLOR_TEXT_SECONDARY)
+        surface.blit(subtitle, (20, 70))
         
+        # Panels
+        for panel_rect, panel_title, title_pos in (
+                (pygame.Rect(10, 140, 950, 600), "Water Samples", (30, 150)),
+                (pygame.Rect(970, 140, 410, 600), "Performance Metrics", (990, 150))):
+            pygame.draw.rect(surface, COLOR_PANEL, panel_rect, border_radius=10)
+            pygame.draw.rect(surface, COLOR_BORDER, panel_rect, 2, border_radius=10)
+            
+            title = render_text(FONT_SUBTITLE, panel_title, COLOR_TEXT_PRIMARY)
+            surface.blit(title, title_pos)
+    
+    def build_static_layer(self):
+        """Pre-composite the static background into an off-screen surface"""
+        self.static_layer = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)).convert()
+        self.draw_static(self.static_layer)
+    
+    def draw_header(self):
+        """Draw application header"""
         # Sample count
-        count_text = FONT_NORMAL.render(f"Samples: {len(self.samples)} | Workers: {self.test_engine.num_workers}", 
-                                       True, COLOR_TEXT_PRIMARY)
+        count_text = render_text(FONT_NORMAL, f"Samples: {len(self.samples)} | Workers: {self.test_engine.num_workers}", 
+                                 COLOR_TEXT_PRIMARY)
         self.screen.blit(count_text, (20, 105))
+        
+        self.header_drawn_state = self.header_state()
     
     def draw_samples_panel(self):
-        """Draw water samples display area"""
-        panel_rect = pygame.Rect(10, 140, 950, 600)
-        pygame.draw.rect(self.screen, COLOR_PANEL, panel_rect, border_radius=10)
-        pygame.draw.rect(self.screen, COLOR_BORDER, panel_rect, 2, border_radius=10)
+        """Draw the visible part of the water samples grid"""
+        # Keep tubes that are partly scrolled out inside the view
+        previous_clip = self.screen.get_clip()
+        self.screen.set_clip(previous_clip.clip(SAMPLE_VIEW_RECT))
+        
+        if self.view_mode == "heatmap":
+            self.sample_heatmap.draw(self.screen)
+            self.screen.set_clip(previous_clip)
+            return
         
-        # Panel title
-        title = FONT_SUBTITLE.render("Water Samples", True, COLOR_TEXT_PRIMARY)
-        self.screen.blit(title, (30, 150))
+        for tube in self.sample_grid.visible_tubes():
+            if self.screen.get_clip().colliderect(tube.bounds):
+                tube.draw(self.screen)
+        self.sample_grid.draw_scrollbar(self.screen)
         
-        # Draw test tubes
-        for tube in self.test_tubes:
-            tube.draw(self.screen)
+        self.screen.set_clip(previous_clip)
     
     def draw_metrics_panel(self):
         """Draw performance metrics panel"""
-        panel_rect = pygame.Rect(970, 140, 410, 600)
-        pygame.draw.rect(self.screen, COLOR_PANEL, panel_rect, border_radius=10)
-        pygame.draw.rect(self.screen, COLOR_BORDER, panel_rect, 2, border_radius=10)
-        
-        # Panel title
-        title = FONT_SUBTITLE.render("Performance Metrics", True, COLOR_TEXT_PRIMARY)
-        self.screen.blit(title, (990, 150))
-        
         y_offset = 200
         
         # Testing progress
         if self.is_testing:
-            progress_text = FONT_NORMAL.render(f"Testing: {self.test_mode.capitalize()}", 
-                                             True, COLOR_TEXT_PRIMARY)
+            progress_text = render_text(FONT_NORMAL, f"Testing: {self.test_mode.capitalize()}", 
+                                        COLOR_TEXT_PRIMARY)
             self.screen.blit(progress_text, (990, y_offset))
             y_offset += 40
             
@@ -357,43 +1170,43 @@ class WaterQualityLabGUI:
             pygame.draw.rect(self.screen, COLOR_PROGRESS_FILL, fill_rect, border_radius=5)
             pygame.draw.rect(self.screen, COLOR_BORDER, bar_rect, 2, border_radius=5)
             
-            percent_text = FONT_SMALL.render(f"{int(self.test_progress * 100)}%", 
-                                            True, COLOR_TEXT_PRIMARY)
+            percent_text = render_text(FONT_SMALL, f"{int(self.test_progress * 100)}%", 
+                                       COLOR_TEXT_PRIMARY)
             self.screen.blit(percent_text, (1170, y_offset + 5))
             y_offset += 50
         
         # Sequential time
         if self.sequential_time > 0:
-            seq_text = FONT_NORMAL.render(f"Sequential Time: {self.sequential_time:.2f}s", 
-                                         True, COLOR_TEXT_PRIMARY)
+            seq_text = render_text(FONT_NORMAL, f"Sequential Time: {self.sequential_time:.2f}s", 
+                                   COLOR_TEXT_PRIMARY)
             self.screen.blit(seq_text, (990, y_offset))
             y_offset += 35
         
         # Parallel time
         if self.parallel_time > 0:
-            par_text = FONT_NORMAL.render(f"Parallel Time: {self.parallel_time:.2f}s", 
-                                         True, COLOR_TEXT_PRIMARY)
+            par_text = render_text(FONT_NORMAL, f"Parallel Time: {self.parallel_time:.2f}s", 
+                                   COLOR_TEXT_PRIMARY)
             self.screen.blit(par_text, (990, y_offset))
             y_offset += 35
         
         # Speedup
         if self.speedup > 0:
-            speedup_text = FONT_SUBTITLE.render(f"Speedup: {self.speedup:.2f}x", 
-                                               True, COLOR_SUCCESS)
+            speedup_text = render_text(FONT_SUBTITLE, f"Speedup: {self.speedup:.2f}x", 
+                                       COLOR_SUCCESS)
             self.screen.blit(speedup_text, (990, y_offset))
             y_offset += 50
             
             # Time saved
             time_saved = self.sequential_time - self.parallel_time
-            saved_text = FONT_NORMAL.render(f"Time Saved: {time_saved:.2f}s ({time_saved/self.sequential_time*100:.1f}%)", 
-                                          True, COLOR_TEXT_SECONDARY)
+            saved_text = render_text(FONT_NORMAL, f"Time Saved: {time_saved:.2f}s ({time_saved/self.sequential_time*100:.1f}%)", 
+                                     COLOR_TEXT_SECONDARY)
             self.screen.blit(saved_text, (990, y_offset))
             y_offset += 50
         
         # Selected sample details
         if self.selected_sample:
             y_offset += 20
-            detail_title = FONT_SUBTITLE.render("Sample Details", True, COLOR_TEXT_PRIMARY)
+            detail_title = render_text(FONT_SUBTITLE, "Sample Details", COLOR_TEXT_PRIMARY)
             self.screen.blit(detail_title, (990, y_offset))
             y_offset += 40
             
@@ -410,9 +1223,11 @@ class WaterQualityLabGUI:
             ]
             
             for detail in details:
-                text = FONT_SMALL.render(detail, True, COLOR_TEXT_SECONDARY)
+                text = render_text(FONT_SMALL, detail, COLOR_TEXT_SECONDARY)
                 self.screen.blit(text, (990, y_offset))
                 y_offset += 25
+        
+        self.metrics_drawn_state = self.metrics_state()
     
     def draw_buttons(self):
         """Draw control buttons"""
@@ -424,10 +1239,19 @@ class WaterQualityLabGUI:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.running = False
+            elif event.type in (pygame.VIDEOEXPOSE, getattr(pygame, 'WINDOWEXPOSED', pygame.VIDEOEXPOSE)):
+                # Window contents were lost (e.g. uncovered or restored)
+                self.invalidate_all()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.show_profiler = not self.show_profiler
             
             # Button events
             if self.buttons['add_sample'].handle_event(event):
-                if len(self.samples) < 30:
+                if len(self.samples) < MAX_SAMPLES:
+                    self.add_sample()
+            
+            if self.buttons['add_batch'].handle_event(event):
+                for _ in range(min(SAMPLE_BATCH_SIZE, MAX_SAMPLES - len(self.samples))):
                     self.add_sample()
             
             if self.buttons['remove_sample'].handle_event(event):
@@ -442,20 +1266,40 @@ class WaterQualityLabGUI:
             if self.buttons['clear_all'].handle_event(event):
                 self.clear_all_samples()
             
+            if self.buttons['toggle_view'].handle_event(event):
+                self.toggle_view_mode()
+            
+            # Sample grid scrolling (mouse wheel) and zooming (Ctrl + wheel)
+            if event.type == pygame.MOUSEWHEEL and self.view_mode == "tubes":
+                if pygame.key.get_mods() & pygame.KMOD_CTRL:
+                    self.zoom_samples(1.25 if event.y > 0 else 0.8)
+                else:
+                    self.scroll_samples(-event.y * SCROLL_STEP)
+            elif event.type == pygame.KEYDOWN and self.view_mode == "tubes":
+                if event.key == pygame.K_PAGEDOWN:
+                    self.scroll_samples(SAMPLE_VIEW_RECT.height)
+                elif event.key == pygame.K_PAGEUP:
+                    self.scroll_samples(-SAMPLE_VIEW_RECT.height)
+                elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    self.zoom_samples(1.25)
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    self.zoom_samples(0.8)
+            
             # Test tube selection
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                for tube in self.test_tubes:
-                    if tube.contains_point(event.pos):
-                        # Deselect all
-                        for t in self.test_tubes:
-                            t.selected = False
-                        # Select clicked
-                        tube.selected = True
-                        self.selected_sample = tube.sample
-                        break
+            if (event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and
+                    SAMPLE_VIEW_RECT.collidepoint(event.pos)):
+                if self.view_mode == "heatmap":
+                    index = self.sample_heatmap.index_at(event.pos)
+                    if index is not None:
+                        self.select_sample(index)
+                else:
+                    index = self.sample_grid.index_at(event.pos)
+                    if index is not None:
+                        self.select_sample(index)
         
         # Update button states
-        self.buttons['add_sample'].is_disabled = len(self.samples) >= 30 or self.is_testing
+        self.buttons['add_sample'].is_disabled = len(self.samples) >= MAX_SAMPLES or self.is_testing
+        self.buttons['add_batch'].is_disabled = len(self.samples) >= MAX_SAMPLES or self.is_testing
         self.buttons['remove_sample'].is_disabled = len(self.samples) == 0 or self.is_testing
         self.buttons['test_sequential'].is_disabled = len(self.samples) == 0 or self.is_testing
         self.buttons['test_parallel'].is_disabled = len(self.samples) == 0 or self.is_testing
@@ -464,31 +1308,209 @@ class WaterQualityLabGUI:
     def update(self, dt: float):
         """Update application state"""
         # Update test tubes animation
-        for tube in self.test_tubes:
+        for tube in self.visible_tubes():
             tube.update(dt)
         
+        # Scroll the live charts before this frame's results are added
+        if self.is_testing:
+            self.live_charts.advance(time.time())
+        
         # Update testing progress
         self.update_testing()
     
+    def header_state(self) -> tuple:
+        """Everything shown in the header info line"""
+        return (len(self.samples), self.test_engine.num_workers)
+    
+    def metrics_state(self) -> tuple:
+        """Everything shown in the metrics panel"""
+        sample = self.selected_sample
+        return (self.is_testing, self.test_mode, int(380 * self.test_progress),
+                self.sequential_time, self.parallel_time, self.speedup,
+                id(sample) if sample else None, sample.tested if sample else None)
+    
+    def live_charts_state(self) -> tuple:
+        """The live charts change whenever they scroll or record a result"""
+        return (self.live_charts.version, self.is_testing)
+    
+    def profiler_state(self) -> tuple:
+        """The overlay refreshes four times a second while it is shown"""
+        if not self.show_profiler:
+            return (False,)
+        return (True, int(time.time() * 4))
+    
+    def draw_live_charts(self):
+        """Draw the throughput sparkline and the worker occupancy strip"""
+        self.live_charts_drawn_state = self.live_charts_state()
+        charts = self.live_charts
+        
+        pygame.draw.rect(self.screen, COLOR_PANEL, LIVE_CHARTS_RECT, border_radius=6)
+        pygame.draw.rect(self.screen, COLOR_BORDER, LIVE_CHARTS_RECT, 1, border_radius=6)
+        x, y = LIVE_CHARTS_RECT.x + 10, LIVE_CHARTS_RECT.y + 6
+        
+        if self.is_testing:
+            rate_label = f"Throughput: {charts.throughput:.1f} samples/s"
+        elif charts.completed:
+            rate_label = f"Throughput: {charts.average_throughput:.1f} samples/s (run average)"
+        else:
+            rate_label = "Throughput: run a test to see live charts"
+        rate_text = render_text(FONT_SMALL, rate_label, COLOR_TEXT_PRIMARY)
+        self.screen.blit(rate_text, (x, y))
+        self.screen.blit(charts.sparkline, (x, y + 18))
+        
+        lanes_text = render_text(FONT_SMALL, f"Worker occupancy: {len(charts.lanes)} workers, "
+                                             f"{charts.completed} tests", COLOR_TEXT_SECONDARY)
+        self.screen.blit(lanes_text, (x, y + 18 + LiveRunCharts.SPARKLINE_HEIGHT + 6))
+        self.screen.blit(charts.gantt, (x, LIVE_CHARTS_RECT.bottom - 6 - LiveRunCharts.GANTT_HEIGHT))
+    
+    def draw_profiler_overlay(self):
+        """Draw FPS, per-phase timings and the frame-time histogram"""
+        self.profiler_drawn_state = self.profiler_state()
+        if not self.show_profiler:
+            return
+        
+        pygame.draw.rect(self.screen, COLOR_PANEL, PROFILER_RECT, border_radius=6)
+        pygame.draw.rect(self.screen, COLOR_BORDER, PROFILER_RECT, 1, border_radius=6)
+        
+        x, y = PROFILER_RECT.x + 10, PROFILER_RECT.y + 8
+        frame_ms = 1000 / self.profiler.fps if self.profiler.fps else 0.0
+        fps_text = render_text(FONT_SMALL, f"FPS: {self.profiler.fps:.1f}  |  frame {frame_ms:.1f} ms", 
+                               COLOR_TEXT_PRIMARY)
+        self.screen.blit(fps_text, (x, y))
+        
+        phases = self.profiler.phase_means_ms()
+        phase_text = render_text(FONT_SMALL, "  ".join(f"{phase} {ms:.2f}" for phase, ms in phases.items()) + " ms", 
+                                 COLOR_TEXT_SECONDARY)
+        self.screen.blit(phase_text, (x, y + 20))
+        
+        # Histogram of recent frame times
+        counts = self.profiler.histogram()
+        labels = [f"<{edge}" for edge in FrameProfiler.HISTOGRAM_EDGES_MS] + [f">{FrameProfiler.HISTOGRAM_EDGES_MS[-1]}"]
+        bar_width = (PROFILER_RECT.width - 20) // len(counts)
+        chart_bottom = PROFILER_RECT.bottom - 22
+        max_count = max(max(counts), 1)
+        for i, (count, label) in enumerate(zip(counts, labels)):
+            bar_height = int(52 * count / max_count)
+            bar_x = x + i * bar_width
+            color = COLOR_SUCCESS if i < 4 else COLOR_WARNING if i < 6 else COLOR_DANGER
+            pygame.draw.rect(self.screen, color, (bar_x + 2, chart_bottom - bar_height, bar_width - 4, bar_height))
+            label_text = render_text(FONT_SMALL, label, COLOR_TEXT_SECONDARY)
+            self.screen.blit(label_text, label_text.get_rect(midtop=(bar_x + bar_width // 2, chart_bottom + 3)))
+    
+    def invalidate(self, rect: pygame.Rect):
+        """Mark a screen area for redrawing on the next frame"""
+        # Many results can invalidate the same area within one frame
+        if any(pending.contains(rect) for pending in self.pending_dirty_rects):
+            return
+        self.pending_dirty_rects.append(pygame.Rect(rect))
+    
+    def invalidate_all(self):
+        """Redraw the whole window on the next frame"""
+        self.needs_full_redraw = True
+    
+    def collect_dirty_rects(self) -> List[pygame.Rect]:
+        """Gather the screen areas whose content changed since the last frame"""
+        dirty_rects = self.pending_dirty_rects
+        self.pending_dirty_rects = []
+        
+        if self.header_state() != self.header_drawn_state:
+            dirty_rects.append(HEADER_INFO_RECT)
+        if self.metrics_state() != self.metrics_drawn_state:
+            dirty_rects.append(METRICS_CONTENT_RECT)
+        if self.live_charts_state() != self.live_charts_drawn_state:
+            dirty_rects.append(LIVE_CHARTS_RECT)
+        if self.profiler_state() != self.profiler_drawn_state:
+            dirty_rects.append(PROFILER_RECT)
+        
+        for widget in self.visible_tubes() + list(self.buttons.values()):
+            rect = widget.get_dirty_rect()
+            if rect is not None:
+                dirty_rects.append(rect)
+        
+        return dirty_rects
+    
+    def draw_dirty_rect(self, rect: pygame.Rect):
+        """Restore the background of one area and redraw what overlaps it"""
+        self.screen.set_clip(rect)
+        self.screen.blit(self.static_layer, rect, rect)
+        
+        if rect.colliderect(HEADER_INFO_RECT):
+            self.draw_header()
+        if rect.colliderect(LIVE_CHARTS_RECT):
+            self.draw_live_charts()
+        if rect.colliderect(PROFILER_RECT):
+            self.draw_profiler_overlay()
+        if rect.colliderect(METRICS_CONTENT_RECT):
+            self.draw_metrics_panel()
+        if rect.colliderect(SAMPLE_VIEW_RECT):
+            self.draw_samples_panel()
+        for button in self.buttons.values():
+            if rect.colliderect(button.bounds):
+                button.draw(self.screen)
+        
+        self.screen.set_clip(None)
+    
     def draw(self):
-        """Draw all UI components"""
-        self.screen.fill(COLOR_BG)
+        """Draw all UI components, updating only the parts that changed"""
+        if self.needs_full_redraw:
+            if self.use_render_cache:
+                self.screen.blit(self.static_layer, (0, 0))
+            else:
+                self.draw_static(self.screen)
+            
+            self.draw_header()
+            self.draw_live_charts()
+            self.draw_samples_panel()
+            self.draw_metrics_panel()
+            self.draw_buttons()
+            self.draw_profiler_overlay()
+            
+            self.needs_full_redraw = False
+            self.pending_dirty_rects.clear()
+            self.frame_was_drawn = True
+            pygame.display.flip()
+            return
         
-        self.draw_header()
-        self.draw_samples_panel()
-        self.draw_metrics_panel()
-        self.draw_buttons()
+        dirty_rects = self.collect_dirty_rects()
+        self.frame_was_drawn = bool(dirty_rects)
+        if not dirty_rects:
+            return
+        
+        for rect in dirty_rects:
+            self.draw_dirty_rect(rect)
+        
+        pygame.display.update(dirty_rects)
+    
+    def run_frame(self, dt: float):
+        """Handle events, update and draw one frame, timing each phase"""
+        start = time.perf_counter()
+        self.handle_events()
+        events_done = time.perf_counter()
+        self.update(dt)
+        update_done = time.perf_counter()
+        self.draw()
+        draw_done = time.perf_counter()
         
-        pygame.display.flip()
+        self.profiler.record(dt, events_done - start, update_done - events_done, draw_done - update_done)
+    
+    def is_idle(self) -> bool:
+        """Whether nothing is animating, testing or changing on screen"""
+        return not (self.is_testing or self.frame_was_drawn or self.needs_full_redraw or
+                    any(tube.is_animating for tube in self.visible_tubes()))
     
     def run(self):
         """Main application loop"""
         while self.running:
+            if self.is_idle():
+                # Nothing to animate: sleep until input arrives instead of
+                # ticking at full frame rate
+                event = pygame.event.wait(IDLE_WAKE_INTERVAL_MS)
+                if event.type != pygame.NOEVENT:
+                    pygame.event.post(event)
+            
             dt = self.clock.tick(FPS) / 1000.0  # Delta time in seconds
             
-            self.handle_events()
-            self.update(dt)
-            self.draw()
+            self.run_frame(dt)
         
         pygame.quit()
         sys.exit()
@@ -0,0 +1,389 @@
+"""
+Persistence Module
+Stores samples and test run history in SQLite
+
+The database runs in WAL mode, so readers never wait for the writer and a
+commit only appends to the log. Samples are inserted with executemany in
+batched transactions, and sample_id, source_location and quality are
+indexed.
+
+BackgroundWriter owns its own connection on a writer thread. The engine
+(TestEngine(recorder=...)) and batch.py only put results on a queue, so
+they wait for the disk only when the queue is full. Queued batches are
+merged into large transactions while the writer catches up.
+
+    writer = BackgroundWriter("lab.db")
+    engine = TestEngine(recorder=writer)
+    ...
+    writer.close()
+
+    with SampleDatabase("lab.db") as db:
+        for batch in db.iter_batches(location="Reservoir"):
+            ...
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from water_sample import WaterSample
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    row_id INTEGER PRIMARY KEY,
+    sample_id INTEGER NOT NULL,
+    ph_level REAL NOT NULL,
+    turbidity REAL NOT NULL,
+    dissolved_oxygen REAL NOT NULL,
+    total_coliform INTEGER NOT NULL,
+    nitrate_level REAL NOT NULL,
+    source_location TEXT NOT NULL,
+    tested INTEGER NOT NULL,
+    test_duration REAL NOT NULL,
+    collected_at REAL NOT NULL DEFAULT 0,
+    quality TEXT
+);
+CREATE INDEX IF NOT EXISTS samples_sample_id ON samples (sample_id);
+CREATE INDEX IF NOT EXISTS samples_location ON samples (source_location);
+CREATE INDEX IF NOT EXISTS samples_quality ON samples (quality);
+
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    recorded_at REAL NOT NULL,
+    mode TEXT NOT NULL,
+    num_samples INTEGER NOT NULL,
+    total_time REAL NOT NULL,
+    details TEXT NOT NULL
+);
+"""
+
+# WaterSample fields in table column order
+SAMPLE_FIELDS = ('sample_id', 'ph_level', 'turbidity', 'dissolved_oxygen', 'total_coliform',
+                 'nitrate_level', 'source_location', 'tested', 'test_duration', 'collected_at')
+
+INSERT_SAMPLE = (f"INSERT INTO samples ({', '.join(SAMPLE_FIELDS)}, quality) "
+                 f"VALUES ({', '.join('?' * (len(SAMPLE_FIELDS) + 1))})")
+
+# Rows per transaction (and per batch read back)
+DEFAULT_BATCH_SIZE = 5000
+
+# Submissions (chunks of samples or runs) a BackgroundWriter queues before
+# submitting blocks, so a slow disk slows the producer instead of growing memory
+DEFAULT_MAX_PENDING = 64
+
+# Seconds between checks that the writer thread is still alive while waiting on it
+WRITER_POLL_INTERVAL = 0.1
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Open a database in WAL mode and create the schema if needed.
+
+    synchronous=NORMAL is safe with WAL: a crash can lose the last
+    transactions but never corrupts the database.
+    """
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+
+    # Databases created before samples had timestamps
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(samples)")}
+    if 'collected_at' not in columns:
+        with connection:
+            connection.execute("ALTER TABLE samples ADD COLUMN collected_at REAL NOT NULL DEFAULT 0")
+    return connection
+
+
+def sample_row(sample: WaterSample, rating: str = None) -> tuple:
+    """
+    Table row of a sample.
+
+    Args:
+        sample: Sample to store
+        rating: Quality rating value if already known (e.g. from
+                TestEngine.test_stream); a given rating marks the sample tested
+
+    Returns:
+        Tuple in SAMPLE_FIELDS order followed by the quality (None if untested)
+    """
+    tested = sample.tested or rating is not None
+    if rating is None and sample.tested:
+        rating = sample.get_quality_rating().value
+    return (sample.sample_id, sample.ph_level, sample.turbidity, sample.dissolved_oxygen,
+            sample.total_coliform, sample.nitrate_level, sample.source_location,
+            int(tested), sample.test_duration, sample.collected_at, rating)
+
+
+class SampleDatabase:
+    """
+    Samples and run history in one SQLite file.
+
+    A SampleDatabase (like its sqlite3 connection) belongs to the thread
+    that created it; use BackgroundWriter to write from another thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = connect(path)
+
+    def __enter__(self) -> 'SampleDatabase':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the connection"""
+        self.connection.close()
+
+    def insert_rows(self, rows: Iterable[tuple], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """
+        Insert prepared sample rows, one transaction per batch.
+
+        Args:
+            rows: Rows from sample_row()
+            batch_size: Rows per transaction
+
+        Returns:
+            Number of rows inserted
+        """
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                with self.connection:
+                    self.connection.executemany(INSERT_SAMPLE, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            with self.connection:
+                self.connection.executemany(INSERT_SAMPLE, batch)
+            count += len(batch)
+        return count
+
+    def insert_samples(self, samples: Iterable[WaterSample], ratings: Sequence[str] = None,
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """
+        Insert samples, one transaction per batch.
+
+        Args:
+            samples: Samples to store
+            ratings: Their quality rating values, if already known
+            batch_size: Rows per transaction
+
+        Returns:
+            Number of samples inserted
+        """
+        if ratings is None:
+            rows = (sample_row(sample) for sample in samples)
+        else:
+            rows = (sample_row(sample, rating) for sample, rating in zip(samples, ratings))
+        return self.insert_rows(rows, batch_size)
+
+    def record_run(self, entry: Dict, recorded_at: float = None) -> int:
+        """
+        Store one TestEngine.results_history entry.
+
+        Returns:
+            The run id
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (recorded_at, mode, num_samples, total_time, details) VALUES (?, ?, ?, ?, ?)",
+                (recorded_at or time.time(), entry['mode'], entry['num_samples'], entry['total_time'],
+                 json.dumps(entry)))
+        return cursor.lastrowid
+
+    def runs(self, mode: str = None) -> List[Dict]:
+        """
+        Stored run history, oldest first, as results_history entries.
+
+        Each entry also carries its 'run_id' and 'recorded_at' time.
+        """
+        sql = "SELECT run_id, recorded_at, details FROM runs"
+        parameters = ()
+        if mode is not None:
+            sql += " WHERE mode = ?"
+            parameters = (mode,)
+        return [{**json.loads(details), 'run_id': run_id, 'recorded_at': recorded_at}
+                for run_id, recorded_at, details in self.connection.execute(sql + " ORDER BY run_id", parameters)]
+
+    def _where(self, location: Optional[str], quality: Optional[str]):
+        """WHERE clause and parameters for the optional sample filters"""
+        clauses, parameters = [], []
+        if location is not None:
+            clauses.append("source_location = ?")
+            parameters.append(location)
+        if quality is not None:
+            clauses.append("quality = ?")
+            parameters.append(quality)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), parameters
+
+    def count(self, location: str = None, quality: str = None) -> int:
+        """Number of stored samples, optionally from one location and/or with one quality value"""
+        where, parameters = self._where(location, quality)
+        return self.connection.execute(f"SELECT COUNT(*) FROM samples{where}", parameters).fetchone()[0]
+
+    def iter_batches(self, batch_size: int = DEFAULT_BATCH_SIZE, location: str = None,
+                     quality: str = None) -> Iterator[List[WaterSample]]:
+        """
+        Stream stored samples back in insertion order, one batch at a time.
+
+        Only one batch of rows is held in memory, so any number of samples
+        can be read (e.g. into a SampleStore, batch by batch).
+
+        Args:
+            batch_size: Samples per batch
+            location: Only samples from this source location
+            quality: Only samples with this quality rating value
+
+        Yields:
+            Lists of WaterSample objects
+        """
+        where, parameters = self._where(location, quality)
+        cursor = self.connection.execute(
+            f"SELECT {', '.join(SAMPLE_FIELDS)} FROM samples{where} ORDER BY row_id", parameters)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [WaterSample(sample_id, ph_level, turbidity, dissolved_oxygen, total_coliform,
+                               nitrate_level, source_location, bool(tested), test_duration, collected_at)
+                   for (sample_id, ph_level, turbidity, dissolved_oxygen, total_coliform,
+                        nitrate_level, source_location, tested, test_duration, collected_at) in rows]
+
+
+class BackgroundWriter:
+    """
+    Writes samples and runs to a SampleDatabase on a background thread.
+
+    submit_samples() and record_run() only queue the work and return at
+    once, unless max_pending submissions are already waiting. The writer
+    thread turns samples into rows and merges whatever has queued up into
+    transactions of up to batch_size rows.
+
+    The database is opened before the constructor returns, so a bad path
+    fails there. Later errors on the writer thread are raised again from
+    submit_samples(), record_run(), flush() and close().
+    """
+
+    def __init__(self, path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        """
+        Open the database and start the writer thread.
+
+        Raises:
+            RuntimeError: If the database cannot be opened
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.runs_written = 0
+        self.error: Optional[BaseException] = None
+        self.queue: queue.Queue = queue.Queue(max_pending)
+        self._opened = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="sample-writer", daemon=True)
+        self.thread.start()
+        self._opened.wait()
+        self._raise_error()
+
+    def submit_samples(self, samples: List[WaterSample], ratings: List[str] = None):
+        """Queue samples (and their ratings, if known) for writing"""
+        self._put(('samples', samples, ratings))
+
+    def record_run(self, entry: Dict):
+        """Queue a results_history entry for writing"""
+        self._put(('run', dict(entry), time.time()))
+
+    def flush(self):
+        """Wait until everything queued so far is committed"""
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks and self.thread.is_alive():
+                self.queue.all_tasks_done.wait(WRITER_POLL_INTERVAL)
+        self._raise_error()
+
+    def close(self):
+        """Write everything still queued, then stop the writer thread"""
+        if self.thread.is_alive():
+            self._put(None, check_error=False)
+            self.thread.join()
+        self._raise_error()
+
+    def __enter__(self) -> 'BackgroundWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _put(self, item, check_error: bool = True):
+        """Queue an item, waiting while the queue is full and the writer alive"""
+        if check_error:
+            self._raise_error()
+        while self.thread.is_alive():
+            try:
+                self.queue.put(item, timeout=WRITER_POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+        self._raise_error()
+        raise RuntimeError(f"The writer for {self.path} has stopped")
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError(f"Writing to {self.path} failed: {self.error}") from self.error
+
+    def _run(self):
+        try:
+            database = SampleDatabase(self.path)
+        except Exception as e:
+            self.error = e
+            return
+        finally:
+            self._opened.set()
+
+        try:
+            while True:
+                item = self.queue.get()
+                items = [item]
+                # Merge whatever else is already waiting into the same transactions
+                while item is not None and len(items) < self.batch_size:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    items.append(item)
+
+                try:
+                    self._write(database, [item for item in items if item is not None])
+                except Exception as e:
+                    self.error = e
+                finally:
+                    for _ in items:
+                        self.queue.task_done()
+
+                if items[-1] is None:
+                    break
+        finally:
+            database.close()
+
+    def _write(self, database: SampleDatabase, items: List[tuple]):
+        rows, runs = [], []
+        for kind, payload, extra in items:
+            if kind == 'run':
+                runs.append((payload, extra))
+            elif extra is None:
+                rows.extend(sample_row(sample) for sample in payload)
+            else:
+                rows.extend(sample_row(sample, rating) for sample, rating in zip(payload, extra))
+
+        # A run's samples are queued before the run itself
+        self.rows_written += database.insert_rows(rows, self.batch_size)
+        for entry, recorded_at in runs:
+            database.record_run(entry, recorded_at)
+            self.runs_written += 1
@@ -0,0 +1,263 @@
+"""
+Query Module
+Fast multi-parameter queries over the samples in a SampleStore
+
+    query = (SampleQuery(store).location("Industrial Area")
+             .where("coliform", ">", 50).where("nitrate", ">", 30))
+    samples = query.samples()
+    worst = query.worst(10, by="coliform")
+
+Every condition can be answered from an index: locations and qualities
+from inverted indexes (posting lists), numeric parameters from the sorted
+indexes of sample_store.SampleStore. The planner counts how many samples
+each condition matches, which is exact and cheap (a posting list length,
+or two binary searches). It drives from the most selective index and
+checks the remaining conditions on those candidates only, with vectorized
+comparisons. When even the best index matches a large share of the store,
+gathering its scattered positions costs more than comparing whole
+columns, so the columns are scanned instead.
+"""
+
+import heapq
+import operator
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from aggregation import QUALITY_CODES
+from sample_store import SampleStore
+from scoring import PARAMETER_FIELDS
+from water_sample import WaterQuality, WaterSample
+
+
+# Comparison operators accepted by where(); "between" takes (low, high), inclusive
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    'between': lambda values, bounds: (values >= bounds[0]) & (values <= bounds[1]),
+}
+
+# Above this share of the store, a column scan beats driving from an index
+SCAN_FRACTION = 0.3
+
+# Cost of pushing one candidate through a Python heap, relative to
+# checking one sample with a vectorized comparison; worst() uses it to
+# choose between a heap over the candidates and walking the sorted index
+HEAP_COST = 30
+
+# Whether a higher value is worse, for worst(by=...); pH is bad in both
+# directions, so it needs an explicit direction. "score" is the total score.
+WORSE_WHEN_HIGHER = {
+    'score': False,
+    'turbidity': True,
+    'dissolved_oxygen': False,
+    'coliform': True,
+    'nitrate': True,
+}
+
+
+class Condition(NamedTuple):
+    """
+    One query condition.
+
+    Attributes:
+        field: "location", "quality" or a parameter key
+        op: Operator from OPERATORS ("in" for location and quality)
+        value: Comparison value, (low, high) for "between", or a tuple of codes for "in"
+    """
+    field: str
+    op: str
+    value: object
+
+
+class QueryPlan(NamedTuple):
+    """
+    How a query will run.
+
+    Attributes:
+        driver: Index condition the candidates come from, or None for a column scan
+        estimates: Number of samples each condition matches on its own
+        total: Samples in the store
+    """
+    driver: Optional[Condition]
+    estimates: List[int]
+    total: int
+
+    def __str__(self) -> str:
+        if self.driver is None:
+            return f"column scan over {self.total:,} samples"
+        return (f"index on {self.driver.field} {self.driver.op} {self.driver.value!r} "
+                f"-> {min(self.estimates):,} of {self.total:,} candidates")
+
+
+class SampleQuery:
+    """
+    Conjunction of conditions over a SampleStore, built with chained calls.
+
+    Conditions are combined with AND; several values in location() or
+    quality() are combined with OR.
+    """
+
+    def __init__(self, store: SampleStore):
+        self.store = store
+        self.conditions: List[Condition] = []
+
+    def location(self, *locations: str) -> 'SampleQuery':
+        """Keep samples from any of the given source locations"""
+        codes = tuple(code for code in map(self.store.location_code, locations) if code >= 0)
+        self.conditions.append(Condition('location', 'in', codes))
+        return self
+
+    def quality(self, *qualities: WaterQuality) -> 'SampleQuery':
+        """Keep samples with any of the given quality ratings"""
+        codes = tuple(QUALITY_CODES[quality.value] for quality in qualities)
+        self.conditions.append(Condition('quality', 'in', codes))
+        return self
+
+    def where(self, parameter: str, op: str, value) -> 'SampleQuery':
+        """
+        Keep samples whose parameter compares true against a value.
+
+        Args:
+            parameter: Parameter key (see scoring.PARAMETER_FIELDS)
+            op: One of OPERATORS
+            value: Number, or (low, high) for "between"
+
+        Raises:
+            ValueError: If the parameter or operator is unknown
+        """
+        if parameter not in PARAMETER_FIELDS:
+            raise ValueError(f"Unknown parameter: {parameter}")
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {op}")
+        self.conditions.append(Condition(parameter, op, value))
+        return self
+
+    def _postings(self, condition: Condition) -> List[np.ndarray]:
+        """Posting lists matching a location or quality condition"""
+        index = (self.store.location_postings() if condition.field == 'location'
+                 else self.store.quality_postings())
+        return [index[code] for code in condition.value if code in index]
+
+    def _index_range(self, condition: Condition):
+        """Slice of the parameter's sorted index matching a condition"""
+        order, values = self.store.sorted_index(condition.field)
+        op, value = condition.op, condition.value
+        if op == 'between':
+            return order, (np.searchsorted(values, value[0], side='left'),
+                           np.searchsorted(values, value[1], side='right'))
+        if op in ('>', '>='):
+            return order, (np.searchsorted(values, value, side='right' if op == '>' else 'left'), len(values))
+        if op in ('<', '<='):
+            return order, (0, np.searchsorted(values, value, side='left' if op == '<' else 'right'))
+        return order, (np.searchsorted(values, value, side='left'),
+                       np.searchsorted(values, value, side='right'))
+
+    def _estimate(self, condition: Condition) -> int:
+        """Exact number of samples matching one condition"""
+        if condition.op == 'in':
+            return sum(len(postings) for postings in self._postings(condition))
+        _, (start, end) = self._index_range(condition)
+        return max(0, int(end - start))
+
+    def _candidates(self, condition: Condition) -> np.ndarray:
+        """Positions matching one condition, read from its index"""
+        if condition.op == 'in':
+            postings = self._postings(condition)
+            return np.concatenate(postings) if postings else np.zeros(0, np.int64)
+        order, (start, end) = self._index_range(condition)
+        return order[start:end]
+
+    def _matches(self, condition: Condition, positions: Optional[np.ndarray]) -> np.ndarray:
+        """Vectorized check of one condition on some positions (None for all)"""
+        columns = self.store.columns
+        if condition.op == 'in':
+            codes = columns.location_codes if condition.field == 'location' else columns.quality_codes
+            return np.isin(codes if positions is None else codes[positions], condition.value)
+        values = columns.parameters[condition.field]
+        return OPERATORS[condition.op](values if positions is None else values[positions], condition.value)
+
+    def plan(self) -> QueryPlan:
+        """Choose the most selective index, or a column scan"""
+        total = len(self.store)
+        estimates = [self._estimate(condition) for condition in self.conditions]
+        if not estimates or min(estimates) > total * SCAN_FRACTION:
+            return QueryPlan(None, estimates, total)
+        return QueryPlan(self.conditions[estimates.index(min(estimates))], estimates, total)
+
+    def _filter(self, positions: np.ndarray, skip: Optional[Condition] = None) -> np.ndarray:
+        """Keep the positions matching every condition except skip"""
+        for condition in self.conditions:
+            if condition is skip or not len(positions):
+                continue
+            positions = positions[self._matches(condition, positions)]
+        return positions
+
+    def positions(self) -> np.ndarray:
+        """Ascending store positions of all matching samples"""
+        plan = self.plan()
+        if plan.driver is None:
+            mask = np.ones(len(self.store), dtype=bool)
+            for condition in self.conditions:
+                mask &= self._matches(condition, None)
+            return np.flatnonzero(mask)
+        if min(plan.estimates) == 0:
+            return np.zeros(0, np.int64)
+        return np.sort(self._filter(self._candidates(plan.driver), skip=plan.driver))
+
+    def count(self) -> int:
+        """Number of matching samples"""
+        return len(self.positions())
+
+    def samples(self, limit: int = None) -> List[WaterSample]:
+        """Matching samples as WaterSample objects (the first ``limit`` by position)"""
+        return [self.store.sample_at(position) for position in self.positions()[:limit]]
+
+    def worst(self, k: int, by: str = 'score', higher_is_worse: bool = None) -> List[WaterSample]:
+        """
+        The k worst matching samples, worst first.
+
+        Either the candidates from the driving index are reduced with a
+        heap, or the sorted index of ``by`` is walked from the worst end,
+        block by block, until k samples have passed the conditions. The
+        walk is expected to cover k / selectivity samples (treating the
+        conditions as independent), and the cheaper strategy is used.
+
+        Args:
+            k: Number of samples
+            by: "score" (total score) or a parameter key
+            higher_is_worse: Direction (defaults to WORSE_WHEN_HIGHER[by])
+
+        Returns:
+            Up to k WaterSample objects
+        """
+        if higher_is_worse is None:
+            if by not in WORSE_WHEN_HIGHER:
+                raise ValueError(f"Give higher_is_worse to rank by {by}")
+            higher_is_worse = WORSE_WHEN_HIGHER[by]
+
+        store = self.store
+        values = store.scores if by == 'score' else store.columns.parameters[by]
+        plan = self.plan()
+        selectivity = float(np.prod([estimate / max(1, plan.total) for estimate in plan.estimates]))
+        expected_walk = k / selectivity if selectivity else np.inf
+
+        if plan.driver is not None and min(plan.estimates) * HEAP_COST < expected_walk:
+            candidates = self.positions()
+            select = heapq.nlargest if higher_is_worse else heapq.nsmallest
+            chosen = select(k, candidates.tolist(), key=values.__getitem__)
+        else:
+            order, _ = store.sorted_index(by)
+            walk = order[::-1] if higher_is_worse else order
+            chosen, block = [], max(4 * k, 1024)
+            for start in range(0, len(walk), block):
+                chosen.extend(self._filter(walk[start:start + block]).tolist())
+                if len(chosen) >= k:
+                    break
+            chosen = chosen[:k]
+
+        return [store.sample_at(position) for position in chosen]
+
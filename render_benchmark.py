@@ -0,0 +1,131 @@
+"""
+Render Benchmark Script
+Renders GUI frames headlessly and reports per-phase timings
+
+Runs on the SDL dummy video driver, so no display is needed and rendering
+regressions can be caught on build machines:
+    python render_benchmark.py --frames 600 --samples 2000 --max-p95-ms 8
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+from dataclasses import replace
+from typing import Dict, List
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Value below which the given fraction of values fall"""
+    ordered = sorted(values)
+    return ordered[max(0, int(len(ordered) * fraction) - 1)]
+
+
+def run_render_benchmark(num_frames: int = 600, num_samples: int = 100, view: str = "tubes",
+                         full_redraw: bool = False) -> Dict[str, Dict[str, float]]:
+    """
+    Render frames of a simulated test run and time each phase.
+
+    Every frame feeds a share of fake engine results (and their worker
+    spans for the live charts) through the GUI's result queue, moves the
+    mouse across the window and, in the tube view, regularly scrolls the
+    grid, so all per-frame code paths are exercised.
+
+    Args:
+        num_frames: Number of frames to render
+        num_samples: Number of samples in the batch
+        view: "tubes" or "heatmap"
+        full_redraw: Repaint the whole window every frame
+
+    Returns:
+        Dictionary of phase name -> {'mean', 'p95', 'max'} in milliseconds
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    import main as gui
+    from test_engine import TaskSpan
+    from water_sample import WaterSample
+
+    app = gui.WaterQualityLabGUI()
+    for sample_id in range(len(app.samples) + 1, num_samples + 1):
+        app.samples.append(WaterSample.generate_random_sample(sample_id))
+    app.sync_sample_grid()
+    if view == "heatmap":
+        app.toggle_view_mode()
+    app.profiler = gui.FrameProfiler(window=num_frames)
+
+    # Pretend a run is in progress so results and animations flow
+    num_workers = app.test_engine.num_workers
+    app.live_charts.reset(time.time(), num_workers)
+    app.is_testing = True
+    app.sample_grid.is_testing = True
+    for tube in app.visible_tubes():
+        tube.start_animation()
+
+    pending = iter(range(len(app.samples)))
+    results_per_frame = max(1, len(app.samples) // num_frames)
+    dt = 1.0 / gui.FPS
+
+    for frame in range(num_frames):
+        for index in itertools.islice(pending, results_per_frame):
+            tested = replace(app.samples[index], tested=True, test_duration=2.0)
+            now = time.time()
+            app.result_queue.put(('span', index, TaskSpan(f"worker-{index % num_workers}", now - 2.0, now)))
+            app.result_queue.put(('result', index, tested))
+
+        pos = ((frame * 37) % gui.WINDOW_WIDTH, (frame * 23) % gui.WINDOW_HEIGHT)
+        pygame.event.post(pygame.event.Event(pygame.MOUSEMOTION, pos=pos, rel=(0, 0), buttons=(0, 0, 0)))
+        if view == "tubes" and frame % 30 == 29:
+            app.scroll_samples(gui.SCROLL_STEP)
+        if full_redraw:
+            app.invalidate_all()
+
+        app.run_frame(dt)
+
+    phase_times = {phase: [t * 1000 for t in times] for phase, times in app.profiler.phase_times.items()}
+    phase_times['total'] = [sum(times) for times in zip(*phase_times.values())]
+
+    pygame.quit()
+    return {phase: {'mean': sum(times) / len(times),
+                    'p95': percentile(times, 0.95),
+                    'max': max(times)}
+            for phase, times in phase_times.items()}
+
+
+def main():
+    """Render benchmark entry point"""
+    parser = argparse.ArgumentParser(description="Headless GUI render benchmark")
+    parser.add_argument("--frames", type=int, default=600, help="Frames to render")
+    parser.add_argument("--samples", type=int, default=100, help="Samples in the batch")
+    parser.add_argument("--view", choices=["tubes", "heatmap"], default="tubes",
+                        help="Sample view to render")
+    parser.add_argument("--full-redraw", action="store_true",
+                        help="Repaint the whole window every frame")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="Exit with status 1 if the p95 frame time exceeds this")
+    args = parser.parse_args()
+
+    stats = run_render_benchmark(args.frames, args.samples, args.view, args.full_redraw)
+
+    print("="*60)
+    print("WATER QUALITY LAB - RENDER BENCHMARK")
+    print("="*60)
+    print(f"Frames: {args.frames} | Samples: {args.samples} | View: {args.view}"
+          f"{' | full redraw' if args.full_redraw else ''}")
+    print(f"\n  {'Phase':10} {'Mean':>10} {'p95':>10} {'Max':>10}")
+    for phase, result in stats.items():
+        print(f"  {phase:10} {result['mean']:8.3f}ms {result['p95']:8.3f}ms {result['max']:8.3f}ms")
+
+    mean_total = stats['total']['mean']
+    if mean_total > 0:
+        print(f"\n  Frame budget headroom: {1000 / mean_total:.0f} FPS possible")
+    print("="*60)
+
+    if args.max_p95_ms is not None and stats['total']['p95'] > args.max_p95_ms:
+        print(f"\n✗ p95 frame time {stats['total']['p95']:.3f}ms exceeds {args.max_p95_ms}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Sample Store Module
+In-memory columnar store of tested samples with per-parameter sorted indexes
+
+The store keeps every tested sample as columns (see aggregation.SampleColumns)
+together with its total score, its quality code and a QualityAggregate of
+the whole history.
+
+When the scoring rules change (a regulator tightens a limit), rerate()
+compares the old and new compiled score tables, and only the samples whose
+values fall in the ranges where a parameter's score changed are re-scored.
+Those samples are found by binary search in per-parameter sorted indexes,
+so tightening one limit touches only the samples near it, not the whole
+history. A change to the rating thresholds is handled the same way, with
+the sorted index of total scores.
+
+The same sorted indexes, plus inverted indexes (postings) by location and
+quality, back the query layer in query.py.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+
+import scoring
+from aggregation import QUALITY_CODES, QUALITY_LEVELS, UNTESTED, QualityAggregate, SampleColumns
+from scoring import PARAMETER_FIELDS, CompiledRules
+from water_sample import WaterQuality, WaterSample
+
+
+# Relative widening of the total score ranges re-rated after a threshold change
+RATING_TOLERANCE = 1e-9
+
+
+@dataclass
+class RerateReport:
+    """
+    Outcome of re-rating a store under new rules.
+
+    Attributes:
+        total: Samples in the store
+        touched: Samples re-evaluated
+        changed: Samples whose quality changed
+        elapsed: Seconds taken
+    """
+    total: int
+    touched: int
+    changed: int
+    elapsed: float
+
+    def __str__(self) -> str:
+        share = self.touched / self.total * 100 if self.total else 0
+        return (f"Re-rated {self.touched:,} of {self.total:,} samples ({share:.2f}%), "
+                f"{self.changed:,} changed quality in {self.elapsed * 1000:.2f}ms")
+
+
+def quality_codes(rules: CompiledRules, scores: np.ndarray) -> np.ndarray:
+    """Map total scores to indexes into QUALITY_LEVELS under the given rules"""
+    label_codes = np.array([QUALITY_CODES[label] for label in rules.ratings], dtype=np.int8)
+    return label_codes[rules.rate_scores(scores)]
+
+
+class SampleStore:
+    """
+    Tested samples stored column by column, rated under one rule set.
+
+    Attributes:
+        rules: Rule set the stored qualities were computed with
+        columns: Stored samples; columns.quality_codes holds their current quality
+        scores: Total score of each stored sample under rules
+        aggregate: QualityAggregate of all stored samples
+    """
+
+    def __init__(self, rules: CompiledRules = None):
+        """
+        Create an empty store.
+
+        Args:
+            rules: Rule set to rate with (defaults to the active rules)
+        """
+        self.rules = rules or scoring.get_rules()
+        self.columns = SampleColumns([], np.zeros(0, np.int32), np.zeros(0, np.int8),
+                                     {key: np.zeros(0) for key in PARAMETER_FIELDS},
+                                     np.zeros(0), np.zeros(0, np.int64), np.zeros(0))
+        self.scores = np.zeros(0)
+        self.aggregate = QualityAggregate()
+        self._location_index: Dict[str, int] = {}
+        # Parameter key -> (sample positions in value order, values in that order)
+        self._sorted: Dict[str, tuple] = {}
+        # "location"/"quality" -> code -> ascending positions of the samples with that code
+        self._postings: Dict[str, Dict[int, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def add_columns(self, columns: SampleColumns):
+        """
+        Add a batch of samples; untested samples are skipped.
+
+        The samples are scored under the store's rules, so their qualities
+        stay consistent with everything already stored.
+
+        Args:
+            columns: Batch to add
+        """
+        tested = columns.quality_codes != UNTESTED
+        parameters = {key: values[tested] for key, values in columns.parameters.items()}
+        count = int(np.count_nonzero(tested))
+        if not count:
+            return
+
+        remap = np.array([self._location_index.setdefault(name, len(self._location_index))
+                          for name in columns.locations], dtype=np.int32)
+        sample_ids = (columns.sample_ids[tested] if columns.sample_ids is not None
+                      else np.arange(len(self), len(self) + count, dtype=np.int64))
+        timestamps = columns.timestamps[tested] if columns.timestamps is not None else np.zeros(count)
+        scores = self.rules.score_columns(parameters)
+        batch = SampleColumns(list(self._location_index), remap[columns.location_codes[tested]],
+                              quality_codes(self.rules, scores), parameters,
+                              columns.durations[tested], sample_ids, timestamps)
+
+        stored = self.columns
+        self.columns = SampleColumns(
+            batch.locations,
+            np.concatenate([stored.location_codes, batch.location_codes]),
+            np.concatenate([stored.quality_codes, batch.quality_codes]),
+            {key: np.concatenate([stored.parameters[key], parameters[key]]) for key in PARAMETER_FIELDS},
+            np.concatenate([stored.durations, batch.durations]),
+            np.concatenate([stored.sample_ids, batch.sample_ids]),
+            np.concatenate([stored.timestamps, batch.timestamps]))
+        self.scores = np.concatenate([self.scores, scores])
+        self.aggregate.merge(QualityAggregate.from_columns(batch))
+        # Indexes are rebuilt on first use after new samples arrive
+        self._sorted.clear()
+        self._postings.clear()
+
+    def add_samples(self, samples: List[WaterSample]):
+        """Add tested sample objects (untested ones are skipped)"""
+        self.add_columns(SampleColumns.from_samples(samples))
+
+    def sorted_index(self, key: str):
+        """
+        Sorted index of one parameter.
+
+        Args:
+            key: Parameter key (see scoring.PARAMETER_FIELDS), or "score"
+                 for the total score
+
+        Returns:
+            Tuple of (sample positions ordered by value, the values in that order)
+        """
+        if key not in self._sorted:
+            values = self.scores if key == 'score' else self.columns.parameters[key]
+            order = np.argsort(values, kind='stable')
+            self._sorted[key] = (order, values[order])
+        return self._sorted[key]
+
+    def build_indexes(self):
+        """Build every index now instead of on first use"""
+        for key in PARAMETER_FIELDS:
+            self.sorted_index(key)
+        self.sorted_index('score')
+        self.location_postings()
+        self.quality_postings()
+
+    def positions_in_range(self, key: str, low: float, high: float) -> np.ndarray:
+        """Positions of the samples with low <= value < high (low/high may be infinite)"""
+        order, values = self.sorted_index(key)
+        start, end = np.searchsorted(values, [low, high], side='left')
+        return order[start:end]
+
+    def _build_postings(self, codes: np.ndarray) -> Dict[int, np.ndarray]:
+        """Group sample positions by code (one stable sort, then split)"""
+        order = np.argsort(codes, kind='stable')
+        bounds = np.cumsum(np.bincount(codes.astype(np.int64)))
+        return {code: order[start:end]
+                for code, (start, end) in enumerate(zip(np.concatenate(([0], bounds[:-1])), bounds))
+                if end > start}
+
+    def location_postings(self) -> Dict[int, np.ndarray]:
+        """Inverted index: location code -> positions of its samples"""
+        if 'location' not in self._postings:
+            self._postings['location'] = self._build_postings(self.columns.location_codes)
+        return self._postings['location']
+
+    def quality_postings(self) -> Dict[int, np.ndarray]:
+        """Inverted index: quality code (index into QUALITY_LEVELS) -> positions of its samples"""
+        if 'quality' not in self._postings:
+            self._postings['quality'] = self._build_postings(self.columns.quality_codes)
+        return self._postings['quality']
+
+    def location_code(self, location: str) -> int:
+        """Code of a location name, or -1 if no stored sample comes from it"""
+        return self._location_index.get(location, -1)
+
+    def quality_of(self, position: int) -> WaterQuality:
+        """Current quality of the sample stored at a position"""
+        return QUALITY_LEVELS[self.columns.quality_codes[position]]
+
+    def sample_at(self, position: int) -> WaterSample:
+        """Rebuild the tested WaterSample stored at a position"""
+        columns = self.columns
+        parameters = columns.parameters
+        return WaterSample(
+            sample_id=int(columns.sample_ids[position]),
+            ph_level=float(parameters['ph'][position]),
+            turbidity=float(parameters['turbidity'][position]),
+            dissolved_oxygen=float(parameters['dissolved_oxygen'][position]),
+            total_coliform=int(parameters['coliform'][position]),
+            nitrate_level=float(parameters['nitrate'][position]),
+            source_location=columns.locations[columns.location_codes[position]],
+            tested=True,
+            test_duration=float(columns.durations[position]),
+            collected_at=float(columns.timestamps[position])
+        )
+
+    def rerate(self, rules: CompiledRules) -> RerateReport:
+        """
+        Re-rate the stored samples under new rules, touching as few as possible.
+
+        For each parameter, the value ranges where the old and new tables
+        score differently are looked up in the sorted index, and only those
+        samples are re-scored. If the rating thresholds changed, the total
+        score ranges where the old and new thresholds rate differently are
+        looked up in the score index the same way, and those samples are
+        re-rated too.
+
+        Qualities and the aggregate's location counts are updated in place.
+
+        Args:
+            rules: New rule set
+
+        Returns:
+            RerateReport with touched and changed counts
+        """
+        start_time = time.perf_counter()
+        old_rules = self.rules
+
+        candidates = [self.positions_in_range(key, low, high)
+                      for key in PARAMETER_FIELDS
+                      for low, high in scoring.changed_ranges(old_rules.tables.get(key), rules.tables.get(key))]
+        if not rules.same_ratings(old_rules):
+            # Looked up before any score changes, so the index still holds the
+            # stored scores. Ratings compare percentages, which can round a
+            # little differently from the scores, so the ranges are widened.
+            tolerance = RATING_TOLERANCE * max(old_rules.max_score, rules.max_score)
+            candidates += [self.positions_in_range('score', low - tolerance, high + tolerance)
+                           for low, high in scoring.changed_ranges(old_rules.rating_table(), rules.rating_table())]
+        touched = np.sort(np.concatenate(candidates)) if candidates else np.zeros(0, np.int64)
+        if len(touched):
+            # A sample can fall in the changed ranges of several parameters
+            touched = touched[np.concatenate(([True], touched[1:] != touched[:-1]))]
+
+        columns = self.columns
+        if len(touched):
+            self.scores[touched] = rules.score_columns(
+                {key: values[touched] for key, values in columns.parameters.items()})
+            self._sorted.pop('score', None)
+
+        new_codes = quality_codes(rules, self.scores[touched])
+        changed = touched[new_codes != columns.quality_codes[touched]]
+        new_codes = new_codes[new_codes != columns.quality_codes[touched]]
+
+        if len(changed):
+            self._move_counts(columns.location_codes[changed], columns.quality_codes[changed], new_codes)
+            columns.quality_codes[changed] = new_codes
+            self._postings.pop('quality', None)
+
+        self.rules = rules
+        return RerateReport(len(self), len(touched), len(changed), time.perf_counter() - start_time)
+
+    def _move_counts(self, locations: np.ndarray, old_codes: np.ndarray, new_codes: np.ndarray):
+        """Move samples between quality levels in the aggregate's location counts"""
+        levels = len(QUALITY_LEVELS)
+        size = len(self.columns.locations) * levels
+        delta = (np.bincount(locations.astype(np.int64) * levels + new_codes, minlength=size) -
+                 np.bincount(locations.astype(np.int64) * levels + old_codes, minlength=size))
+        for code, counts in enumerate(delta.reshape(-1, levels)):
+            if counts.any():
+                location = self.columns.locations[code]
+                self.aggregate.location_counts[location] = self.aggregate.location_counts[location] + counts
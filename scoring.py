@@ -0,0 +1,304 @@
+"""
+Scoring Module
+Compiles the declarative quality rules in config.py into a fast scorer
+
+Each parameter's score bands are flattened into a sorted list of
+breakpoints and the score of each interval between them, so scoring a
+value is a single binary search (bisect for one sample, np.searchsorted
+for a batch) instead of a chain of comparisons. The rating thresholds are
+compiled the same way.
+
+The active rules are compiled once at import time (from config.py, or
+from the JSON file named by WQL_SCORING_RULES) and replaced with
+set_rules()/load_rules(). The swap is a single reference assignment, so
+a sample is always rated against one complete rule set, old or new.
+"""
+
+import json
+import math
+import os
+import struct
+from bisect import bisect_right
+from typing import Dict, List, Sequence, Tuple
+
+from config import RATING_FLOOR, RATING_THRESHOLDS, SCORING_RULES
+
+
+# Scoring rule key -> WaterSample field
+PARAMETER_FIELDS = {
+    'ph': 'ph_level',
+    'turbidity': 'turbidity',
+    'dissolved_oxygen': 'dissolved_oxygen',
+    'coliform': 'total_coliform',
+    'nitrate': 'nitrate_level',
+}
+
+# JSON file with {"rules": ..., "thresholds": ..., "floor": ...} loaded at startup
+RULES_ENV_VAR = "WQL_SCORING_RULES"
+
+
+def _next_float(value: float) -> float:
+    """Smallest float greater than value (math.nextafter needs Python 3.9)"""
+    if hasattr(math, 'nextafter'):
+        return math.nextafter(value, math.inf)
+    if value == 0:
+        return 5e-324
+    bits = struct.unpack('<q', struct.pack('<d', value))[0]
+    return struct.unpack('<d', struct.pack('<q', bits + 1 if value > 0 else bits - 1))[0]
+
+
+def _band_contains(band: Dict, value: float) -> bool:
+    """Whether a value falls inside one score band"""
+    return (('min' not in band or value >= band['min']) and
+            ('max' not in band or value <= band['max']) and
+            ('above' not in band or value > band['above']) and
+            ('below' not in band or value < band['below']))
+
+
+def compile_bands(bands: Sequence[Dict]) -> Tuple[List[float], List[float]]:
+    """
+    Flatten first-match score bands into breakpoints.
+
+    The real line is split at every band bound into open intervals and the
+    bound points themselves. Each piece is scored once, then adjacent
+    pieces with equal scores are merged. An inclusive upper bound b becomes
+    a breakpoint just above b, so every interval is closed on the left
+    and a value is looked up with bisect_right.
+
+    Args:
+        bands: Score bands, best first (see config.SCORING_RULES)
+
+    Returns:
+        Tuple of (breakpoints, scores); a value v scores
+        scores[bisect_right(breakpoints, v)]
+    """
+    def score_of(value: float) -> float:
+        for band in bands:
+            if _band_contains(band, value):
+                return band['score']
+        return 0.0
+
+    bounds = sorted({float(band[key]) for band in bands
+                     for key in ('min', 'max', 'above', 'below') if key in band})
+
+    # (start of piece, score) for every piece, left to right
+    if not bounds:
+        return [], [score_of(0.0)]
+    pieces = [(-math.inf, score_of(bounds[0] - 1))]
+    for i, bound in enumerate(bounds):
+        upper = bounds[i + 1] if i + 1 < len(bounds) else bound + 2
+        pieces.append((bound, score_of(bound)))
+        pieces.append((_next_float(bound), score_of((bound + upper) / 2)))
+
+    breakpoints, scores = [], [pieces[0][1]]
+    for start, score in pieces[1:]:
+        if score != scores[-1]:
+            breakpoints.append(start)
+            scores.append(score)
+    return breakpoints, scores
+
+
+class CompiledRules:
+    """
+    Scoring rules compiled into breakpoint tables.
+
+    Call score(sample) for a sample's total score and rate(sample) for its
+    rating label.
+
+    Attributes:
+        tables: Parameter key -> (breakpoints, scores)
+        max_score: Score of a sample that is ideal in every parameter
+        rating_breaks: Ascending score percentages where the rating changes
+        ratings: Rating labels from worst to best (one more than rating_breaks)
+    """
+
+    def __init__(self, rules: Dict[str, Sequence[Dict]] = None,
+                 thresholds: Sequence[Tuple[str, float]] = None,
+                 floor: str = None):
+        """
+        Compile a rule table.
+
+        Args:
+            rules: Parameter key -> score bands (defaults to config.SCORING_RULES)
+            thresholds: (rating, minimum percent) best first (defaults to
+                        config.RATING_THRESHOLDS)
+            floor: Rating below the last threshold (defaults to config.RATING_FLOOR)
+        """
+        rules = SCORING_RULES if rules is None else rules
+        thresholds = RATING_THRESHOLDS if thresholds is None else thresholds
+        floor = RATING_FLOOR if floor is None else floor
+
+        unknown = set(rules) - set(PARAMETER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown parameters in scoring rules: {sorted(unknown)}")
+
+        self.tables = {key: compile_bands(bands) for key, bands in rules.items()}
+        self.max_score = sum(max(band['score'] for band in bands) for bands in rules.values() if bands)
+        if self.max_score <= 0:
+            raise ValueError("Scoring rules must award a positive score")
+
+        ordered = sorted(thresholds, key=lambda item: item[1])
+        self.rating_breaks = [float(percent) for _, percent in ordered]
+        self.ratings = [floor] + [rating for rating, _ in ordered]
+
+        # score(sample) -> total score, rate(sample) -> rating label
+        self.score, self.rate = self._generate_scorers()
+
+    def _generate_scorers(self):
+        """
+        Generate the scalar scoring functions with all lookups unrolled.
+
+        The tables are bound as default arguments (fast locals), so rating a
+        sample costs one bisect per parameter plus one for the rating, with
+        no loop, getattr or method dispatch.
+        """
+        namespace = {'bisect_right': bisect_right, 'max_score': self.max_score,
+                     'ratings': self.ratings, 'rating_breaks': self.rating_breaks}
+        arguments = ['sample', 'bisect_right=bisect_right']
+        terms = []
+        for i, (key, (breakpoints, scores)) in enumerate(self.tables.items()):
+            namespace[f'b{i}'], namespace[f's{i}'] = breakpoints, scores
+            arguments.append(f'b{i}=b{i}, s{i}=s{i}')
+            terms.append(f's{i}[bisect_right(b{i}, sample.{PARAMETER_FIELDS[key]})]')
+        total = ' + '.join(terms) or '0'
+
+        source = (f"def score({', '.join(arguments)}):\n"
+                  f"    return {total}\n"
+                  f"def rate({', '.join(arguments)}, max_score=max_score, "
+                  f"ratings=ratings, rating_breaks=rating_breaks):\n"
+                  f"    return ratings[bisect_right(rating_breaks, ({total}) / max_score * 100)]\n")
+        exec(source, namespace)
+        return namespace['score'], namespace['rate']
+
+    def score_columns(self, parameters: Dict[str, "np.ndarray"]) -> "np.ndarray":
+        """
+        Score a batch of samples given as columns.
+
+        Args:
+            parameters: Parameter key -> array of values (see
+                        aggregation.SampleColumns.parameters)
+
+        Returns:
+            Array of total scores
+        """
+        import numpy as np
+
+        total = None
+        for key, (breakpoints, scores) in self.tables.items():
+            points = np.searchsorted(breakpoints, parameters[key], side='right')
+            part = np.asarray(scores, dtype=np.float64)[points]
+            total = part if total is None else total + part
+        return total
+
+    def rate_scores(self, scores: "np.ndarray") -> "np.ndarray":
+        """Map an array of total scores to indexes into ratings (0 is the floor)"""
+        import numpy as np
+
+        return np.searchsorted(self.rating_breaks, scores / self.max_score * 100, side='right')
+
+    def rate_columns(self, parameters: Dict[str, "np.ndarray"]) -> "np.ndarray":
+        """
+        Rate a batch of samples given as columns.
+
+        Args:
+            parameters: Parameter key -> array of values
+
+        Returns:
+            Array of indexes into ratings (0 is the floor)
+        """
+        return self.rate_scores(self.score_columns(parameters))
+
+    def same_ratings(self, other: 'CompiledRules') -> bool:
+        """Whether both rule sets map every total score to the same rating"""
+        return (self.max_score == other.max_score and self.rating_breaks == other.rating_breaks
+                and self.ratings == other.ratings)
+
+    def rating_table(self) -> Tuple[List[float], List[str]]:
+        """
+        The rating thresholds as a table over total scores.
+
+        Returns:
+            Tuple of (total scores where the rating changes, rating labels
+            from worst to best), in the form changed_ranges() compares
+        """
+        return [percent * self.max_score / 100 for percent in self.rating_breaks], list(self.ratings)
+
+
+def changed_ranges(old_table: Tuple[List[float], List[float]] = None,
+                   new_table: Tuple[List[float], List[float]] = None) -> List[Tuple[float, float]]:
+    """
+    Value ranges in which two compiled score tables give different scores.
+
+    A missing table scores every value 0 (the parameter is not scored).
+    Rating tables (CompiledRules.rating_table()) compare the same way,
+    with labels in place of scores.
+
+    Args:
+        old_table: (breakpoints, scores) from CompiledRules.tables, or None
+        new_table: (breakpoints, scores) from CompiledRules.tables, or None
+
+    Returns:
+        Sorted, non-overlapping [low, high) ranges (low may be -inf, high inf)
+    """
+    old_breakpoints, old_scores = old_table or ([], [0.0])
+    new_breakpoints, new_scores = new_table or ([], [0.0])
+
+    # Both tables are constant between consecutive breakpoints of either
+    points = sorted(set(old_breakpoints) | set(new_breakpoints))
+    ranges: List[Tuple[float, float]] = []
+    for low, high in zip([-math.inf] + points, points + [math.inf]):
+        if (old_scores[bisect_right(old_breakpoints, low)] !=
+                new_scores[bisect_right(new_breakpoints, low)]):
+            if ranges and ranges[-1][1] == low:
+                ranges[-1] = (ranges[-1][0], high)
+            else:
+                ranges.append((low, high))
+    return ranges
+
+
+def rules_from_json(path: str) -> CompiledRules:
+    """
+    Compile rules from a JSON file.
+
+    The file holds {"rules": {...}, "thresholds": [[rating, percent], ...],
+    "floor": rating}; omitted keys fall back to config.py.
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    thresholds = data.get('thresholds')
+    return CompiledRules(data.get('rules'),
+                         [tuple(item) for item in thresholds] if thresholds else None,
+                         data.get('floor'))
+
+
+def _startup_rules() -> CompiledRules:
+    path = os.environ.get(RULES_ENV_VAR)
+    return rules_from_json(path) if path else CompiledRules()
+
+
+_active_rules = _startup_rules()
+
+
+def get_rules() -> CompiledRules:
+    """The rule set samples are currently rated with"""
+    return _active_rules
+
+
+def set_rules(rules: CompiledRules) -> CompiledRules:
+    """
+    Atomically replace the active rule set.
+
+    Compile the new rules first (CompiledRules(...) or rules_from_json());
+    the swap itself is one reference assignment.
+
+    Returns:
+        The previously active rules
+    """
+    global _active_rules
+    previous, _active_rules = _active_rules, rules
+    return previous
+
+
+def load_rules(path: str) -> CompiledRules:
+    """Compile rules from a JSON file and make them active; returns the previous rules"""
+    return set_rules(rules_from_json(path))
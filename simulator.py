@@ -0,0 +1,294 @@
+"""
+Sensor Simulator Module
+Load-tests the ingestion server (ingest.py) with simulated field sensors
+
+Each simulated sensor sits at one location and sends random readings at a
+fixed rate, over its own TCP connection or as UDP datagrams. Thousands of
+sensors run as coroutines on one event loop. A sensor that falls behind
+schedule (because the server is pushing back, or the loop is busy) sends
+the readings it owes in one write, so the offered load stays the same and
+the delay shows up as send lag.
+
+Against a running server:
+    python simulator.py --sensors 2000 --rate 5 --duration 30 --port 5056
+
+Self-contained, with a server on the same event loop:
+    python simulator.py --local --sensors 2000 --rate 5 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import dataclass
+
+from config import SAMPLE_LOCATIONS
+from water_sample import WaterSample
+
+
+# Most overdue readings a sensor sends in one catch-up write
+MAX_CATCH_UP = 100
+
+# Seconds a --local server may take to work through a backlog after the sensors finish
+LOCAL_STOP_GRACE = 120.0
+
+
+def encode_reading(sample: WaterSample) -> bytes:
+    """Frame a sample as one newline-terminated JSON message"""
+    return (json.dumps({
+        'id': sample.sample_id, 'location': sample.source_location, 'ph': sample.ph_level,
+        'turbidity': sample.turbidity, 'do': sample.dissolved_oxygen, 'coliform': sample.total_coliform,
+        'nitrate': sample.nitrate_level, 'time': sample.collected_at
+    }) + '\n').encode()
+
+
+def raise_open_file_limit(needed: int) -> int:
+    """
+    Raise this process's open file limit towards ``needed`` where allowed.
+
+    Returns:
+        The limit in effect afterwards (``needed`` where the resource module
+        is unavailable)
+    """
+    try:
+        import resource
+    except ImportError:
+        return needed
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass
+    return soft
+
+
+@dataclass
+class SimulationReport:
+    """
+    Outcome of a simulation run, as seen by the sensors.
+
+    Attributes:
+        sensors: Sensors started
+        connected: Sensors that opened their connection
+        sent: Readings sent
+        send_errors: Sensors whose connection failed or broke
+        elapsed: Seconds from the first connection to the last sensor finishing
+        mean_lag: Average time a reading was sent after it was due (seconds)
+        max_lag: Longest such delay (seconds)
+    """
+    sensors: int
+    connected: int
+    sent: int
+    send_errors: int
+    elapsed: float
+    mean_lag: float
+    max_lag: float
+
+    def __str__(self) -> str:
+        rate = self.sent / self.elapsed if self.elapsed > 0 else 0.0
+        return (f"{self.connected:,}/{self.sensors:,} sensors connected | sent {self.sent:,} readings "
+                f"({rate:,.0f}/sec) | errors {self.send_errors:,} | "
+                f"send lag mean {self.mean_lag * 1000:.1f}ms max {self.max_lag * 1000:.1f}ms")
+
+
+class _Totals:
+    """Counters shared by all sensor coroutines of one run"""
+
+    def __init__(self):
+        self.connected = 0
+        self.sent = 0
+        self.send_errors = 0
+        self.lag_total = 0.0
+        self.max_lag = 0.0
+
+
+async def _run_sensor(sensor_id: int, send, rate: float, start: float, end: float, totals: _Totals):
+    """
+    Send readings from one sensor until ``end`` (event loop time).
+
+    Args:
+        sensor_id: Sensor number; also picks its location
+        send: Coroutine function that sends framed bytes
+        rate: Readings per second
+        start: Loop time of the first reading
+        end: Loop time to stop
+        totals: Shared counters
+    """
+    loop = asyncio.get_running_loop()
+    location = SAMPLE_LOCATIONS[sensor_id % len(SAMPLE_LOCATIONS)]
+    interval = 1.0 / rate
+    sent = 0
+    while True:
+        due = start + sent * interval
+        if due >= end:
+            return
+        now = loop.time()
+        if due > now:
+            await asyncio.sleep(due - now)
+            now = loop.time()
+
+        # Everything owed up to now goes out in one write
+        owed = min(MAX_CATCH_UP, int((min(now, end) - start) / interval) + 1 - sent)
+        owed = max(owed, 1)
+        messages = []
+        for offset in range(owed):
+            sample = WaterSample.generate_random_sample(sensor_id * 1_000_000 + sent + offset)
+            sample.source_location = location
+            messages.append(encode_reading(sample))
+        await send(b''.join(messages))
+
+        lag = now - due
+        totals.lag_total += lag * owed
+        if lag > totals.max_lag:
+            totals.max_lag = lag
+        totals.sent += owed
+        sent += owed
+
+
+async def _tcp_sensor(sensor_id: int, host: str, port: int, rate: float, start: float, end: float,
+                      totals: _Totals):
+    """One sensor on its own TCP connection; drain() blocks while the server pushes back"""
+    try:
+        _, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        totals.send_errors += 1
+        return
+    totals.connected += 1
+
+    async def send(data: bytes):
+        writer.write(data)
+        await writer.drain()
+
+    try:
+        await _run_sensor(sensor_id, send, rate, start, end, totals)
+    except (ConnectionError, OSError):
+        totals.send_errors += 1
+    finally:
+        writer.close()
+
+
+async def simulate(host: str, port: int, sensors: int = 1000, rate: float = 1.0, duration: float = 10.0,
+                   protocol: str = 'tcp', ramp_up: float = 1.0) -> SimulationReport:
+    """
+    Run simulated sensors against an ingestion server.
+
+    Args:
+        host: Server host
+        port: Server TCP or UDP port
+        sensors: Number of sensors
+        rate: Readings per second per sensor
+        duration: Seconds each sensor sends for, after the ramp-up
+        protocol: "tcp" (one connection per sensor) or "udp" (one datagram per write)
+        ramp_up: Seconds over which sensor start times are spread
+
+    Returns:
+        SimulationReport
+    """
+    if protocol == 'tcp':
+        raise_open_file_limit(sensors + 256)
+
+    loop = asyncio.get_running_loop()
+    totals = _Totals()
+    begin = loop.time()
+    starts = [begin + ramp_up * i / sensors for i in range(sensors)]
+
+    transport = None
+    if protocol == 'tcp':
+        tasks = [_tcp_sensor(i, host, port, rate, start, start + duration, totals)
+                 for i, start in enumerate(starts)]
+    elif protocol == 'udp':
+        transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=(host, port))
+        totals.connected = sensors
+
+        async def send(data: bytes):
+            transport.sendto(data)
+
+        tasks = [_run_sensor(i, send, rate, start, start + duration, totals)
+                 for i, start in enumerate(starts)]
+    else:
+        raise ValueError(f"Unknown protocol '{protocol}' (choose from tcp, udp)")
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        if transport is not None:
+            transport.close()
+
+    elapsed = loop.time() - begin
+    return SimulationReport(sensors, totals.connected, totals.sent, totals.send_errors, elapsed,
+                            totals.lag_total / totals.sent if totals.sent else 0.0, totals.max_lag)
+
+
+async def simulate_local(sensors: int, rate: float, duration: float, protocol: str = 'tcp',
+                         backend: str = 'threading', batch_size: int = None, queue_size: int = None):
+    """
+    Start an IngestServer on this event loop and run the simulator against it.
+
+    Returns:
+        Tuple of (SimulationReport, the stopped IngestServer)
+    """
+    from ingest import DEFAULT_BATCH_SIZE, DEFAULT_QUEUE_SIZE, IngestServer
+    from test_engine import TestEngine
+
+    server = IngestServer(TestEngine(), backend, udp_port=0 if protocol == 'udp' else None,
+                          batch_size=batch_size or DEFAULT_BATCH_SIZE,
+                          queue_size=queue_size or DEFAULT_QUEUE_SIZE)
+    await server.start()
+    try:
+        address = server.udp_address if protocol == 'udp' else server.address
+        report = await simulate(address[0], address[1], sensors, rate, duration, protocol)
+    finally:
+        # The sensors have finished; wait for everything they sent to be read
+        await server.stop(grace=LOCAL_STOP_GRACE)
+    return report, server
+
+
+def main():
+    """Simulator entry point"""
+    parser = argparse.ArgumentParser(description="Simulate field sensors sending readings to ingest.py")
+    parser.add_argument("--host", default="127.0.0.1", help="Ingestion server host")
+    parser.add_argument("--port", type=int, default=5056, help="Ingestion server port")
+    parser.add_argument("--protocol", choices=["tcp", "udp"], default="tcp", help="Transport")
+    parser.add_argument("--sensors", type=int, default=1000, help="Number of simulated sensors")
+    parser.add_argument("--rate", type=float, default=1.0, help="Readings per second per sensor")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds each sensor sends for")
+    parser.add_argument("--local", action="store_true",
+                        help="Run an ingestion server in this process instead of connecting to one")
+    parser.add_argument("--backend", default="threading",
+                        help="Rating backend of the --local server")
+    parser.add_argument("--batch-size", type=int, default=None, help="Micro-batch size of the --local server")
+    parser.add_argument("--queue-size", type=int, default=None, help="Queue size of the --local server")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("WATER QUALITY LAB - SENSOR SIMULATION")
+    print("="*60)
+    print(f"{args.sensors:,} {args.protocol.upper()} sensors x {args.rate:g} readings/sec "
+          f"for {args.duration:g}s (offered {args.sensors * args.rate:,.0f} readings/sec)")
+
+    start_time = time.time()
+    if args.local:
+        report, server = asyncio.run(simulate_local(args.sensors, args.rate, args.duration, args.protocol,
+                                                    args.backend, args.batch_size, args.queue_size))
+    else:
+        report = asyncio.run(simulate(args.host, args.port, args.sensors, args.rate, args.duration,
+                                      args.protocol))
+        server = None
+
+    print(f"Sensors: {report}")
+    if server is not None:
+        elapsed = time.time() - start_time
+        print(f"Server:  {server.stats}")
+        print(f"Server throughput: {server.stats.rated / elapsed:,.0f} readings/sec over {elapsed:.1f}s")
+    if report.send_errors:
+        print(f"  ✗ {report.send_errors:,} sensors failed to connect or lost their connection", file=sys.stderr)
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,314 @@ Handles parallel and sequential water quality testing
 Demonstrates performance benefits of parallel programming
 """
 
+import itertools
+import json
+import math
+import os
+import sys
+import sysconfig
+import threading
 import time
 import multiprocessing as mp
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
-from typing import List, Tuple, Dict
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Dict
 import random
 from water_sample import WaterSample
 
 
+# Modules a forkserver preloads before forking workers. Only the modules a
+# worker needs to run a test are listed, so workers never import GUI code.
+WORKER_PRELOAD_MODULES = ['water_sample', 'test_engine']
+
+
+# Upper bound on threads inside one hybrid worker process
+MAX_THREADS_PER_WORKER = 64
+
+
+# Adaptive worker tuning: a probe must beat the best throughput so far by
+# this fraction to count as an improvement, and a first probe below this
+# efficiency makes the tuner shrink the pool instead of growing it.
+ADAPTIVE_MIN_GAIN = 0.10
+ADAPTIVE_MIN_EFFICIENCY = 50.0
+ADAPTIVE_SAMPLES_PER_WORKER = 2
+
+
+def _read_cgroup_cpu_quota() -> float:
+    """
+    Read the container CPU quota from cgroup v2 or v1.
+    
+    Returns:
+        Number of CPUs allowed by the quota, or 0 when unlimited/unknown
+    """
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return int(quota) / int(period)
+        return 0
+    except (OSError, ValueError):
+        pass
+    
+    for cgroup_dir in ('/sys/fs/cgroup/cpu', '/sys/fs/cgroup/cpu,cpuacct'):
+        try:
+            with open(os.path.join(cgroup_dir, 'cpu.cfs_quota_us')) as f:
+                quota = int(f.read())
+            with open(os.path.join(cgroup_dir, 'cpu.cfs_period_us')) as f:
+                period = int(f.read())
+        except (OSError, ValueError):
+            continue
+        if quota > 0 and period > 0:
+            return quota / period
+        return 0
+    
+    return 0
+
+
+# Host profile written by verify_setup.py; TestEngine takes its default
+# backend, worker count and stream chunk size from it
+PROFILE_ENV_VAR = "WQL_HOST_PROFILE"
+DEFAULT_PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "host_profile.json")
+
+# Used when there is no (current) host profile
+DEFAULT_STREAM_BACKEND = 'multiprocessing'
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def get_available_cpus() -> int:
+    """
+    Count the CPUs this process may actually use.
+    
+    Takes the CPU affinity mask and any container CPU quota into account,
+    both of which mp.cpu_count() ignores.
+    
+    Returns:
+        Number of usable CPUs (at least 1)
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = mp.cpu_count()
+    
+    quota = _read_cgroup_cpu_quota()
+    if quota > 0:
+        cpus = min(cpus, math.ceil(quota))
+    
+    return max(1, cpus)
+
+
+def _worker_ready() -> int:
+    """Trivial task used to measure how long a cold pool takes to respond"""
+    return os.getpid()
+
+
+def _test_chunk_threaded(chunk: List[WaterSample], num_threads: int, timed: bool = False) -> List:
+    """
+    Test a chunk of samples on a thread pool inside a worker process.
+    
+    Returns:
+        Tested samples, or (tested_sample, span) pairs when timed
+    """
+    task = _timed_test if timed else TestEngine.simulate_water_test
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        return list(executor.map(task, chunk))
+
+
+def _rate_chunk(chunk: List[WaterSample],
+                simulate_delay: bool) -> Tuple[List[str], Optional[List[float]]]:
+    """
+    Test a chunk of samples and return their quality ratings.
+    
+    Only the rating values (and test durations, when simulated) travel
+    back to the caller, which already holds the samples, so streaming
+    large batches through worker processes costs one small pickle per
+    chunk. See _apply_test_results().
+    
+    Returns:
+        Tuple of (rating values, test durations or None without simulate_delay)
+    """
+    ratings = []
+    for sample in chunk:
+        if simulate_delay:
+            TestEngine.simulate_water_test(sample)
+        else:
+            sample.tested = True
+        ratings.append(sample.get_quality_rating().value)
+    durations = [sample.test_duration for sample in chunk] if simulate_delay else None
+    return ratings, durations
+
+
+def _apply_test_results(chunk: List[WaterSample], result: Tuple[List[str], Optional[List[float]]],
+                        copied: bool) -> List[str]:
+    """
+    Take a _rate_chunk() result for the caller's own samples.
+    
+    Workers of a copying backend tested pickled copies, so the caller's
+    samples are marked tested here, with the durations measured there.
+    
+    Returns:
+        The rating values
+    """
+    ratings, durations = result
+    if copied:
+        if durations is None:
+            for sample in chunk:
+                sample.tested = True
+        else:
+            for sample, duration in zip(chunk, durations):
+                sample.tested = True
+                sample.test_duration = duration
+    return ratings
+
+
+# Backends accepted by TestEngine.test_stream. "free_threading" and
+# "subinterpreters" need a free-threaded build (3.13t+) or
+# InterpreterPoolExecutor (3.14+); elsewhere they run as "multiprocessing".
+STREAM_BACKENDS = ('sequential', 'threading', 'multiprocessing', 'free_threading', 'subinterpreters')
+
+# Backend that the optional backends fall back to
+FALLBACK_BACKEND = 'multiprocessing'
+
+# Backends whose workers test pickled copies of the samples
+COPYING_BACKENDS = ('multiprocessing', 'subinterpreters')
+
+# Result of the subinterpreter probe, once it has run
+_subinterpreters_usable: Optional[bool] = None
+
+
+def gil_disabled() -> bool:
+    """
+    Check whether threads run Python code in parallel.
+    
+    True only on a free-threaded build whose GIL is actually off; the GIL
+    can be switched back on at startup (PYTHON_GIL=1) or by an extension
+    module that does not support free threading.
+    """
+    if not sysconfig.get_config_var('Py_GIL_DISABLED'):
+        return False
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def _make_interpreter_pool(max_workers: int) -> Executor:
+    """
+    Create a pool of subinterpreters that can import the engine modules.
+    
+    Worker interpreters do not get the script directory on sys.path, so
+    each one adds this module's directory before it unpickles any task.
+    """
+    import site
+    from concurrent.futures import InterpreterPoolExecutor
+    
+    return InterpreterPoolExecutor(max_workers=max_workers, initializer=site.addsitedir,
+                                   initargs=(os.path.dirname(os.path.abspath(__file__)),))
+
+
+def subinterpreters_available() -> bool:
+    """
+    Check whether a subinterpreter pool can run engine tasks.
+    
+    The first call starts a one-interpreter pool and runs a trivial task on
+    it, so any missing support shows up here rather than mid-run. The
+    result is cached for the rest of the process.
+    """
+    global _subinterpreters_usable
+    if _subinterpreters_usable is None:
+        try:
+            with _make_interpreter_pool(1) as executor:
+                executor.submit(_worker_ready).result()
+            _subinterpreters_usable = True
+        except Exception:
+            _subinterpreters_usable = False
+    return _subinterpreters_usable
+
+
+def resolve_backend(backend: str) -> str:
+    """
+    Map a requested backend to the one that will actually run.
+    
+    Args:
+        backend: One of STREAM_BACKENDS
+        
+    Returns:
+        The backend itself, or FALLBACK_BACKEND for an optional backend
+        this interpreter cannot provide
+        
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if backend not in STREAM_BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}' (choose from {STREAM_BACKENDS})")
+    if backend == 'free_threading' and not gil_disabled():
+        return FALLBACK_BACKEND
+    if backend == 'subinterpreters' and not subinterpreters_available():
+        return FALLBACK_BACKEND
+    return backend
+
+
+def get_profile_path() -> str:
+    """Path of the host profile ($WQL_HOST_PROFILE, else host_profile.json next to this module)"""
+    return os.environ.get(PROFILE_ENV_VAR) or DEFAULT_PROFILE_PATH
+
+
+def load_host_profile(path: str = None) -> Dict:
+    """
+    Read the recommended settings from the host profile.
+    
+    A profile is ignored when it is missing, unreadable, malformed, or was
+    measured with a different number of usable CPUs (another machine, or a
+    changed container quota), so a stale profile never pins the wrong
+    worker count.
+    
+    Args:
+        path: Profile file (defaults to get_profile_path())
+        
+    Returns:
+        The profile's "recommended" dictionary (backend, num_workers,
+        chunk_size), or {} when there is no current profile
+    """
+    try:
+        with open(path or get_profile_path(), encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    
+    cpu = profile.get('cpu') if isinstance(profile, dict) else None
+    if not isinstance(cpu, dict) or cpu.get('usable') != get_available_cpus():
+        return {}
+    recommended = profile.get('recommended')
+    if not isinstance(recommended, dict) or recommended.get('backend') not in STREAM_BACKENDS:
+        return {}
+    for key in ('num_workers', 'chunk_size'):
+        value = recommended.get(key)
+        if value is not None and (type(value) is not int or value < 1):
+            return {}
+    return recommended
+
+
+class TaskSpan(NamedTuple):
+    """Which worker tested a sample, and when (wall-clock seconds)"""
+    worker: str
+    start: float
+    end: float
+
+
+def _timed_test(sample: WaterSample) -> Tuple[WaterSample, TaskSpan]:
+    """Test one sample and record the worker and time span it ran in"""
+    start = time.time()
+    tested_sample = TestEngine.simulate_water_test(sample)
+    worker = f"{os.getpid()}:{threading.get_ident()}"
+    return tested_sample, TaskSpan(worker, start, time.time())
+
+
+# Called with (index, tested_sample) as each sample finishes testing
+ResultCallback = Callable[[int, WaterSample], None]
+
+# Called with (index, span) as each sample finishes testing
+SpanCallback = Callable[[int, TaskSpan], None]
+
+
 class TestEngine:
     """
     Water quality test engine supporting both sequential and parallel execution.
@@ -20,15 +320,144 @@ class TestEngine:
     by comparing execution times between sequential and parallel test runs.
     """
     
-    def __init__(self, num_workers: int = None):
+    def __init__(self, num_workers: int = None, start_method: str = None,
+                 threads_per_worker: int = None, recorder=None, use_profile: bool = True):
         """
         Initialize the test engine.
         
         Args:
-            num_workers: Number of parallel workers (defaults to CPU count)
+            num_workers: Number of parallel workers (defaults to the usable
+                         CPU count); also the stream worker count when given
+            start_method: Process start method ("fork", "forkserver" or "spawn",
+                          defaults to the platform default)
+            threads_per_worker: Threads inside each hybrid worker process
+                                (defaults to sizing from the batch)
+            recorder: Optional persistence.BackgroundWriter that receives every
+                      tested sample and results_history entry
+            use_profile: Take the stream defaults (backend, workers, chunk
+                         size) from the host profile written by
+                         verify_setup.py, if there is a current one
         """
-        self.num_workers = num_workers or mp.cpu_count()
+        if start_method is not None and start_method not in mp.get_all_start_methods():
+            raise ValueError(f"Start method '{start_method}' is not available on this platform "
+                             f"(choose from {mp.get_all_start_methods()})")
+        
+        profile = load_host_profile() if use_profile else {}
+        self.num_workers = num_workers or get_available_cpus()
+        # The profile measured CPU-bound rating, so it only sizes the stream pools
+        self.stream_workers: int = num_workers or profile.get('num_workers') or self.num_workers
+        self.stream_backend: str = profile.get('backend', DEFAULT_STREAM_BACKEND)
+        self.stream_chunk_size: int = profile.get('chunk_size', DEFAULT_CHUNK_SIZE)
+        self.start_method = start_method
+        self.threads_per_worker = threads_per_worker
+        self.tuned_workers: int = None
         self.results_history: List[Dict] = []
+        self.recorder = recorder
+    
+    def _record_chunk(self, chunk: List[WaterSample], ratings: List[str]):
+        """Queue one rated chunk of a stream for the recorder"""
+        if self.recorder is not None:
+            self.recorder.submit_samples(chunk, ratings)
+    
+    def _record_run(self, entry: Dict, tested_samples: List[WaterSample] = None):
+        """
+        Add a run to results_history and queue it for the recorder.
+        
+        The recorder writes on its own thread, so this only waits for disk
+        when the recorder's queue is full.
+        """
+        self.results_history.append(entry)
+        if self.recorder is not None:
+            if tested_samples:
+                self.recorder.submit_samples(tested_samples)
+            self.recorder.record_run(entry)
+    
+    def get_mp_context(self):
+        """
+        Get the multiprocessing context for the configured start method.
+        
+        With "forkserver", the server preloads only the test modules so every
+        forked worker starts with them already imported.
+        
+        Returns:
+            multiprocessing context used to create process pools
+        """
+        context = mp.get_context(self.start_method)
+        if context.get_start_method() == 'forkserver':
+            context.set_forkserver_preload(WORKER_PRELOAD_MODULES)
+        return context
+    
+    def measure_cold_start(self) -> float:
+        """
+        Measure time-to-first-result for a freshly created process pool.
+        
+        Covers starting the pool, importing the worker modules and one task
+        round trip, which is the fixed cost paid before any test completes.
+        
+        Returns:
+            Seconds from pool creation until the first result arrives
+        """
+        start_time = time.time()
+        
+        with ProcessPoolExecutor(max_workers=self.num_workers,
+                                 mp_context=self.get_mp_context()) as executor:
+            executor.submit(_worker_ready).result()
+            first_result_time = time.time() - start_time
+        
+        return first_result_time
+    
+    def make_executor(self, backend: str) -> Optional[Executor]:
+        """
+        Create a pool of stream_workers workers for a backend.
+        
+        Args:
+            backend: A backend as returned by resolve_backend()
+            
+        Returns:
+            The executor, or None for "sequential"
+        """
+        if backend == 'sequential':
+            return None
+        if backend in ('threading', 'free_threading'):
+            return ThreadPoolExecutor(max_workers=self.stream_workers)
+        if backend == 'subinterpreters':
+            return _make_interpreter_pool(self.stream_workers)
+        return ProcessPoolExecutor(max_workers=self.stream_workers, mp_context=self.get_mp_context())
+    
+    def _map_samples(self, executor: Executor, samples: List[WaterSample],
+                     on_result: Optional[ResultCallback],
+                     on_span: Optional[SpanCallback] = None) -> List[WaterSample]:
+        """
+        Test samples on an executor, reporting each one as it completes.
+        
+        Args:
+            executor: Executor to run the tests on
+            samples: List of WaterSample objects to test
+            on_result: Optional callback receiving (index, tested_sample)
+            on_span: Optional callback receiving (index, span) with the worker
+                     and time span of each test
+            
+        Returns:
+            Tested samples in their original order
+        """
+        if on_result is None and on_span is None:
+            return list(executor.map(self.simulate_water_test, samples))
+        
+        task = self.simulate_water_test if on_span is None else _timed_test
+        futures = {executor.submit(task, sample): index
+                   for index, sample in enumerate(samples)}
+        tested_samples = [None] * len(samples)
+        for future in as_completed(futures):
+            index = futures[future]
+            result = future.result()
+            if on_span is not None:
+                result, span = result
+                on_span(index, span)
+            tested_samples[index] = result
+            if on_result is not None:
+                on_result(index, result)
+        
+        return tested_samples
     
     @staticmethod
     def simulate_water_test(sample: WaterSample) -> WaterSample:
@@ -54,12 +483,16 @@ class TestEngine:
         
         return sample
     
-    def test_sequential(self, samples: List[WaterSample]) -> Tuple[List[WaterSample], float]:
+    def test_sequential(self, samples: List[WaterSample],
+                        on_result: Optional[ResultCallback] = None,
+                        on_span: Optional[SpanCallback] = None) -> Tuple[List[WaterSample], float]:
         """
         Test water samples sequentially (one after another).
         
         Args:
             samples: List of WaterSample objects to test
+            on_result: Optional callback receiving (index, tested_sample)
+            on_span: Optional callback receiving (index, span)
             
         Returns:
             Tuple of (tested_samples, total_time)
@@ -67,23 +500,31 @@ class TestEngine:
         start_time = time.time()
         tested_samples = []
         
-        for sample in samples:
-            tested_sample = self.simulate_water_test(sample)
+        for index, sample in enumerate(samples):
+            if on_span is not None:
+                tested_sample, span = _timed_test(sample)
+                on_span(index, span)
+            else:
+                tested_sample = self.simulate_water_test(sample)
             tested_samples.append(tested_sample)
+            if on_result is not None:
+                on_result(index, tested_sample)
         
         total_time = time.time() - start_time
         
         # Record results
-        self.results_history.append({
+        self._record_run({
             'mode': 'sequential',
             'num_samples': len(samples),
             'total_time': total_time,
             'avg_time_per_sample': total_time / len(samples) if samples else 0
-        })
+        }, tested_samples)
         
         return tested_samples, total_time
     
-    def test_parallel_multiprocessing(self, samples: List[WaterSample]) -> Tuple[List[WaterSample], float]:
+    def test_parallel_multiprocessing(self, samples: List[WaterSample],
+                                      on_result: Optional[ResultCallback] = None,
+                                      on_span: Optional[SpanCallback] = None) -> Tuple[List[WaterSample], float]:
         """
         Test water samples in parallel using multiprocessing.
         
@@ -92,29 +533,35 @@ class TestEngine:
         
         Args:
             samples: List of WaterSample objects to test
+            on_result: Optional callback receiving (index, tested_sample)
+            on_span: Optional callback receiving (index, span)
             
         Returns:
             Tuple of (tested_samples, total_time)
         """
         start_time = time.time()
         
-        with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
-            tested_samples = list(executor.map(self.simulate_water_test, samples))
+        with ProcessPoolExecutor(max_workers=self.num_workers,
+                                 mp_context=self.get_mp_context()) as executor:
+            tested_samples = self._map_samples(executor, samples, on_result, on_span)
         
         total_time = time.time() - start_time
         
         # Record results
-        self.results_history.append({
+        self._record_run({
             'mode': 'parallel_multiprocessing',
             'num_samples': len(samples),
             'num_workers': self.num_workers,
+            'start_method': self.get_mp_context().get_start_method(),
             'total_time': total_time,
             'avg_time_per_sample': total_time / len(samples) if samples else 0
-        })
+        }, tested_samples)
         
         return tested_samples, total_time
     
-    def test_parallel_threading(self, samples: List[WaterSample]) -> Tuple[List[WaterSample], float]:
+    def test_parallel_threading(self, samples: List[WaterSample],
+                                on_result: Optional[ResultCallback] = None,
+                                on_span: Optional[SpanCallback] = None) -> Tuple[List[WaterSample], float]:
         """
         Test water samples in parallel using threading.
         
@@ -124,6 +571,8 @@ class TestEngine:
         
         Args:
             samples: List of WaterSample objects to test
+            on_result: Optional callback receiving (index, tested_sample)
+            on_span: Optional callback receiving (index, span)
             
         Returns:
             Tuple of (tested_samples, total_time)
@@ -131,21 +580,388 @@ class TestEngine:
         start_time = time.time()
         
         with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            tested_samples = list(executor.map(self.simulate_water_test, samples))
+            tested_samples = self._map_samples(executor, samples, on_result, on_span)
         
         total_time = time.time() - start_time
         
         # Record results
-        self.results_history.append({
+        self._record_run({
             'mode': 'parallel_threading',
             'num_samples': len(samples),
             'num_workers': self.num_workers,
             'total_time': total_time,
             'avg_time_per_sample': total_time / len(samples) if samples else 0
-        })
+        }, tested_samples)
         
         return tested_samples, total_time
     
+    def test_parallel_free_threading(self, samples: List[WaterSample],
+                                     on_result: Optional[ResultCallback] = None,
+                                     on_span: Optional[SpanCallback] = None) -> Tuple[List[WaterSample], float]:
+        """
+        Test water samples in parallel on threads of a free-threaded build.
+        
+        Without the GIL, threads run CPU-bound work on all cores while still
+        sharing the samples, so nothing is started up or pickled per worker.
+        When the GIL is enabled this runs test_parallel_multiprocessing
+        instead.
+        
+        Args:
+            samples: List of WaterSample objects to test
+            on_result: Optional callback receiving (index, tested_sample)
+            on_span: Optional callback receiving (index, span)
+            
+        Returns:
+            Tuple of (tested_samples, total_time)
+        """
+        if resolve_backend('free_threading') != 'free_threading':
+            return self.test_parallel_multiprocessing(samples, on_result, on_span)
+        return self._test_parallel_pool('free_threading', samples, on_result, on_span)
+    
+    def test_parallel_subinterpreters(self, samples: List[WaterSample],
+                                      on_result: Optional[ResultCallback] = None,
+                                      on_span: Optional[SpanCallback] = None) -> Tuple[List[WaterSample], float]:
+        """
+        Test water samples in parallel on subinterpreters.
+        
+        Each worker is an interpreter with its own GIL inside this process,
+        which starts much faster than a worker process. Samples are still
+        pickled to and from the workers. When InterpreterPoolExecutor is not
+        available this runs test_parallel_multiprocessing instead.
+        
+        Args:
+            samples: List of WaterSample objects to test
+            on_result: Optional callback receiving (index, tested_sample)
+            on_span: Optional callback receiving (index, span)
+            
+        Returns:
+            Tuple of (tested_samples, total_time)
+        """
+        if resolve_backend('subinterpreters') != 'subinterpreters':
+            return self.test_parallel_multiprocessing(samples, on_result, on_span)
+        return self._test_parallel_pool('subinterpreters', samples, on_result, on_span)
+    
+    def _test_parallel_pool(self, backend: str, samples: List[WaterSample],
+                            on_result: Optional[ResultCallback],
+                            on_span: Optional[SpanCallback]) -> Tuple[List[WaterSample], float]:
+        """Test samples on the pool of an available backend and record the run"""
+        start_time = time.time()
+        
+        with self.make_executor(backend) as executor:
+            tested_samples = self._map_samples(executor, samples, on_result, on_span)
+        
+        total_time = time.time() - start_time
+        
+        # Record results
+        self._record_run({
+            'mode': f'parallel_{backend}',
+            'num_samples': len(samples),
+            'num_workers': self.num_workers,
+            'total_time': total_time,
+            'avg_time_per_sample': total_time / len(samples) if samples else 0
+        }, tested_samples)
+        
+        return tested_samples, total_time
+    
+    def get_hybrid_sizing(self, num_samples: int) -> Tuple[int, int]:
+        """
+        Choose process and thread counts for the hybrid executor.
+        
+        One process per worker (core) is used, but never more processes than
+        samples. Unless threads_per_worker is set, each process gets enough
+        threads to start all of its samples at once, so instrument waits
+        overlap instead of queueing.
+        
+        Args:
+            num_samples: Number of samples in the batch
+            
+        Returns:
+            Tuple of (num_processes, threads_per_process)
+        """
+        num_processes = max(1, min(self.num_workers, num_samples))
+        
+        if self.threads_per_worker:
+            num_threads = self.threads_per_worker
+        else:
+            samples_per_process = -(-num_samples // num_processes)
+            num_threads = max(1, min(samples_per_process, MAX_THREADS_PER_WORKER))
+        
+        return num_processes, num_threads
+    
+    def test_parallel_hybrid(self, samples: List[WaterSample],
+                             on_result: Optional[ResultCallback] = None,
+                             on_span: Optional[SpanCallback] = None) -> Tuple[List[WaterSample], float]:
+        """
+        Test water samples using processes that each run a thread pool.
+        
+        Processes spread CPU-bound work (such as rating) across cores, while
+        the threads inside each process oversubscribe it with waits on
+        instruments. Each process receives one contiguous chunk of samples,
+        so IPC cost is paid once per process rather than once per sample.
+        For the same reason, the callbacks fire a chunk at a time, as each
+        process finishes.
+        
+        Args:
+            samples: List of WaterSample objects to test
+            on_result: Optional callback receiving (index, tested_sample)
+            on_span: Optional callback receiving (index, span)
+            
+        Returns:
+            Tuple of (tested_samples, total_time)
+        """
+        start_time = time.time()
+        num_processes, num_threads = self.get_hybrid_sizing(len(samples))
+        
+        chunk_size = -(-len(samples) // num_processes) if samples else 1
+        chunks = [samples[i:i + chunk_size] for i in range(0, len(samples), chunk_size)]
+        
+        tested_samples = [None] * len(samples)
+        with ProcessPoolExecutor(max_workers=num_processes,
+                                 mp_context=self.get_mp_context()) as executor:
+            futures = {executor.submit(_test_chunk_threaded, chunk, num_threads, on_span is not None): offset
+                       for offset, chunk in zip(range(0, len(samples), chunk_size), chunks)}
+            for future in as_completed(futures):
+                for index, result in enumerate(future.result(), futures[future]):
+                    if on_span is not None:
+                        result, span = result
+                        on_span(index, span)
+                    tested_samples[index] = result
+                    if on_result is not None:
+                        on_result(index, result)
+        
+        total_time = time.time() - start_time
+        
+        # Record results
+        self._record_run({
+            'mode': 'parallel_hybrid',
+            'num_samples': len(samples),
+            'num_workers': num_processes,
+            'threads_per_worker': num_threads,
+            'total_time': total_time,
+            'avg_time_per_sample': total_time / len(samples) if samples else 0
+        }, tested_samples)
+        
+        return tested_samples, total_time
+    
+    def test_parallel_adaptive(self, samples: List[WaterSample], backend: str = 'threading',
+                               max_workers: int = None) -> Tuple[List[WaterSample], float]:
+        """
+        Test water samples while tuning the worker count to the workload.
+        
+        The batch is consumed in small probe batches (a few samples per
+        worker). After each probe the throughput and parallel efficiency are
+        measured (from the moment the probe's workers are ready) and the pool
+        is doubled for as long as throughput keeps improving. If the first
+        probe is inefficient, or doubling does not help, the pool is halved
+        instead while throughput holds up. The remaining samples then run on
+        the best worker count found, which is kept in tuned_workers for later
+        runs.
+        
+        Args:
+            samples: List of WaterSample objects to test
+            backend: "threading" or "multiprocessing"
+            max_workers: Upper bound for the pool size (defaults to 32 threads
+                         or 4 processes per usable CPU)
+            
+        Returns:
+            Tuple of (tested_samples, total_time)
+        """
+        if backend == 'threading':
+            def make_executor(workers):
+                return ThreadPoolExecutor(max_workers=workers)
+            default_max = 32 * get_available_cpus()
+        elif backend == 'multiprocessing':
+            def make_executor(workers):
+                return ProcessPoolExecutor(max_workers=workers, mp_context=self.get_mp_context())
+            default_max = 4 * get_available_cpus()
+        else:
+            raise ValueError(f"Unknown backend '{backend}' (choose 'threading' or 'multiprocessing')")
+        
+        max_workers = max_workers or default_max
+        start_time = time.time()
+        
+        initial_workers = max(1, min(self.tuned_workers or self.num_workers, max_workers))
+        workers = initial_workers
+        best_workers, best_throughput = initial_workers, 0.0
+        direction = 1
+        probes = []
+        tested_samples = []
+        position = 0
+        
+        while position < len(samples):
+            batch = samples[position:position + workers * ADAPTIVE_SAMPLES_PER_WORKER]
+            position += len(batch)
+            
+            with make_executor(workers) as executor:
+                # Start the clock once every worker is up, so process start-up
+                # and shutdown do not count against larger pools
+                wait([executor.submit(_worker_ready) for _ in range(workers)])
+                batch_start = time.time()
+                tested_batch = list(executor.map(self.simulate_water_test, batch))
+                elapsed = time.time() - batch_start
+            tested_samples.extend(tested_batch)
+            
+            throughput = len(batch) / elapsed if elapsed > 0 else 0.0
+            busy_time = sum(sample.test_duration for sample in tested_batch)
+            speedup = self.calculate_speedup(busy_time, elapsed)
+            efficiency = self.calculate_efficiency(speedup, workers)
+            probes.append({
+                'num_workers': workers,
+                'num_samples': len(batch),
+                'throughput': throughput,
+                'efficiency': efficiency
+            })
+            
+            if direction == 1:
+                improved = throughput > best_throughput * (1 + ADAPTIVE_MIN_GAIN)
+            else:
+                # Fewer workers for about the same throughput is a win
+                improved = throughput >= best_throughput * (1 - ADAPTIVE_MIN_GAIN)
+            
+            if improved:
+                best_workers, best_throughput = workers, max(throughput, best_throughput)
+                if len(probes) == 1 and efficiency < ADAPTIVE_MIN_EFFICIENCY:
+                    direction = -1
+            elif direction == 1 and best_workers == initial_workers and len(probes) == 2:
+                # Growing did not help from the start: try a smaller pool
+                direction = -1
+                workers = initial_workers
+            else:
+                break
+            
+            next_workers = workers * 2 if direction == 1 else workers // 2
+            explored = {probe['num_workers'] for probe in probes}
+            if not 1 <= next_workers <= max_workers or next_workers in explored:
+                break
+            workers = next_workers
+        
+        self.tuned_workers = best_workers
+        
+        remaining = samples[position:]
+        if remaining:
+            with make_executor(best_workers) as executor:
+                tested_samples.extend(executor.map(self.simulate_water_test, remaining))
+        
+        total_time = time.time() - start_time
+        
+        # Record results
+        self._record_run({
+            'mode': f'parallel_adaptive_{backend}',
+            'num_samples': len(samples),
+            'num_workers': best_workers,
+            'probes': probes,
+            'total_time': total_time,
+            'avg_time_per_sample': total_time / len(samples) if samples else 0
+        }, tested_samples)
+        
+        return tested_samples, total_time
+    
+    def test_distributed(self, samples: List[WaterSample], coordinator,
+                         chunk_size: int = 4) -> Tuple[List[WaterSample], float]:
+        """
+        Test water samples across several machines.
+        
+        Chunks of samples are sent to worker daemons connected to the given
+        coordinator (see distributed.py). Work from workers that die mid-chunk
+        is reassigned to the remaining workers.
+        
+        Args:
+            samples: List of WaterSample objects to test
+            coordinator: distributed.Coordinator with connected workers
+            chunk_size: Number of samples sent to a worker at a time
+        
+        Returns:
+            Tuple of (tested_samples, total_time)
+        """
+        start_time = time.time()
+        
+        tested_samples = coordinator.run(samples, chunk_size=chunk_size)
+        
+        total_time = time.time() - start_time
+        
+        # Record results
+        self._record_run({
+            'mode': 'parallel_distributed',
+            'num_samples': len(samples),
+            'num_workers': coordinator.worker_count,
+            'total_time': total_time,
+            'avg_time_per_sample': total_time / len(samples) if samples else 0
+        }, tested_samples)
+        
+        return tested_samples, total_time
+    
+    def test_stream(self, samples: Iterable[WaterSample], backend: str = None,
+                    chunk_size: int = None,
+                    simulate_delay: bool = False) -> Iterator[Tuple[List[WaterSample], List[str]]]:
+        """
+        Test a stream of samples of any length in constant memory.
+        
+        Samples are pulled from the iterable one chunk at a time and at most
+        two chunks per worker are in flight, so only a bounded window of the
+        stream is ever held in memory. Chunks are yielded in input order as
+        soon as they (and every chunk before them) are done.
+        
+        Without simulate_delay, samples are rated straight away instead of
+        waiting 1-3 seconds each on the simulated instrument, which is what
+        makes files with millions of rows practical.
+        
+        Args:
+            samples: Iterable of WaterSample objects (e.g. a file reader)
+            backend: One of STREAM_BACKENDS (defaults to stream_backend);
+                     an unavailable optional backend runs as FALLBACK_BACKEND
+            chunk_size: Number of samples sent to a worker at a time
+                        (defaults to stream_chunk_size)
+            simulate_delay: Run the simulated instrument test for each sample
+            
+        Yields:
+            Tuple of (chunk of samples, their quality rating values)
+        """
+        backend = resolve_backend(backend or self.stream_backend)
+        chunk_size = chunk_size or self.stream_chunk_size
+        
+        start_time = time.time()
+        num_samples = 0
+        samples = iter(samples)
+        chunks = iter(lambda: list(itertools.islice(samples, chunk_size)), [])
+        
+        if backend == 'sequential':
+            for chunk in chunks:
+                num_samples += len(chunk)
+                ratings, _ = _rate_chunk(chunk, simulate_delay)
+                self._record_chunk(chunk, ratings)
+                yield chunk, ratings
+        else:
+            copied = backend in COPYING_BACKENDS
+            with self.make_executor(backend) as executor:
+                in_flight = deque()
+                for chunk in chunks:
+                    in_flight.append((chunk, executor.submit(_rate_chunk, chunk, simulate_delay)))
+                    if len(in_flight) >= 2 * self.stream_workers:
+                        done_chunk, future = in_flight.popleft()
+                        num_samples += len(done_chunk)
+                        ratings = _apply_test_results(done_chunk, future.result(), copied)
+                        self._record_chunk(done_chunk, ratings)
+                        yield done_chunk, ratings
+                
+                while in_flight:
+                    done_chunk, future = in_flight.popleft()
+                    num_samples += len(done_chunk)
+                    ratings = _apply_test_results(done_chunk, future.result(), copied)
+                    self._record_chunk(done_chunk, ratings)
+                    yield done_chunk, ratings
+        
+        total_time = time.time() - start_time
+        
+        # Record results
+        self._record_run({
+            'mode': f'stream_{backend}',
+            'num_samples': num_samples,
+            'num_workers': 1 if backend == 'sequential' else self.stream_workers,
+            'chunk_size': chunk_size,
+            'total_time': total_time,
+            'avg_time_per_sample': total_time / num_samples if num_samples else 0
+        })
+    
     def calculate_speedup(self, sequential_time: float, parallel_time: float) -> float:
         """
         Calculate speedup ratio (sequential time / parallel time).
@@ -161,17 +977,18 @@ class TestEngine:
             return 0
         return sequential_time / parallel_time
     
-    def calculate_efficiency(self, speedup: float) -> float:
+    def calculate_efficiency(self, speedup: float, num_workers: int = None) -> float:
         """
         Calculate parallel efficiency (speedup / num_workers).
         
         Args:
             speedup: Speedup ratio
+            num_workers: Workers that produced the speedup (defaults to num_workers)
             
         Returns:
             Efficiency percentage (0-100)
         """
-        return (speedup / self.num_workers) * 100
+        return (speedup / (num_workers or self.num_workers)) * 100
     
     def get_performance_summary(self) -> Dict:
         """
@@ -204,14 +1021,14 @@ class TestEngine:
             parallel['total_time']
         )
         
-        efficiency = self.calculate_efficiency(speedup)
+        efficiency = self.calculate_efficiency(speedup, parallel.get('num_workers'))
         
         return {
             'sequential_time': sequential['total_time'],
             'parallel_time': parallel['total_time'],
             'speedup': speedup,
             'efficiency': efficiency,
-            'num_workers': self.num_workers,
+            'num_workers': parallel.get('num_workers', self.num_workers),
             'num_samples': parallel['num_samples'],
             'time_saved': sequential['total_time'] - parallel['total_time']
         }
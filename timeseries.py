@@ -0,0 +1,453 @@
+"""
+Time Series Module
+Per-location history of tested samples over time, with rollups
+
+Samples are appended to the series of their source location. Raw values
+live in fixed-size chunks of NumPy arrays, partitioned by day, so
+appending never copies earlier data and a time-range read only opens the
+partitions it overlaps.
+
+Every append also updates precomputed rollups: for each hour and each day,
+the sample count, the sum and maximum of every parameter, and the number
+of UNSAFE samples. The rollups are dense arrays indexed by bucket, so a
+range of buckets is a slice. Downsampled and rolling-window queries read
+only the rollups. summary() covers whole days with daily rollups, the rest
+of the whole hours with hourly rollups, and only reads raw samples for the
+partial hours at either end.
+
+    series = TimeSeriesStore()
+    series.append_samples(tested_samples)
+    daily = series.downsample("Reservoir", start, end, "day")
+    rolling = series.rolling("Reservoir", "nitrate", 24 * 3600, start, end)
+"""
+
+import math
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from aggregation import QUALITY_CODES, UNTESTED, SampleColumns
+from scoring import PARAMETER_FIELDS
+from water_sample import WaterQuality, WaterSample
+
+
+# Rollup resolutions, coarsest first
+ROLLUP_RESOLUTIONS = {'day': 86400, 'hour': 3600}
+
+# Raw samples are partitioned by this many seconds (one day)
+PARTITION_SECONDS = 86400
+
+# Samples per raw chunk
+CHUNK_SIZE = 4096
+
+PARAMETERS = list(PARAMETER_FIELDS)
+UNSAFE_CODE = QUALITY_CODES[WaterQuality.UNSAFE.value]
+
+
+class Chunk:
+    """Fixed-capacity block of raw samples of one location"""
+
+    def __init__(self, capacity: int):
+        self.timestamps = np.empty(capacity)
+        self.values = np.empty((capacity, len(PARAMETERS)))
+        self.quality_codes = np.empty(capacity, dtype=np.int8)
+        self.size = 0
+
+    @property
+    def free(self) -> int:
+        return len(self.timestamps) - self.size
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray, quality_codes: np.ndarray):
+        """Copy samples in (the caller keeps within free)"""
+        end = self.size + len(timestamps)
+        self.timestamps[self.size:end] = timestamps
+        self.values[self.size:end] = values
+        self.quality_codes[self.size:end] = quality_codes
+        self.size = end
+
+
+class Rollup:
+    """
+    Per-bucket aggregates of one location at one resolution.
+
+    Buckets are stored densely from the earliest one seen (bucket index =
+    Unix time // seconds), with spare capacity at the end for appends.
+    """
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.origin = 0
+        self.length = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros((0, len(PARAMETERS)))
+        self.maxima = np.full((0, len(PARAMETERS)), -np.inf)
+        self.unsafe = np.zeros(0, dtype=np.int64)
+
+    def _cover(self, first: int, last: int):
+        """Make room for buckets first..last"""
+        if not self.length:
+            self.origin = first
+        if first < self.origin:
+            shift = self.origin - first
+            self.counts = np.concatenate([np.zeros(shift, np.int64), self.counts])
+            self.sums = np.concatenate([np.zeros((shift, len(PARAMETERS))), self.sums])
+            self.maxima = np.concatenate([np.full((shift, len(PARAMETERS)), -np.inf), self.maxima])
+            self.unsafe = np.concatenate([np.zeros(shift, np.int64), self.unsafe])
+            self.origin = first
+            self.length += shift
+
+        needed = last - self.origin + 1
+        if needed > len(self.counts):
+            grow = max(needed, 2 * len(self.counts)) - len(self.counts)
+            self.counts = np.concatenate([self.counts, np.zeros(grow, np.int64)])
+            self.sums = np.concatenate([self.sums, np.zeros((grow, len(PARAMETERS)))])
+            self.maxima = np.concatenate([self.maxima, np.full((grow, len(PARAMETERS)), -np.inf)])
+            self.unsafe = np.concatenate([self.unsafe, np.zeros(grow, np.int64)])
+        self.length = max(self.length, needed)
+
+    def add(self, timestamps: np.ndarray, values: np.ndarray, unsafe: np.ndarray):
+        """Fold a batch of samples into their buckets"""
+        buckets = (timestamps // self.seconds).astype(np.int64)
+        self._cover(int(buckets.min()), int(buckets.max()))
+
+        rows = buckets - self.origin
+        if np.any(rows[1:] < rows[:-1]):
+            order = np.argsort(rows, kind='stable')
+            rows, values, unsafe = rows[order], values[order], unsafe[order]
+
+        # One reduceat per aggregate over the runs of equal buckets
+        starts = np.flatnonzero(np.concatenate(([True], rows[1:] != rows[:-1])))
+        targets = rows[starts]
+        self.counts[targets] += np.diff(np.append(starts, len(rows)))
+        self.sums[targets] += np.add.reduceat(values, starts)
+        self.maxima[targets] = np.maximum(self.maxima[targets], np.maximum.reduceat(values, starts))
+        self.unsafe[targets] += np.add.reduceat(unsafe.astype(np.int64), starts)
+
+    def rows(self, first: int, last: int) -> Tuple[int, int]:
+        """Row range (start, stop) of buckets first..last that are stored"""
+        start = min(max(first - self.origin, 0), self.length)
+        stop = min(max(last - self.origin + 1, 0), self.length)
+        return start, max(start, stop)
+
+
+class LocationSeries:
+    """Raw chunks and rollups of one location"""
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        # Partition (Unix time // PARTITION_SECONDS) -> its chunks
+        self.partitions: Dict[int, List[Chunk]] = {}
+        self.rollups = {name: Rollup(seconds) for name, seconds in ROLLUP_RESOLUTIONS.items()}
+        self.count = 0
+        self.first_time = math.inf
+        self.last_time = -math.inf
+
+    def clamp(self, start: float, end: float) -> Tuple[float, float]:
+        """Narrow [start, end) to the time span holding samples (open ends allowed)"""
+        return max(start, self.first_time), min(end, self.last_time + 1)
+
+    def append(self, timestamps: np.ndarray, values: np.ndarray, quality_codes: np.ndarray):
+        """Append a batch of samples (any time order)"""
+        partitions = (timestamps // PARTITION_SECONDS).astype(np.int64)
+        if np.any(partitions[1:] < partitions[:-1]):
+            order = np.argsort(partitions, kind='stable')
+            timestamps, values, quality_codes, partitions = (
+                timestamps[order], values[order], quality_codes[order], partitions[order])
+
+        bounds = np.flatnonzero(np.concatenate(([True], partitions[1:] != partitions[:-1], [True])))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            chunks = self.partitions.setdefault(int(partitions[start]), [])
+            while start < end:
+                if not chunks or not chunks[-1].free:
+                    chunks.append(Chunk(self.chunk_size))
+                take = min(chunks[-1].free, end - start)
+                chunks[-1].extend(timestamps[start:start + take], values[start:start + take],
+                                  quality_codes[start:start + take])
+                start += take
+
+        unsafe = quality_codes == UNSAFE_CODE
+        for rollup in self.rollups.values():
+            rollup.add(timestamps, values, unsafe)
+        self.count += len(timestamps)
+        self.first_time = min(self.first_time, float(timestamps.min()))
+        self.last_time = max(self.last_time, float(timestamps.max()))
+
+    def raw(self, start: float, end: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Raw samples with start <= time < end, in time order"""
+        pieces = []
+        overlapping = (key for key in self.partitions
+                       if key * PARTITION_SECONDS < end and (key + 1) * PARTITION_SECONDS > start)
+        for partition in sorted(overlapping):
+            for chunk in self.partitions[partition]:
+                times = chunk.timestamps[:chunk.size]
+                mask = (times >= start) & (times < end)
+                if mask.any():
+                    pieces.append((times[mask], chunk.values[:chunk.size][mask],
+                                   chunk.quality_codes[:chunk.size][mask]))
+        if not pieces:
+            return np.zeros(0), np.zeros((0, len(PARAMETERS))), np.zeros(0, dtype=np.int8)
+
+        timestamps = np.concatenate([piece[0] for piece in pieces])
+        order = np.argsort(timestamps, kind='stable')
+        return (timestamps[order], np.concatenate([piece[1] for piece in pieces])[order],
+                np.concatenate([piece[2] for piece in pieces])[order])
+
+
+class Downsampled(NamedTuple):
+    """
+    Rollup rows over a time range.
+
+    Attributes:
+        times: Start time of each bucket
+        counts: Samples per bucket
+        means: Parameter key -> mean per bucket (nan where empty)
+        maxima: Parameter key -> maximum per bucket (nan where empty)
+        unsafe: UNSAFE samples per bucket
+    """
+    times: np.ndarray
+    counts: np.ndarray
+    means: Dict[str, np.ndarray]
+    maxima: Dict[str, np.ndarray]
+    unsafe: np.ndarray
+
+
+class WindowSummary(NamedTuple):
+    """
+    Aggregates of one location over a time window.
+
+    Attributes:
+        count: Samples in the window
+        means: Parameter key -> mean (nan if the window is empty)
+        maxima: Parameter key -> maximum (nan if the window is empty)
+        unsafe: UNSAFE samples in the window
+        raw_samples: Raw samples read at the window's edges (the rest came
+                     from rollups)
+    """
+    count: int
+    means: Dict[str, float]
+    maxima: Dict[str, float]
+    unsafe: int
+    raw_samples: int
+
+
+class TimeSeriesStore:
+    """
+    Time series of tested samples, one per source location.
+
+    Attributes:
+        series: Location name -> LocationSeries
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.series: Dict[str, LocationSeries] = {}
+
+    def __len__(self) -> int:
+        return sum(series.count for series in self.series.values())
+
+    def locations(self) -> List[str]:
+        """Locations with at least one sample"""
+        return sorted(self.series)
+
+    def append_columns(self, columns: SampleColumns):
+        """
+        Append a batch of samples; untested samples are skipped.
+
+        Args:
+            columns: Batch with timestamps (SampleColumns.from_samples fills them)
+
+        Raises:
+            ValueError: If the batch has no timestamps
+        """
+        if columns.timestamps is None:
+            raise ValueError("Samples need collection timestamps for the time series")
+
+        tested = columns.quality_codes != UNTESTED
+        location_codes = columns.location_codes[tested]
+        timestamps = columns.timestamps[tested]
+        values = np.column_stack([columns.parameters[key][tested] for key in PARAMETERS])
+        quality_codes = columns.quality_codes[tested]
+
+        order = np.argsort(location_codes, kind='stable')
+        bounds = np.flatnonzero(np.concatenate(([True], np.diff(location_codes[order]) != 0, [True])))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if start == end:
+                continue
+            rows = order[start:end]
+            location = columns.locations[location_codes[rows[0]]]
+            if location not in self.series:
+                self.series[location] = LocationSeries(self.chunk_size)
+            self.series[location].append(timestamps[rows], values[rows], quality_codes[rows])
+
+    def append_samples(self, samples: List[WaterSample]):
+        """Append tested sample objects (untested ones are skipped)"""
+        if samples:
+            self.append_columns(SampleColumns.from_samples(samples))
+
+    def raw(self, location: str, start: float, end: float) -> Tuple[np.ndarray, Dict[str, np.ndarray], np.ndarray]:
+        """
+        Raw samples of a location with start <= collected_at < end.
+
+        Returns:
+            Tuple of (timestamps, parameter key -> values, quality codes), in time order
+        """
+        series = self.series.get(location)
+        if series is None:
+            return np.zeros(0), {key: np.zeros(0) for key in PARAMETERS}, np.zeros(0, dtype=np.int8)
+        timestamps, values, quality_codes = series.raw(start, end)
+        return timestamps, {key: values[:, i] for i, key in enumerate(PARAMETERS)}, quality_codes
+
+    def _buckets(self, location: str, start: float, end: float, resolution: str):
+        """
+        Dense rollup rows of the buckets that lie fully inside [start, end).
+
+        Returns:
+            Tuple of (bucket start times, counts, sums, maxima, UNSAFE counts);
+            empty buckets have a count of 0 and maxima of -inf
+        """
+        if resolution not in ROLLUP_RESOLUTIONS:
+            raise ValueError(f"Unknown resolution '{resolution}' (choose from {list(ROLLUP_RESOLUTIONS)})")
+        seconds = ROLLUP_RESOLUTIONS[resolution]
+        series = self.series.get(location)
+        if series is None:
+            start, end = 0.0, 0.0
+        elif not (math.isfinite(start) and math.isfinite(end)):
+            start, end = series.clamp(start, end)
+            # Widen to whole buckets so an open range keeps its partial edge buckets
+            start, end = math.floor(start / seconds) * seconds, math.ceil(end / seconds) * seconds
+        first, last = int(math.ceil(start / seconds)), int(end // seconds) - 1
+        buckets = np.arange(first, max(first, last + 1), dtype=np.int64)
+
+        counts = np.zeros(len(buckets), dtype=np.int64)
+        sums = np.zeros((len(buckets), len(PARAMETERS)))
+        maxima = np.full((len(buckets), len(PARAMETERS)), -np.inf)
+        unsafe = np.zeros(len(buckets), dtype=np.int64)
+
+        if series is not None and len(buckets):
+            rollup = series.rollups[resolution]
+            row_start, row_stop = rollup.rows(first, last)
+            offset = rollup.origin + row_start - first
+            span = slice(offset, offset + row_stop - row_start)
+            counts[span] = rollup.counts[row_start:row_stop]
+            sums[span] = rollup.sums[row_start:row_stop]
+            maxima[span] = rollup.maxima[row_start:row_stop]
+            unsafe[span] = rollup.unsafe[row_start:row_stop]
+        return buckets.astype(np.float64) * seconds, counts, sums, maxima, unsafe
+
+    def downsample(self, location: str, start: float, end: float, resolution: str = 'hour') -> Downsampled:
+        """
+        Per-bucket counts, means, maxima and UNSAFE counts, read from rollups.
+
+        Only buckets that lie fully inside [start, end) are returned; every
+        bucket in between is present, empty ones with a count of 0.
+
+        Args:
+            location: Source location
+            start: Start of the range (Unix time)
+            end: End of the range (Unix time, exclusive)
+            resolution: "hour" or "day"
+        """
+        times, counts, sums, maxima, unsafe = self._buckets(location, start, end, resolution)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts[:, None]
+        maxima[counts == 0] = np.nan
+        return Downsampled(times, counts,
+                           {key: means[:, i] for i, key in enumerate(PARAMETERS)},
+                           {key: maxima[:, i] for i, key in enumerate(PARAMETERS)}, unsafe)
+
+    def rolling(self, location: str, parameter: str, window: float, start: float, end: float,
+                resolution: str = 'hour') -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Rolling mean and maximum of a parameter, and rolling UNSAFE count.
+
+        Computed from rollups only: the window is a whole number of buckets
+        and is evaluated at the end of every bucket inside [start, end).
+
+        Args:
+            location: Source location
+            parameter: Parameter key (see scoring.PARAMETER_FIELDS)
+            window: Window length in seconds (rounded to whole buckets)
+            start: Start of the range (Unix time)
+            end: End of the range (Unix time, exclusive)
+            resolution: Bucket size, "hour" or "day"
+
+        Returns:
+            Tuple of (window end times, rolling means, rolling maxima,
+            rolling UNSAFE counts); means and maxima are nan for empty windows
+        """
+        if parameter not in PARAMETER_FIELDS:
+            raise ValueError(f"Unknown parameter: {parameter}")
+        seconds = ROLLUP_RESOLUTIONS.get(resolution, 1)
+        size = max(1, int(round(window / seconds)))
+
+        # Read size - 1 buckets before start so the first window is full
+        times, counts, sums, maxima, unsafe = self._buckets(
+            location, start - (size - 1) * seconds, end, resolution)
+        if len(times) < size:
+            empty = np.zeros(0)
+            return empty, empty, empty, np.zeros(0, dtype=np.int64)
+
+        def window_sums(values: np.ndarray) -> np.ndarray:
+            cumulative = np.concatenate(([0], np.cumsum(values)))
+            return cumulative[size:] - cumulative[:-size]
+
+        index = PARAMETERS.index(parameter)
+        window_counts = window_sums(counts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = window_sums(sums[:, index]) / window_counts
+        window_maxima = np.lib.stride_tricks.sliding_window_view(maxima[:, index], size).max(axis=1)
+        window_maxima[window_counts == 0] = np.nan
+        return times[size - 1:] + seconds, means, window_maxima, window_sums(unsafe)
+
+    def summary(self, location: str, start: float, end: float) -> WindowSummary:
+        """
+        Count, means, maxima and UNSAFE count of a location over [start, end).
+
+        The window is split into whole days (daily rollups), whole hours
+        (hourly rollups) and the partial hours at its edges (raw samples).
+        """
+        count, unsafe, raw_samples = 0, 0, 0
+        sums = np.zeros(len(PARAMETERS))
+        maxima = np.full(len(PARAMETERS), -np.inf)
+        series = self.series.get(location)
+
+        def add_rollup(rollup: Rollup, first: int, last: int):
+            nonlocal count, unsafe
+            row_start, row_stop = rollup.rows(first, last)
+            if row_stop > row_start:
+                count += int(rollup.counts[row_start:row_stop].sum())
+                unsafe += int(rollup.unsafe[row_start:row_stop].sum())
+                sums[:] += rollup.sums[row_start:row_stop].sum(axis=0)
+                np.maximum(maxima, rollup.maxima[row_start:row_stop].max(axis=0), out=maxima)
+
+        def cover(low: float, high: float, level: int):
+            nonlocal count, unsafe, raw_samples
+            if low >= high:
+                return
+            if level == len(ROLLUP_RESOLUTIONS):
+                timestamps, values, quality_codes = series.raw(low, high)
+                if len(timestamps):
+                    count += len(timestamps)
+                    raw_samples += len(timestamps)
+                    unsafe += int(np.count_nonzero(quality_codes == UNSAFE_CODE))
+                    sums[:] += values.sum(axis=0)
+                    np.maximum(maxima, values.max(axis=0), out=maxima)
+                return
+
+            name, seconds = list(ROLLUP_RESOLUTIONS.items())[level]
+            first, last = int(math.ceil(low / seconds)), int(high // seconds)
+            if first >= last:
+                cover(low, high, level + 1)
+                return
+            cover(low, first * seconds, level + 1)
+            add_rollup(series.rollups[name], first, last - 1)
+            cover(last * seconds, high, level + 1)
+
+        if series is not None:
+            cover(*series.clamp(start, end), 0)
+        if count:
+            means = {key: float(sums[i] / count) for i, key in enumerate(PARAMETERS)}
+            peaks = {key: float(maxima[i]) for i, key in enumerate(PARAMETERS)}
+        else:
+            means = peaks = {key: math.nan for key in PARAMETERS}
+        return WindowSummary(count, means, peaks, unsafe, raw_samples)
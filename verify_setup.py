@@ -1,8 +1,17 @@
 """
 Setup Verification Script
 Checks if the environment is properly configured to run the application
+
+After the checks it probes the host's performance (CPU quota, process
+spawn latency, pickling and pool dispatch costs, backend throughput and
+shared memory) and caches the results in a host profile. TestEngine takes
+its default backend, worker count and stream chunk size from that profile.
+
+    python verify_setup.py                # checks, then probe and save the profile
+    python verify_setup.py --skip-probe   # checks only
 """
 
+import argparse
 import sys
 import platform
 
@@ -90,7 +99,9 @@ def check_imports():
     modules = [
         ("water_sample", "WaterSample"),
         ("test_engine", "TestEngine"),
-        ("config", None)
+        ("config", None),
+        # Importing the GUI is cheap: pygame is only initialized on first use
+        ("main", "WaterQualityLabGUI")
     ]
     
     all_imported = True
@@ -129,6 +140,27 @@ def test_water_sample_generation():
         return False
 
 
+def check_quality_profiles():
+    """Check that random samples of each quality class rate as that class"""
+    print("\nChecking quality profile calibration...")
+    try:
+        from workload import check_quality_profiles as rate_profiles
+        shares = rate_profiles()
+    except Exception as e:
+        print(f"  ✗ ERROR: {e}")
+        return False
+    
+    calibrated = True
+    for quality, share in shares.items():
+        if share == 1.0:
+            print(f"  ✓ {quality} samples rate {quality.capitalize()}")
+        else:
+            print(f"  ✗ {quality}: only {share * 100:.1f}% rate {quality.capitalize()} "
+                  f"(adjust config.QUALITY_PROFILES to the scoring rules)")
+            calibrated = False
+    return calibrated
+
+
 def print_system_info():
     """Print system information"""
     print("\n" + "="*60)
@@ -142,8 +174,300 @@ def print_system_info():
     print(f"Python Implementation: {platform.python_implementation()}")
 
 
+# Probe settings: samples per measurement, the share of a chunk's work that
+# dispatching it may cost, bounds for the recommended chunk size, and how
+# much faster a parallel backend must be to be preferred over sequential
+# (also the gain another doubling of workers must bring to be recommended)
+PROBE_SAMPLES = 20_000
+DISPATCH_OVERHEAD_BUDGET = 0.05
+MIN_CHUNK_SIZE, MAX_CHUNK_SIZE = 100, 50_000
+PARALLEL_MIN_GAIN = 1.1
+
+
+def probe_cpu():
+    """Measure the CPUs this process may use (affinity and container quota)"""
+    import os
+    from test_engine import _read_cgroup_cpu_quota, get_available_cpus
+    
+    print("\nProbing CPU quota...")
+    logical = os.cpu_count() or 1
+    affinity = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else logical
+    quota = _read_cgroup_cpu_quota()
+    usable = get_available_cpus()
+    quota_str = f"{quota:g}" if quota else "none"
+    print(f"  ✓ Logical CPUs: {logical} | affinity: {affinity} | quota: {quota_str}")
+    print(f"  ✓ Usable CPUs: {usable}")
+    return {'logical': logical, 'affinity': affinity, 'quota': quota, 'usable': usable}
+
+
+def probe_spawn_latency(repeats=3):
+    """Measure time-to-first-result of a cold one-worker pool per start method"""
+    import multiprocessing as mp
+    from test_engine import TestEngine
+    
+    print("\nProbing process spawn latency...")
+    latencies = {}
+    for method in mp.get_all_start_methods():
+        engine = TestEngine(num_workers=1, start_method=method, use_profile=False)
+        latencies[method] = min(engine.measure_cold_start() for _ in range(repeats))
+        print(f"  ✓ {method:11} {latencies[method] * 1000:8.1f}ms")
+    return latencies
+
+
+def probe_pickle(samples):
+    """Measure pickle round trips of a WaterSample batch, as sent to process workers"""
+    import pickle
+    import time
+    
+    print("\nProbing pickle round-trip throughput...")
+    start = time.perf_counter()
+    data = pickle.dumps(samples)
+    pickle.loads(data)
+    elapsed = time.perf_counter() - start
+    result = {'samples_per_sec': len(samples) / elapsed, 'bytes_per_sample': len(data) / len(samples)}
+    print(f"  ✓ {result['samples_per_sec']:,.0f} samples/sec, {result['bytes_per_sample']:.0f} bytes/sample")
+    return result
+
+
+def probe_rating(samples):
+    """Measure rating samples in this process (the work a stream chunk does)"""
+    import time
+    from test_engine import _rate_chunk
+    
+    print("\nProbing rating cost...")
+    start = time.perf_counter()
+    _rate_chunk(samples, False)
+    seconds = (time.perf_counter() - start) / len(samples)
+    print(f"  ✓ {seconds * 1e6:.2f}µs per sample ({1 / seconds:,.0f} samples/sec)")
+    return seconds
+
+
+def probe_dispatch(executor, tasks):
+    """Average round trip of a trivial task on an already running executor"""
+    import time
+    from test_engine import _worker_ready
+    
+    executor.submit(_worker_ready).result()
+    start = time.perf_counter()
+    for _ in range(tasks):
+        executor.submit(_worker_ready).result()
+    return (time.perf_counter() - start) / tasks
+
+
+def probe_backend_throughput(executor, samples, chunk_size):
+    """Samples per second rated on an executor in chunks (pickling included for processes)"""
+    import time
+    from test_engine import _rate_chunk
+    
+    chunks = [samples[i:i + chunk_size] for i in range(0, len(samples), chunk_size)]
+    start = time.perf_counter()
+    list(executor.map(_rate_chunk, chunks, [False] * len(chunks)))
+    return len(samples) / (time.perf_counter() - start)
+
+
+def probe_shared_memory():
+    """Check that multiprocessing.shared_memory works and how much room it has"""
+    import os
+    import shutil
+    
+    print("\nProbing shared memory...")
+    result = {'available': False, 'free_mb': None}
+    try:
+        from multiprocessing import shared_memory
+        block = shared_memory.SharedMemory(create=True, size=1 << 20)
+        try:
+            block.buf[:4] = b"wql!"
+            result['available'] = bytes(block.buf[:4]) == b"wql!"
+        finally:
+            block.close()
+            block.unlink()
+    except (ImportError, OSError) as e:
+        print(f"  ✗ Shared memory unavailable: {e}")
+        return result
+    
+    if os.path.isdir("/dev/shm"):
+        result['free_mb'] = shutil.disk_usage("/dev/shm").free / (1024 * 1024)
+        print(f"  ✓ Shared memory available ({result['free_mb']:,.0f} MB free in /dev/shm)")
+    else:
+        print("  ✓ Shared memory available")
+    return result
+
+
+def probe_optional_backends():
+    """Check which optional TestEngine backends this interpreter can run"""
+    from test_engine import gil_disabled, subinterpreters_available
+    
+    print("\nProbing optional execution backends...")
+    available = {'free_threading': gil_disabled(), 'subinterpreters': subinterpreters_available()}
+    for backend, usable in available.items():
+        if usable:
+            print(f"  ✓ {backend:16} available")
+        else:
+            print(f"  ✗ {backend:16} unavailable (falls back to multiprocessing)")
+    return available
+
+
+def recommend_chunk_size(dispatch_seconds, seconds_per_sample):
+    """
+    Smallest chunk whose work dwarfs its dispatch cost.
+    
+    A chunk should take at least 1 / DISPATCH_OVERHEAD_BUDGET times as long
+    to rate as one task round trip takes, so dispatching costs at most that
+    share of the work. Rounded up to a multiple of 100.
+    """
+    import math
+    
+    size = dispatch_seconds / (DISPATCH_OVERHEAD_BUDGET * max(seconds_per_sample, 1e-9))
+    size = math.ceil(size / 100) * 100
+    return int(min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, size)))
+
+
+def probe_worker_scaling(make_executor, samples, chunk_size, max_workers):
+    """Throughput at 1, 2, 4, ... workers up to max_workers ({workers: samples/sec})"""
+    counts = sorted({min(1 << i, max_workers) for i in range(max_workers.bit_length() + 1)})
+    scaling = {}
+    for workers in counts:
+        with make_executor(workers) as executor:
+            scaling[workers] = probe_backend_throughput(executor, samples, chunk_size)
+    return scaling
+
+
+def recommend_workers(scaling):
+    """
+    Fewest workers past which adding more stops paying off.
+    
+    Walks the measured worker counts upwards and stops at the first step
+    that is not PARALLEL_MIN_GAIN times faster than the one before it, so
+    hyper-threads, CPU contention or dispatch overhead cap the pool size.
+    """
+    counts = sorted(scaling)
+    best = counts[0]
+    for workers in counts[1:]:
+        if scaling[workers] < PARALLEL_MIN_GAIN * scaling[best]:
+            break
+        best = workers
+    return best
+
+
+def run_performance_probe(num_samples=PROBE_SAMPLES):
+    """
+    Measure this host and derive the engine's default settings.
+    
+    Args:
+        num_samples: Samples per throughput measurement
+        
+    Returns:
+        Profile dictionary, with the settings TestEngine uses under "recommended"
+    """
+    import platform
+    import socket
+    import time
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from test_engine import TestEngine
+    from water_sample import WaterSample
+    
+    samples = [WaterSample.generate_random_sample(sample_id) for sample_id in range(num_samples)]
+    cpu = probe_cpu()
+    spawn_latency = probe_spawn_latency()
+    pickling = probe_pickle(samples)
+    rating_seconds = probe_rating(samples)
+    
+    print("\nProbing pool dispatch overhead and throughput...")
+    workers = cpu['usable']
+    engine = TestEngine(num_workers=workers, use_profile=False)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        thread_dispatch = probe_dispatch(executor, 2000)
+        thread_chunk = recommend_chunk_size(thread_dispatch, rating_seconds)
+        thread_rate = probe_backend_throughput(executor, samples, thread_chunk)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=engine.get_mp_context()) as executor:
+        process_dispatch = probe_dispatch(executor, 200)
+        # Every sample is pickled to a worker, so that counts as per-sample work too
+        process_chunk = recommend_chunk_size(process_dispatch, rating_seconds + 1 / pickling['samples_per_sec'])
+        process_rate = probe_backend_throughput(executor, samples, process_chunk)
+    
+    rates = {'sequential': 1 / rating_seconds, 'threading': thread_rate, 'multiprocessing': process_rate}
+    for backend, rate in rates.items():
+        print(f"  ✓ {backend:16} {rate:>12,.0f} samples/sec")
+    print(f"  ✓ Round trip: thread {thread_dispatch * 1e6:.1f}µs | process {process_dispatch * 1e6:.1f}µs")
+    
+    # A parallel backend has to clearly beat rating in-process to be worth its overhead
+    backend = max(('threading', 'multiprocessing'), key=rates.get)
+    if rates[backend] < PARALLEL_MIN_GAIN * rates['sequential']:
+        backend = 'sequential'
+    optional_backends = probe_optional_backends()
+    if backend == 'threading' and optional_backends['free_threading']:
+        # Same thread pool, but recorded as the backend that needs a GIL-free build
+        backend = 'free_threading'
+    chunk_size = thread_chunk if backend == 'threading' else process_chunk
+    
+    # Worker count from measured scaling of the chosen backend, not just the CPU count
+    scaling = {1: rates['sequential']}
+    if backend in ('threading', 'free_threading'):
+        scaling = probe_worker_scaling(lambda n: ThreadPoolExecutor(max_workers=n), samples, chunk_size, workers)
+    elif backend == 'multiprocessing':
+        scaling = probe_worker_scaling(
+            lambda n: ProcessPoolExecutor(max_workers=n, mp_context=engine.get_mp_context()),
+            samples, chunk_size, workers)
+    for count, rate in scaling.items():
+        print(f"  ✓ {count:>3} workers {rate:>12,.0f} samples/sec")
+    num_workers = recommend_workers(scaling)
+    
+    return {
+        'created_at': time.time(),
+        'host': socket.gethostname(),
+        'python': platform.python_version(),
+        'cpu': cpu,
+        'spawn_latency': spawn_latency,
+        'pickle': pickling,
+        'rating_seconds_per_sample': rating_seconds,
+        'dispatch_seconds': {'thread': thread_dispatch, 'process': process_dispatch},
+        'throughput': rates,
+        'worker_scaling': scaling,
+        'optional_backends': optional_backends,
+        'shared_memory': probe_shared_memory(),
+        'recommended': {'backend': backend, 'num_workers': num_workers, 'chunk_size': chunk_size}
+    }
+
+
+def save_profile(profile, path):
+    """Write the profile as JSON"""
+    import json
+    
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+
+
+def run_probe_check(num_samples, path):
+    """Probe the host and save its profile where TestEngine looks for it"""
+    from test_engine import get_profile_path
+    
+    path = path or get_profile_path()
+    try:
+        profile = run_performance_probe(num_samples)
+        save_profile(profile, path)
+    except Exception as e:
+        print(f"  ✗ ERROR: Performance probe failed: {e}")
+        return False
+    
+    recommended = profile['recommended']
+    print(f"\n  ✓ Recommended: {recommended['backend']} backend, {recommended['num_workers']} workers, "
+          f"chunks of {recommended['chunk_size']:,}")
+    print(f"  ✓ Host profile saved to {path}")
+    return True
+
+
 def main():
     """Run all verification checks"""
+    parser = argparse.ArgumentParser(description="Verify the setup and profile this host")
+    parser.add_argument("--skip-probe", action="store_true",
+                        help="Only run the checks; leave the host profile as it is")
+    parser.add_argument("--profile", default=None,
+                        help="Where to save the host profile (default: $WQL_HOST_PROFILE, "
+                             "else host_profile.json next to test_engine.py)")
+    parser.add_argument("--samples", type=int, default=PROBE_SAMPLES,
+                        help=f"Samples per throughput measurement (default: {PROBE_SAMPLES:,})")
+    args = parser.parse_args()
+    
     print("="*60)
     print("WATER QUALITY LAB - SETUP VERIFICATION")
     print("="*60)
@@ -154,7 +478,8 @@ def main():
         ("Multiprocessing Support", check_multiprocessing),
         ("Project Files", check_project_files),
         ("Module Imports", check_imports),
-        ("Sample Generation", test_water_sample_generation)
+        ("Sample Generation", test_water_sample_generation),
+        ("Quality Profiles", check_quality_profiles)
     ]
     
     results = []
@@ -166,6 +491,10 @@ def main():
             print(f"\n  ✗ Unexpected error in {name}: {e}")
             results.append((name, False))
     
+    # The probe needs the project modules, so it only runs when they import
+    if not args.skip_probe and dict(results).get("Module Imports"):
+        results.append(("Performance Probe", run_probe_check(args.samples, args.profile)))
+    
     # Print summary
     print("\n" + "="*60)
     print("VERIFICATION SUMMARY")
@@ -5,10 +5,14 @@ Supports SDG 6: Clean Water and Sanitation
 """
 
 import random
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from typing import Tuple
 from enum import Enum
 
+import scoring
+from config import QUALITY_PROFILES
+
 
 class WaterQuality(Enum):
     """Water quality classification based on test results"""
@@ -19,6 +23,10 @@ class WaterQuality(Enum):
     UNSAFE = "Unsafe"
 
 
+# Rating label (as used in config.RATING_THRESHOLDS) -> WaterQuality
+QUALITY_BY_LABEL = {quality.value: quality for quality in WaterQuality}
+
+
 @dataclass
 class WaterSample:
     """
@@ -32,6 +40,7 @@ class WaterSample:
         total_coliform: Coliform bacteria count per 100ml (ideal: 0)
         nitrate_level: Nitrate concentration in mg/L (ideal: <10)
         source_location: Origin of the water sample
+        collected_at: Unix time the sample was collected (defaults to now)
     """
     sample_id: int
     ph_level: float
@@ -42,6 +51,7 @@ class WaterSample:
     source_location: str
     tested: bool = False
     test_duration: float = 0.0
+    collected_at: float = field(default_factory=time.time)
     
     @staticmethod
     def generate_random_sample(sample_id: int) -> 'WaterSample':
@@ -61,38 +71,13 @@ class WaterSample:
         ]
         
         # Generate realistic ranges with some variation
-        quality_type = random.choice(['excellent', 'good', 'moderate', 'poor', 'unsafe'])
-        
-        if quality_type == 'excellent':
-            ph = random.uniform(7.0, 8.0)
-            turbidity = random.uniform(0.5, 2.0)
-            do = random.uniform(7.0, 10.0)
-            coliform = random.randint(0, 1)
-            nitrate = random.uniform(0.5, 3.0)
-        elif quality_type == 'good':
-            ph = random.uniform(6.5, 8.5)
-            turbidity = random.uniform(2.0, 5.0)
-            do = random.uniform(6.0, 8.0)
-            coliform = random.randint(0, 10)
-            nitrate = random.uniform(3.0, 8.0)
-        elif quality_type == 'moderate':
-            ph = random.uniform(6.0, 9.0)
-            turbidity = random.uniform(5.0, 15.0)
-            do = random.uniform(4.0, 6.0)
-            coliform = random.randint(10, 50)
-            nitrate = random.uniform(8.0, 15.0)
-        elif quality_type == 'poor':
-            ph = random.uniform(5.5, 9.5)
-            turbidity = random.uniform(15.0, 50.0)
-            do = random.uniform(2.0, 4.0)
-            coliform = random.randint(50, 200)
-            nitrate = random.uniform(15.0, 30.0)
-        else:  # unsafe
-            ph = random.uniform(4.0, 11.0)
-            turbidity = random.uniform(50.0, 200.0)
-            do = random.uniform(0.5, 2.0)
-            coliform = random.randint(200, 1000)
-            nitrate = random.uniform(30.0, 100.0)
+        quality_type = random.choice(list(QUALITY_PROFILES))
+        profile = QUALITY_PROFILES[quality_type]
+        ph = random.uniform(*profile["ph"])
+        turbidity = random.uniform(*profile["turbidity"])
+        do = random.uniform(*profile["dissolved_oxygen"])
+        coliform = random.randint(*profile["coliform"])
+        nitrate = random.uniform(*profile["nitrate"])
         
         return WaterSample(
             sample_id=sample_id,
@@ -114,54 +99,8 @@ class WaterSample:
         if not self.tested:
             return WaterQuality.MODERATE
         
-        score = 0
-        max_score = 5
-        
-        # pH scoring (ideal: 6.5-8.5)
-        if 6.5 <= self.ph_level <= 8.5:
-            score += 1
-        elif 6.0 <= self.ph_level <= 9.0:
-            score += 0.5
-        
-        # Turbidity scoring (ideal: <5 NTU)
-        if self.turbidity < 5:
-            score += 1
-        elif self.turbidity < 15:
-            score += 0.5
-        
-        # Dissolved Oxygen scoring (ideal: >6 mg/L)
-        if self.dissolved_oxygen >= 6:
-            score += 1
-        elif self.dissolved_oxygen >= 4:
-            score += 0.5
-        
-        # Coliform scoring (ideal: 0)
-        if self.total_coliform == 0:
-            score += 1
-        elif self.total_coliform < 10:
-            score += 0.7
-        elif self.total_coliform < 50:
-            score += 0.3
-        
-        # Nitrate scoring (ideal: <10 mg/L)
-        if self.nitrate_level < 10:
-            score += 1
-        elif self.nitrate_level < 20:
-            score += 0.5
-        
-        # Convert score to quality rating
-        percentage = (score / max_score) * 100
-        
-        if percentage >= 90:
-            return WaterQuality.EXCELLENT
-        elif percentage >= 70:
-            return WaterQuality.GOOD
-        elif percentage >= 50:
-            return WaterQuality.MODERATE
-        elif percentage >= 30:
-            return WaterQuality.POOR
-        else:
-            return WaterQuality.UNSAFE
+        # Thresholds live in config.SCORING_RULES, compiled by scoring.py
+        return QUALITY_BY_LABEL[scoring.get_rules().rate(self)]
     
     def get_quality_color(self) -> Tuple[int, int, int]:
         """
@@ -0,0 +1,432 @@
+"""
+Workload Module
+Deterministic synthetic sample streams of any size, driven by scenarios
+
+A scenario (a name from config.WORKLOAD_SCENARIOS, or a JSON file with the
+same keys) describes which locations samples come from and in what quality
+mix, how their collection times arrive (steady, bursty or diurnal) and how
+long their tests take. Workload turns it into a stream:
+
+    workload = Workload(load_scenario("field_network"), samples=10_000_000)
+    for chunk, ratings in engine.test_stream(workload.samples()):
+        ...
+    for columns in workload.columns(tested=True):
+        store.add_columns(columns)
+
+Nothing is materialized up front. Samples are generated with NumPy in
+fixed blocks of BLOCK_SIZE, and each block has its own random generator
+seeded from (seed, block number). The stream is therefore the same on
+every run and however it is consumed, and any block can be generated on
+its own.
+
+Collection times follow the scenario's arrival rate, a piecewise-constant
+profile that repeats every period. The n-th sample arrives where the
+expected number of arrivals since the start reaches n plus a random
+fraction between 1/4 and 3/4, so neighbours are at least half an average
+gap apart. Times are strictly increasing (up to rates of about a million
+samples per second, where that gap nears float64 resolution of present-day
+Unix times), and busy periods are denser exactly as the profile says.
+
+Write a scenario to a file (or pipe it into batch.py):
+    python workload.py field_network --samples 1000000 -o samples.csv
+    python workload.py --list
+"""
+
+import argparse
+import csv
+import json
+import math
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator
+
+import numpy as np
+
+import scoring
+from aggregation import QUALITY_CODES, UNTESTED, SampleColumns
+from config import (PARAMETER_RANGES, PRESET_SAMPLES, QUALITY_PROFILES, SAMPLE_LOCATIONS, TEST_CONFIG,
+                    WORKLOAD_SCENARIOS)
+from scoring import PARAMETER_FIELDS
+from water_sample import WaterSample
+
+
+# Samples per generated block; fixed so a seed always gives the same stream
+BLOCK_SIZE = 65_536
+
+# Collection time of the first sample unless the scenario sets "start"
+# (2025-01-01 00:00 UTC, a midnight, so diurnal profiles line up)
+DEFAULT_START = 1735689600.0
+
+# Bins of the diurnal arrival profile (15 minutes each)
+DIURNAL_BINS = 96
+
+# Short parameter names used by config.PRESET_SAMPLES
+PRESET_KEYS = {'ph': 'ph', 'turbidity': 'turbidity', 'dissolved_oxygen': 'do',
+               'coliform': 'coliform', 'nitrate': 'nitrate'}
+
+# Columns written by the CLI, in the format batch.py reads
+OUTPUT_FIELDS = ['sample_id', 'source_location', 'ph_level', 'turbidity', 'dissolved_oxygen',
+                 'total_coliform', 'nitrate_level', 'collected_at', 'test_duration']
+
+
+def load_scenario(name: str) -> Dict:
+    """
+    Look up a named scenario, or read one from a JSON file.
+
+    Args:
+        name: Key of config.WORKLOAD_SCENARIOS, or path to a JSON file
+
+    Returns:
+        Scenario dictionary (with its "name" set)
+
+    Raises:
+        ValueError: If the name is neither a scenario nor a readable file
+    """
+    if name in WORKLOAD_SCENARIOS:
+        return {'name': name, **WORKLOAD_SCENARIOS[name]}
+    try:
+        with open(name, encoding="utf-8") as f:
+            scenario = json.load(f)
+    except OSError:
+        raise ValueError(f"Unknown scenario '{name}' (choose from {sorted(WORKLOAD_SCENARIOS)} "
+                         f"or give a JSON file)") from None
+    return {'name': name, **scenario}
+
+
+def parse_start(value) -> float:
+    """A scenario's start time: Unix seconds or an ISO 8601 date/time (UTC if no offset)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class ArrivalProcess:
+    """
+    Collection times from a repeating, piecewise-constant arrival rate.
+
+    Attributes:
+        period: Length of the repeating profile (seconds)
+        edges: Start of each rate bin within the period
+        rates: Samples per second in each bin
+        mean_rate: Average samples per second over a period
+    """
+
+    def __init__(self, arrival: Dict, start: float):
+        """
+        Build the rate profile of a scenario's "arrival" settings.
+
+        Raises:
+            ValueError: If the pattern is unknown or a rate is not positive
+        """
+        pattern = arrival.get('pattern', 'steady')
+        rate = float(arrival.get('rate', 1.0))
+        if pattern == 'steady':
+            self.period, edges, rates = 1.0, [0.0], [rate]
+        elif pattern == 'bursty':
+            every, length = float(arrival['burst_every']), float(arrival['burst_length'])
+            if not 0 < length < every:
+                raise ValueError("burst_length must be positive and shorter than burst_every")
+            self.period, edges, rates = every, [0.0, length], [float(arrival['burst_rate']), rate]
+        elif pattern == 'diurnal':
+            peak, amplitude = float(arrival.get('peak_hour', 12)), float(arrival.get('amplitude', 0.5))
+            width = 86400 / DIURNAL_BINS
+            hours = (np.arange(DIURNAL_BINS) + 0.5) * width / 3600
+            self.period = 86400.0
+            edges = np.arange(DIURNAL_BINS) * width
+            rates = rate * (1 + amplitude * np.cos(2 * math.pi * (hours - peak) / 24))
+        else:
+            raise ValueError(f"Unknown arrival pattern '{pattern}' (choose from steady, bursty, diurnal)")
+
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.rates = np.asarray(rates, dtype=np.float64)
+        if (self.rates <= 0).any():
+            raise ValueError("Arrival rates must be positive (diurnal amplitude below 1)")
+        widths = np.diff(np.append(self.edges, self.period))
+        # Expected arrivals from the start of the period to each bin edge
+        self.cumulative = np.concatenate(([0.0], np.cumsum(self.rates * widths)))
+        self.mean_rate = self.cumulative[-1] / self.period
+
+        # Counts are kept relative to the start of the period holding the
+        # start time; counted from the epoch they would be so large that
+        # float64 loses the fraction between neighbouring samples
+        self.start = start
+        self.start_phase = math.fmod(start, self.period)
+        self.offset = self._count_within_period(self.start_phase)
+
+    def _count_within_period(self, phase: float) -> float:
+        """Expected arrivals from the start of a period up to a phase in it"""
+        b = int(np.searchsorted(self.edges, phase, side='right')) - 1
+        return self.cumulative[b] + (phase - self.edges[b]) * self.rates[b]
+
+    def times(self, counts: np.ndarray) -> np.ndarray:
+        """Times at which the expected arrivals since the start reach each count"""
+        periods, rest = np.divmod(counts + self.offset, self.cumulative[-1])
+        b = np.minimum(np.searchsorted(self.cumulative, rest, side='right') - 1, len(self.rates) - 1)
+        since_start = periods * self.period + self.edges[b] + (rest - self.cumulative[b]) / self.rates[b]
+        return self.start + (since_start - self.start_phase)
+
+
+def _durations(duration: Dict, rng: np.random.Generator, count: int) -> np.ndarray:
+    """Test durations in seconds from a scenario's "duration" settings"""
+    distribution = duration.get('distribution', 'uniform')
+    if distribution == 'uniform':
+        values = rng.uniform(duration.get('low', TEST_CONFIG['min_test_duration']),
+                             duration.get('high', TEST_CONFIG['max_test_duration']), count)
+    elif distribution == 'normal':
+        values = rng.normal(duration['mean'], duration['std'], count)
+    elif distribution == 'lognormal':
+        values = duration['median'] * np.exp(duration['sigma'] * rng.standard_normal(count))
+    else:
+        raise ValueError(f"Unknown duration distribution '{distribution}' (choose from uniform, normal, lognormal)")
+    return np.round(np.maximum(values, 0.001), 3)
+
+
+class Workload:
+    """
+    Lazily generated, deterministic stream of samples for one scenario.
+
+    Attributes:
+        scenario: Scenario dictionary
+        size: Number of samples in the stream
+        seed: Seed of the stream
+        start: Collection time origin (Unix seconds)
+        locations: Location names; generated location codes index into this list
+        arrivals: ArrivalProcess of the collection times
+    """
+
+    def __init__(self, scenario: Dict, samples: int = None, seed: int = None, first_id: int = 1):
+        """
+        Prepare a scenario for generation.
+
+        Args:
+            scenario: Scenario dictionary (see load_scenario)
+            samples: Stream length (defaults to the scenario's "samples")
+            seed: Random seed (defaults to the scenario's "seed", else 0)
+            first_id: Sample id of the first sample
+
+        Raises:
+            ValueError: If the scenario is malformed
+        """
+        self.scenario = scenario
+        self.size = int(samples if samples is not None else scenario.get('samples', 10_000))
+        self.seed = int(seed if seed is not None else scenario.get('seed', 0))
+        self.first_id = first_id
+        self.start = parse_start(scenario.get('start', DEFAULT_START))
+        self.arrivals = ArrivalProcess(scenario.get('arrival', {}), self.start)
+        self.duration = scenario.get('duration', {})
+        self.jitter = float(scenario.get('jitter', 0.0))
+
+        if 'preset' in scenario:
+            rows = PRESET_SAMPLES.get(scenario['preset'])
+            if not rows:
+                raise ValueError(f"Unknown preset '{scenario['preset']}' (choose from {sorted(PRESET_SAMPLES)})")
+            self.locations = list(dict.fromkeys(row['location'] for row in rows))
+            self._preset_locations = np.array([self.locations.index(row['location']) for row in rows])
+            self._preset_values = {key: np.array([row[short] for row in rows], dtype=np.float64)
+                                   for key, short in PRESET_KEYS.items()}
+        else:
+            self._preset_values = None
+            self._build_mix(scenario)
+
+    def _build_mix(self, scenario: Dict):
+        """Location weights and per-location cumulative quality mixes"""
+        default_mix = scenario.get('quality_mix', {name: 1.0 for name in QUALITY_PROFILES})
+        locations = scenario.get('locations') or {name: {'weight': 1} for name in SAMPLE_LOCATIONS}
+        self.locations = list(locations)
+
+        weights = np.array([float(settings.get('weight', 1)) for settings in locations.values()])
+        if (weights < 0).any() or weights.sum() <= 0:
+            raise ValueError("Location weights must be non-negative and not all zero")
+        self._location_cdf = np.cumsum(weights / weights.sum())
+
+        classes = list(QUALITY_PROFILES)
+        mixes = []
+        for name, settings in locations.items():
+            mix = settings.get('quality_mix', default_mix)
+            unknown = set(mix) - set(classes)
+            if unknown:
+                raise ValueError(f"Unknown quality classes for {name}: {sorted(unknown)}")
+            shares = np.array([float(mix.get(quality, 0.0)) for quality in classes])
+            if shares.sum() <= 0:
+                raise ValueError(f"Quality mix of {name} is empty")
+            mixes.append(np.cumsum(shares / shares.sum()))
+        self._mix_cdf = np.array(mixes)
+
+        self._low = {key: np.array([QUALITY_PROFILES[quality][key][0] for quality in classes], dtype=np.float64)
+                     for key in PARAMETER_FIELDS}
+        self._high = {key: np.array([QUALITY_PROFILES[quality][key][1] for quality in classes], dtype=np.float64)
+                      for key in PARAMETER_FIELDS}
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def blocks(self) -> int:
+        """Number of blocks in the stream"""
+        return -(-self.size // BLOCK_SIZE)
+
+    def block(self, index: int, tested: bool = False) -> SampleColumns:
+        """
+        Generate one block of the stream.
+
+        Args:
+            index: Block number (0 to blocks - 1)
+            tested: Rate the samples with the active scoring rules, as if
+                    already tested (otherwise their quality is UNTESTED)
+
+        Returns:
+            SampleColumns of up to BLOCK_SIZE samples
+        """
+        first = index * BLOCK_SIZE
+        count = max(0, min(BLOCK_SIZE, self.size - first))
+        rng = np.random.default_rng([self.seed, index])
+
+        if self._preset_values is not None:
+            rows = rng.integers(len(self._preset_locations), size=count)
+            location_codes = self._preset_locations[rows].astype(np.int32)
+            parameters = {}
+            for key, values in self._preset_values.items():
+                scaled = values[rows] * (1 + self.jitter * rng.standard_normal(count))
+                parameters[key] = np.clip(scaled, PARAMETER_RANGES[key]['min'], PARAMETER_RANGES[key]['max'])
+        else:
+            location_codes = np.minimum(np.searchsorted(self._location_cdf, rng.random(count), side='right'),
+                                        len(self.locations) - 1).astype(np.int32)
+            draws = rng.random(count)
+            classes = (draws[:, None] >= self._mix_cdf[location_codes]).sum(axis=1)
+            classes = np.minimum(classes, len(QUALITY_PROFILES) - 1)
+            parameters = {}
+            for key in PARAMETER_FIELDS:
+                low, high = self._low[key][classes], self._high[key][classes]
+                if key == 'coliform':
+                    parameters[key] = rng.integers(low.astype(np.int64), high.astype(np.int64) + 1).astype(np.float64)
+                else:
+                    parameters[key] = low + (high - low) * rng.random(count)
+
+        for key in parameters:
+            parameters[key] = np.round(parameters[key], 0 if key == 'coliform' else 2)
+
+        if tested:
+            rules = scoring.get_rules()
+            label_codes = np.array([QUALITY_CODES[label] for label in rules.ratings], dtype=np.int8)
+            quality_codes = label_codes[rules.rate_columns(parameters)]
+        else:
+            quality_codes = np.full(count, UNTESTED, dtype=np.int8)
+
+        counts = np.arange(first, first + count, dtype=np.float64) + 0.25 + 0.5 * rng.random(count)
+        return SampleColumns(self.locations, location_codes, quality_codes, parameters,
+                             _durations(self.duration, rng, count),
+                             np.arange(self.first_id + first, self.first_id + first + count, dtype=np.int64),
+                             self.arrivals.times(counts))
+
+    def columns(self, tested: bool = False) -> Iterator[SampleColumns]:
+        """Yield the stream block by block as SampleColumns"""
+        for index in range(self.blocks):
+            yield self.block(index, tested)
+
+    def samples(self, tested: bool = False) -> Iterator[WaterSample]:
+        """Yield the stream as WaterSample objects, one block generated at a time"""
+        for columns in self.columns(tested):
+            parameters = columns.parameters
+            locations = self.locations
+            for (sample_id, code, ph, turbidity, oxygen, coliform, nitrate, duration,
+                 collected_at) in zip(columns.sample_ids.tolist(), columns.location_codes.tolist(),
+                                      parameters['ph'].tolist(), parameters['turbidity'].tolist(),
+                                      parameters['dissolved_oxygen'].tolist(), parameters['coliform'].tolist(),
+                                      parameters['nitrate'].tolist(), columns.durations.tolist(),
+                                      columns.timestamps.tolist()):
+                yield WaterSample(sample_id, ph, turbidity, oxygen, int(coliform), nitrate, locations[code],
+                                  tested, duration, collected_at)
+
+    def __iter__(self) -> Iterator[WaterSample]:
+        return self.samples()
+
+
+def check_quality_profiles(samples: int = BLOCK_SIZE, seed: int = 0) -> Dict[str, float]:
+    """
+    Rate single-class streams with the active scoring rules.
+
+    Every quality class of config.QUALITY_PROFILES should rate as itself,
+    or a scenario's quality mix is not what its samples come out as.
+
+    Args:
+        samples: Samples generated per class
+        seed: Random seed
+
+    Returns:
+        Class -> share of its samples rated as that class (1.0 when calibrated)
+    """
+    shares = {}
+    for quality in QUALITY_PROFILES:
+        workload = Workload({'name': quality, 'quality_mix': {quality: 1.0}}, samples, seed)
+        expected = QUALITY_CODES[quality.capitalize()]
+        matches = sum(int((columns.quality_codes == expected).sum()) for columns in workload.columns(tested=True))
+        shares[quality] = matches / samples
+    return shares
+
+
+def main():
+    """Generate a scenario to CSV/JSONL"""
+    parser = argparse.ArgumentParser(description="Generate synthetic sample streams from scenarios")
+    parser.add_argument("scenario", nargs="?", help="Scenario name or JSON file")
+    parser.add_argument("--list", action="store_true", help="List the named scenarios")
+    parser.add_argument("--check", action="store_true",
+                        help="Check that each quality class rates as itself under the active rules")
+    parser.add_argument("--samples", type=int, default=None, help="Number of samples (default: the scenario's)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed (default: the scenario's, else 0)")
+    parser.add_argument("-o", "--output", default="-", help="Output file, or - for stdout (default)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                        help="Output format (default: from the file extension, else csv)")
+    args = parser.parse_args()
+
+    if args.check:
+        shares = check_quality_profiles()
+        for quality, share in shares.items():
+            print(f"  {'✓' if share == 1.0 else '✗'} {quality:10} {share * 100:6.2f}% rated {quality.capitalize()}")
+        sys.exit(0 if all(share == 1.0 for share in shares.values()) else 1)
+
+    if args.list or not args.scenario:
+        for name, scenario in WORKLOAD_SCENARIOS.items():
+            arrival = scenario.get('arrival', {}).get('pattern', 'steady')
+            source = f"preset {scenario['preset']}" if 'preset' in scenario else f"{len(scenario['locations'])} locations"
+            print(f"  {name:22} {scenario['samples']:>12,} samples  {arrival:8} {source}")
+        return
+
+    from batch import detect_format
+
+    workload = Workload(load_scenario(args.scenario), args.samples, args.seed)
+    output_format = args.format or detect_format(args.output)
+    stream = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    start_time = time.perf_counter()
+    try:
+        writer = csv.writer(stream) if output_format == 'csv' else None
+        if writer is not None:
+            writer.writerow(OUTPUT_FIELDS)
+        for columns in workload.columns():
+            parameters = columns.parameters
+            rows = zip(columns.sample_ids.tolist(),
+                       [workload.locations[code] for code in columns.location_codes.tolist()],
+                       parameters['ph'].tolist(), parameters['turbidity'].tolist(),
+                       parameters['dissolved_oxygen'].tolist(), parameters['coliform'].astype(np.int64).tolist(),
+                       parameters['nitrate'].tolist(), columns.timestamps.round(3).tolist(),
+                       columns.durations.tolist())
+            if writer is not None:
+                writer.writerows(rows)
+            else:
+                stream.writelines(json.dumps(dict(zip(OUTPUT_FIELDS, row))) + '\n' for row in rows)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+    elapsed = time.perf_counter() - start_time
+    span = workload.size / workload.arrivals.mean_rate
+    print(f"Generated {workload.size:,} samples of {workload.scenario['name']} in {elapsed:.2f}s "
+          f"({workload.size / elapsed:,.0f} samples/sec), covering {span / 86400:,.1f} days",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()